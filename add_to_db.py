@@ -4,13 +4,32 @@ Database Management Script for Zenith Club Certificate Portal
 This script allows you to add, view, and manage certificate entries in the database.
 """
 
+import csv
 import sqlite3
 import sys
 from datetime import datetime
 from pathlib import Path
 
-# Database configuration
-DATABASE = "certificates.db"
+from decouple import config
+
+import analytics
+from db import migrate
+from rolls import DEFAULT_TENURE, is_valid_roll_number, is_valid_tenure, normalize_roll_number
+
+# Database configuration (same setting as main.py)
+DATABASE = config("DATABASE_PATH", default="certificates.db")
+
+# Rows per executemany call during bulk import
+IMPORT_BATCH_SIZE = 1000
+
+UPSERT_CERTIFICATE_SQL = '''
+    INSERT INTO certificates (tenure, roll_number, has_certificate) VALUES (?, ?, ?)
+    ON CONFLICT(tenure, roll_number) DO UPDATE SET has_certificate = excluded.has_certificate
+'''
+
+def current_tenure():
+    """Tenure used when --tenure isn't given (CURRENT_TENURE in .env)"""
+    return config("CURRENT_TENURE", default=DEFAULT_TENURE)
 
 def init_db():
     """Initialize database with tables if they don't exist"""
@@ -40,29 +59,33 @@ def init_db():
     ''')
     
     conn.commit()
+    
+    # Normalize roll numbers and add the case-insensitive unique index
+    migrate(conn)
     conn.close()
     print("✅ Database initialized successfully!")
 
-def add_certificate(roll_number, has_certificate=1):
+def add_certificate(roll_number, has_certificate=1, tenure=None):
     """Add a new certificate entry to the database"""
+    tenure = tenure or current_tenure()
     conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
     
     try:
-        # Convert roll number to lowercase for consistency
-        roll_number = roll_number.lower().strip()
+        # Store roll numbers in their canonical lowercase form
+        roll_number = normalize_roll_number(roll_number)
         
         cursor.execute('''
-            INSERT INTO certificates (roll_number, has_certificate)
-            VALUES (?, ?)
-        ''', (roll_number, has_certificate))
+            INSERT INTO certificates (tenure, roll_number, has_certificate)
+            VALUES (?, ?, ?)
+        ''', (tenure, roll_number, has_certificate))
         
         conn.commit()
-        print(f"✅ Added certificate entry for roll number: {roll_number}")
+        print(f"✅ Added certificate entry for roll number: {roll_number} ({tenure})")
         return True
         
     except sqlite3.IntegrityError:
-        print(f"❌ Roll number {roll_number} already exists in database!")
+        print(f"❌ Roll number {roll_number} already exists in {tenure}!")
         return False
     except Exception as e:
         print(f"❌ Error adding certificate: {e}")
@@ -70,16 +93,123 @@ def add_certificate(roll_number, has_certificate=1):
     finally:
         conn.close()
 
-def view_certificates():
-    """View all certificate entries in the database"""
+def read_roll_numbers(path):
+    """Stream (line_number, roll_number, has_certificate) from a CSV or manifest file
+
+    CSV files (.csv) may have a roll_number header and an optional second
+    has_certificate column. Any other file is a manifest with one roll
+    number per line; blank lines and # comments are skipped. Use - for stdin.
+    """
+    handle = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if path.lower().endswith(".csv"):
+            for line_number, row in enumerate(csv.reader(handle), start=1):
+                if not row or not row[0].strip():
+                    continue
+                if line_number == 1 and row[0].strip().lower() == "roll_number":
+                    continue
+                has_cert = 1
+                if len(row) > 1 and row[1].strip():
+                    has_cert = 0 if row[1].strip().lower() in ("0", "n", "no", "false") else 1
+                yield line_number, normalize_roll_number(row[0]), has_cert
+        else:
+            for line_number, line in enumerate(handle, start=1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                yield line_number, normalize_roll_number(line), 1
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+def list_bucket_roll_numbers(tenure):
+    """Roll numbers (lowercase) with a certificate in a tenure's S3/MinIO prefix, from one paginated listing"""
+    from storage import CertificateIndex, S3ClientManager, endpoint_url, tenure_prefix
+    
+    clients = S3ClientManager(
+        endpoint_url=endpoint_url(
+            config("MINIO_ENDPOINT", default="s3.zenithclub.in"),
+            config("MINIO_USE_SSL", default=True, cast=bool)
+        ),
+        access_key=config("AWS_ACCESS_KEY_ID", default="your_access_key_here"),
+        secret_key=config("AWS_SECRET_ACCESS_KEY", default="your_secret_key_here")
+    )
+    index = CertificateIndex(clients, bucket=config("BUCKET_NAME", default="certificates"), prefix=tenure_prefix(tenure))
+    try:
+        if not index.refresh():
+            return None
+        return {normalize_roll_number(roll) for roll in index.rolls()}
+    finally:
+        clients.close()
+
+def import_certificates(path, sync_from_bucket=False, tenure=None):
+    """Bulk upsert roll numbers for one tenure from a CSV/manifest file in a single transaction"""
+    tenure = tenure or current_tenure()
+    in_bucket = None
+    if sync_from_bucket:
+        print(f"☁️  Listing {tenure} certificates in S3/MinIO...")
+        in_bucket = list_bucket_roll_numbers(tenure)
+        if in_bucket is None:
+            print("❌ Could not list the S3/MinIO bucket; import aborted.")
+            return False
+        print(f"   Found {len(in_bucket)} certificate files")
+    
+    conn = sqlite3.connect(DATABASE)
+    cursor = conn.cursor()
+    
+    seen = set()
+    batch = []
+    imported = invalid = duplicates = 0
+    
+    try:
+        for line_number, roll_number, has_cert in read_roll_numbers(path):
+            if not is_valid_roll_number(roll_number):
+                invalid += 1
+                if invalid <= 10:
+                    print(f"⚠️  Line {line_number}: invalid roll number '{roll_number}'")
+                continue
+            if roll_number in seen:
+                duplicates += 1
+                continue
+            seen.add(roll_number)
+            
+            if in_bucket is not None:
+                has_cert = 1 if roll_number in in_bucket else 0
+            batch.append((tenure, roll_number, has_cert))
+            
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                cursor.executemany(UPSERT_CERTIFICATE_SQL, batch)
+                imported += len(batch)
+                batch = []
+        
+        if batch:
+            cursor.executemany(UPSERT_CERTIFICATE_SQL, batch)
+            imported += len(batch)
+        
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Import failed, no changes saved: {e}")
+        return False
+    finally:
+        conn.close()
+    
+    print(f"✅ Imported {imported} roll numbers into {tenure} ({invalid} invalid, {duplicates} duplicates skipped)")
+    if invalid > 10:
+        print(f"   ...and {invalid - 10} more invalid lines not shown")
+    return True
+
+def view_certificates(tenure=None):
+    """View all certificate entries in the database (optionally one tenure)"""
     conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
     
     cursor.execute('''
-        SELECT roll_number, has_certificate, download_count, last_downloaded, created_at
+        SELECT tenure, roll_number, has_certificate, download_count, last_downloaded, created_at
         FROM certificates
+        WHERE ? IS NULL OR tenure = ?
         ORDER BY created_at DESC
-    ''')
+    ''', (tenure, tenure))
     
     results = cursor.fetchall()
     conn.close()
@@ -89,65 +219,69 @@ def view_certificates():
         return
     
     print(f"\n📋 Certificate Database ({len(results)} entries):")
-    print("-" * 80)
-    print(f"{'Roll Number':<20} {'Has Cert':<10} {'Downloads':<10} {'Last Download':<20} {'Created':<15}")
-    print("-" * 80)
+    print("-" * 90)
+    print(f"{'Tenure':<9} {'Roll Number':<20} {'Has Cert':<10} {'Downloads':<10} {'Last Download':<20} {'Created':<15}")
+    print("-" * 90)
     
     for row in results:
-        roll_number, has_cert, downloads, last_dl, created = row
+        tenure_text, roll_number, has_cert, downloads, last_dl, created = row
         has_cert_text = "✅ Yes" if has_cert else "❌ No"
         last_dl_text = last_dl[:16] if last_dl else "Never"
         created_text = created[:16] if created else "Unknown"
         
-        print(f"{roll_number:<20} {has_cert_text:<10} {downloads:<10} {last_dl_text:<20} {created_text:<15}")
+        print(f"{tenure_text:<9} {roll_number:<20} {has_cert_text:<10} {downloads:<10} {last_dl_text:<20} {created_text:<15}")
 
 def search_certificate(roll_number):
     """Search for a specific certificate entry"""
     conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
     
-    roll_number = roll_number.lower().strip()
+    roll_number = normalize_roll_number(roll_number)
     
+    # Every tenure's entry in one indexed query
     cursor.execute('''
-        SELECT * FROM certificates WHERE roll_number = ?
+        SELECT id, tenure, roll_number, has_certificate, download_count, last_downloaded, created_at
+        FROM certificates WHERE roll_number = ? COLLATE NOCASE
+        ORDER BY tenure DESC
     ''', (roll_number,))
     
-    result = cursor.fetchone()
+    results = cursor.fetchall()
     conn.close()
     
-    if result:
-        id_val, roll_num, has_cert, downloads, last_dl, created = result
-        print(f"\n🔍 Certificate Details for {roll_num}:")
-        print(f"   ID: {id_val}")
-        print(f"   Has Certificate: {'✅ Yes' if has_cert else '❌ No'}")
-        print(f"   Download Count: {downloads}")
-        print(f"   Last Downloaded: {last_dl or 'Never'}")
-        print(f"   Created At: {created}")
+    if results:
+        for id_val, tenure, roll_num, has_cert, downloads, last_dl, created in results:
+            print(f"\n🔍 Certificate Details for {roll_num} ({tenure}):")
+            print(f"   ID: {id_val}")
+            print(f"   Has Certificate: {'✅ Yes' if has_cert else '❌ No'}")
+            print(f"   Download Count: {downloads}")
+            print(f"   Last Downloaded: {last_dl or 'Never'}")
+            print(f"   Created At: {created}")
         return True
     else:
         print(f"❌ No certificate found for roll number: {roll_number}")
         return False
 
-def delete_certificate(roll_number):
-    """Delete a certificate entry from the database"""
+def delete_certificate(roll_number, tenure=None):
+    """Delete a certificate entry from the database (every tenure unless one is given)"""
     conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
     
-    roll_number = roll_number.lower().strip()
+    roll_number = normalize_roll_number(roll_number)
+    where = 'roll_number = ? COLLATE NOCASE AND (? IS NULL OR tenure = ?)'
     
     # Check if exists first
-    cursor.execute('SELECT roll_number FROM certificates WHERE roll_number = ?', (roll_number,))
+    cursor.execute(f'SELECT roll_number FROM certificates WHERE {where}', (roll_number, tenure, tenure))
     if not cursor.fetchone():
         print(f"❌ Roll number {roll_number} not found in database!")
         conn.close()
         return False
     
-    # Delete the record
-    cursor.execute('DELETE FROM certificates WHERE roll_number = ?', (roll_number,))
+    # Delete the record(s)
+    cursor.execute(f'DELETE FROM certificates WHERE {where}', (roll_number, tenure, tenure))
     conn.commit()
     conn.close()
     
-    print(f"✅ Deleted certificate entry for roll number: {roll_number}")
+    print(f"✅ Deleted {cursor.rowcount} certificate entry(s) for roll number: {roll_number}")
     return True
 
 def add_dummy_data():
@@ -159,6 +293,57 @@ def add_dummy_data():
         print(f"   Roll Number: {dummy_roll}")
         print(f"   Email Format: dummy.{dummy_roll}@sushantuniversity.edu.in")
 
+def show_report(kind, args, tenure=None):
+    """Print a download report; reads only the rollup tables (brought up to date first)"""
+    since, until = pop_option(args, "--since"), pop_option(args, "--until")
+    event_type = pop_option(args, "--event")
+    conn = sqlite3.connect(DATABASE)
+    try:
+        rolled = analytics.rollup(conn)
+        if rolled:
+            print(f"📥 Rolled up {rolled} new download log rows")
+
+        if kind == "top":
+            limit = int(args[0]) if args else 10
+            rows = analytics.top_roll_numbers(conn, limit, since, until, tenure, event_type)
+            print(f"\n🏆 Top {limit} roll numbers by {event_type or 'all'} events:")
+            print("-" * 45)
+            for rank, (tenure_text, roll_number, events) in enumerate(rows, 1):
+                print(f"{rank:>3}. {roll_number:<20} {tenure_text:<9} {events:>8}")
+        elif kind == "programs":
+            rows = analytics.program_totals(conn, since, until, tenure)
+            print("\n🎓 Events per program:")
+            print("-" * 45)
+            for program, event_type_text, events in rows:
+                print(f"{program:<15} {event_type_text:<10} {events:>10}")
+        elif kind in ("daily", "hourly"):
+            granularity = "day" if kind == "daily" else "hour"
+            rows = analytics.time_series(conn, granularity, since, until, tenure, event_type)
+            print(f"\n📈 {event_type or 'All'} events per {granularity}:")
+            print("-" * 45)
+            for bucket, events in rows:
+                print(f"{bucket:<15} {events:>10}")
+        else:
+            print("❌ Report must be one of: top, programs, daily, hourly")
+            return False
+        if not rows:
+            print("📭 No download events in this range.")
+        return True
+    finally:
+        conn.close()
+
+def archive_download_logs(retention_days):
+    """Move download logs older than retention_days to download_logs_archive"""
+    conn = sqlite3.connect(DATABASE)
+    try:
+        # Rows are only archived once they're counted in the rollups
+        analytics.rollup(conn)
+        moved = analytics.archive(conn, retention_days)
+    finally:
+        conn.close()
+    print(f"📦 Archived {moved} download log rows older than {retention_days} days")
+    return moved
+
 def interactive_menu():
     """Interactive menu for database operations"""
     while True:
@@ -218,35 +403,69 @@ def interactive_menu():
         except Exception as e:
             print(f"❌ Error: {e}")
 
+def pop_option(args, name):
+    """Remove 'name value' from args and return the value (None if absent)"""
+    if name not in args:
+        return None
+    position = args.index(name)
+    if position + 1 >= len(args):
+        print(f"❌ {name} needs a value")
+        sys.exit(1)
+    value = args[position + 1]
+    del args[position:position + 2]
+    return value
+
+def pop_tenure_option(args):
+    """Remove '--tenure YYYY-YY' from args and return the tenure (None if absent)"""
+    tenure = pop_option(args, "--tenure")
+    if tenure is not None and not is_valid_tenure(tenure):
+        print("❌ --tenure needs a value like 2024-25")
+        sys.exit(1)
+    return tenure
+
 def main():
     """Main function"""
     # Ensure database exists
     init_db()
     
+    args = sys.argv[1:]
+    tenure = pop_tenure_option(args)
+    
     # Check command line arguments
-    if len(sys.argv) > 1:
-        command = sys.argv[1].lower()
+    if args:
+        command = args[0].lower()
         
-        if command == "add" and len(sys.argv) >= 3:
-            roll_number = sys.argv[2]
-            add_certificate(roll_number)
+        if command == "add" and len(args) >= 2:
+            roll_number = args[1]
+            add_certificate(roll_number, tenure=tenure)
         elif command == "view":
-            view_certificates()
-        elif command == "search" and len(sys.argv) >= 3:
-            roll_number = sys.argv[2]
+            view_certificates(tenure)
+        elif command == "search" and len(args) >= 2:
+            roll_number = args[1]
             search_certificate(roll_number)
-        elif command == "delete" and len(sys.argv) >= 3:
-            roll_number = sys.argv[2]
-            delete_certificate(roll_number)
+        elif command == "delete" and len(args) >= 2:
+            roll_number = args[1]
+            delete_certificate(roll_number, tenure)
         elif command == "dummy":
             add_dummy_data()
+        elif command == "import" and len(args) >= 2:
+            import_certificates(args[1], sync_from_bucket="--sync-from-bucket" in args[2:], tenure=tenure)
+        elif command == "report" and len(args) >= 2:
+            show_report(args[1].lower(), args[2:], tenure)
+        elif command == "archive" and len(args) >= 2 and args[1].isdigit():
+            archive_download_logs(int(args[1]))
         else:
             print("Usage:")
-            print("  python add_to_db.py add <roll_number>")
-            print("  python add_to_db.py view")
+            print("  python add_to_db.py add <roll_number> [--tenure 2025-26]")
+            print("  python add_to_db.py view [--tenure 2025-26]")
             print("  python add_to_db.py search <roll_number>")
-            print("  python add_to_db.py delete <roll_number>")
+            print("  python add_to_db.py delete <roll_number> [--tenure 2025-26]")
             print("  python add_to_db.py dummy")
+            print("  python add_to_db.py import <file.csv|manifest.txt|-> [--sync-from-bucket] [--tenure 2025-26]")
+            print("  python add_to_db.py report top [N] [--event download|preview] [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--tenure 2025-26]")
+            print("  python add_to_db.py report programs|daily|hourly [--since ...] [--until ...] [--event ...] [--tenure ...]")
+            print("  python add_to_db.py archive <retention_days>")
+            print("  Without --tenure, add/import use CURRENT_TENURE (default 2024-25)")
             print("  python add_to_db.py (for interactive menu)")
     else:
         # Run interactive menu
@@ -0,0 +1,235 @@
+"""
+Download analytics for the Zenith Club Certificate Portal.
+
+Reports never scan download_logs. Instead, new rows are folded into two
+rollup tables, starting from a high-water mark (the last rolled-up log
+id):
+
+- download_rollup_hourly: events per (hour, tenure, program, event type),
+  for time series and per-program totals
+- download_rollup_daily: events per (day, tenure, roll number, event
+  type), for top-N reports
+
+Each batch is read, added to the rollups and the mark advanced in one
+BEGIN IMMEDIATE transaction, so several workers rolling up at once
+never count a row twice. Raw rows older than the retention window (and
+already rolled up) are moved to download_logs_archive in small batches,
+which keeps the live table and its indexes small.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from rolls import roll_program
+
+WATERMARK = "download_logs"
+
+
+def _rollup_batch(conn, batch_size: int) -> int:
+    """Roll up the next batch of log rows; returns how many were read"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        last_id = conn.execute(
+            "SELECT last_id FROM rollup_watermarks WHERE name = ?", (WATERMARK,)
+        ).fetchone()[0]
+        rows = conn.execute(
+            "SELECT id, roll_number, tenure, event_type, downloaded_at FROM download_logs "
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            conn.rollback()
+            return 0
+
+        hourly, daily = Counter(), Counter()
+        for _, roll_number, tenure, event_type, downloaded_at in rows:
+            # downloaded_at is 'YYYY-MM-DD HH:MM:SS' in UTC
+            stamp = str(downloaded_at or "")
+            tenure = tenure or ""
+            program = roll_program(roll_number)
+            hourly[(stamp[:13], tenure, program, event_type)] += 1
+            daily[(stamp[:10], tenure, roll_number, event_type, program)] += 1
+
+        conn.executemany(
+            "INSERT INTO download_rollup_hourly (hour, tenure, program, event_type, events) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(hour, tenure, program, event_type) DO UPDATE SET events = events + excluded.events",
+            [key + (events,) for key, events in hourly.items()]
+        )
+        conn.executemany(
+            "INSERT INTO download_rollup_daily (day, tenure, roll_number, event_type, program, events) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(day, tenure, roll_number, event_type) DO UPDATE SET events = events + excluded.events",
+            [key + (events,) for key, events in daily.items()]
+        )
+        conn.execute(
+            "UPDATE rollup_watermarks SET last_id = ? WHERE name = ?", (rows[-1][0], WATERMARK)
+        )
+        conn.commit()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def rollup(conn, batch_size: int = 5000) -> int:
+    """Fold every log row past the high-water mark into the rollups; returns rows rolled up"""
+    total = 0
+    while True:
+        rolled = _rollup_batch(conn, batch_size)
+        total += rolled
+        if rolled < batch_size:
+            return total
+
+
+def archive(conn, retention_days: int, batch_size: int = 5000) -> int:
+    """Move rolled-up log rows older than retention_days to download_logs_archive
+
+    Runs one short transaction per batch so live download logging only
+    ever waits for a single batch. Returns how many rows were moved.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    moved = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Never archive a row the rollups haven't seen yet
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM download_logs WHERE downloaded_at < ? "
+                "AND id <= (SELECT last_id FROM rollup_watermarks WHERE name = ?) LIMIT ?",
+                (cutoff, WATERMARK, batch_size)
+            )]
+            if ids:
+                marks = ",".join("?" * len(ids))
+                conn.execute(
+                    "INSERT OR IGNORE INTO download_logs_archive "
+                    "(id, roll_number, tenure, email, event_type, downloaded_at) "
+                    f"SELECT id, roll_number, tenure, email, event_type, downloaded_at FROM download_logs WHERE id IN ({marks})",
+                    ids
+                )
+                conn.execute(f"DELETE FROM download_logs WHERE id IN ({marks})", ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        moved += len(ids)
+        if len(ids) < batch_size:
+            return moved
+
+
+def _range(since: Optional[str], until: Optional[str]):
+    """(first, after) bucket bounds for inclusive YYYY-MM-DD dates"""
+    first = since or ""
+    after = (date.fromisoformat(until) + timedelta(days=1)).isoformat() if until else "9999"
+    return first, after
+
+
+def top_roll_numbers(conn, limit: int = 10, since: Optional[str] = None, until: Optional[str] = None,
+                     tenure: Optional[str] = None, event_type: Optional[str] = None) -> list:
+    """[(tenure, roll_number, events)] with the most events, from the daily rollup"""
+    first, after = _range(since, until)
+    return conn.execute(
+        "SELECT tenure, roll_number, SUM(events) AS total FROM download_rollup_daily "
+        "WHERE day >= ? AND day < ? AND (? IS NULL OR tenure = ?) AND (? IS NULL OR event_type = ?) "
+        "GROUP BY tenure, roll_number ORDER BY total DESC, roll_number LIMIT ?",
+        (first, after, tenure, tenure, event_type, event_type, limit)
+    ).fetchall()
+
+
+def program_totals(conn, since: Optional[str] = None, until: Optional[str] = None,
+                   tenure: Optional[str] = None) -> list:
+    """[(program, event_type, events)] from the hourly rollup, busiest program first"""
+    first, after = _range(since, until)
+    return conn.execute(
+        "SELECT program, event_type, SUM(events) AS total FROM download_rollup_hourly "
+        "WHERE hour >= ? AND hour < ? AND (? IS NULL OR tenure = ?) "
+        "GROUP BY program, event_type "
+        "ORDER BY SUM(SUM(events)) OVER (PARTITION BY program) DESC, program, event_type",
+        (first, after, tenure, tenure)
+    ).fetchall()
+
+
+def time_series(conn, granularity: str = "day", since: Optional[str] = None, until: Optional[str] = None,
+                tenure: Optional[str] = None, event_type: Optional[str] = None) -> list:
+    """[(bucket, events)] per hour ('YYYY-MM-DD HH') or day, from the hourly rollup"""
+    if granularity not in ("hour", "day"):
+        raise ValueError("granularity must be 'hour' or 'day'")
+    width = 13 if granularity == "hour" else 10
+    first, after = _range(since, until)
+    return conn.execute(
+        f"SELECT substr(hour, 1, {width}) AS bucket, SUM(events) FROM download_rollup_hourly "
+        "WHERE hour >= ? AND hour < ? AND (? IS NULL OR tenure = ?) AND (? IS NULL OR event_type = ?) "
+        "GROUP BY bucket ORDER BY bucket",
+        (first, after, tenure, tenure, event_type, event_type)
+    ).fetchall()
+
+
+class RollupScheduler:
+    """Background thread that keeps the rollups current and applies retention"""
+
+    def __init__(self, pool, interval: float = 60, retention_days: int = 0, batch_size: int = 5000):
+        self.pool = pool
+        self.interval = interval
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.runs = 0
+        self.rolled_up = 0
+        self.archived = 0
+        self.failures = 0
+        self.last_run_ms = 0.0
+
+    def run_once(self):
+        """Roll up new log rows, then archive expired ones"""
+        started = time.monotonic()
+        conn = self.pool.connect()
+        try:
+            self.rolled_up += rollup(conn, self.batch_size)
+            if self.retention_days > 0:
+                self.archived += archive(conn, self.retention_days, self.batch_size)
+        except sqlite3.Error as e:
+            # Locked by another worker's rollup, most likely; try again next time
+            print(f"Download rollup failed: {e}")
+            self.failures += 1
+        finally:
+            conn.close()
+        self.runs += 1
+        self.last_run_ms = round((time.monotonic() - started) * 1000, 2)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        """Start the background rollup thread"""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="download-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the rollup thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def stats(self) -> dict:
+        """Rollup and archive counters"""
+        return {
+            "interval_seconds": self.interval,
+            "retention_days": self.retention_days,
+            "runs": self.runs,
+            "rolled_up": self.rolled_up,
+            "archived": self.archived,
+            "failures": self.failures,
+            "last_run_ms": self.last_run_ms,
+        }
@@ -0,0 +1,268 @@
+"""
+Static asset pipeline for the Zenith Club Certificate Portal.
+
+At startup every file under static/ is read once, minified (JS/CSS),
+fingerprinted with a content hash and precompressed with gzip (and
+brotli when the optional `brotli` package is installed). Hashed URLs
+such as /static/script.3f9a0c1d2e4b.js are served from memory with an
+immutable Cache-Control; the plain names keep working with a short
+max-age for old bookmarks. Rendered pages (index.html) are cached the
+same way, keyed by page name, instead of going through Jinja per request.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import NamedTuple, Optional
+
+from fastapi.responses import FileResponse, Response
+
+from streaming import is_not_modified
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip alone is used without it
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Types worth precompressing (PNG and friends are already compressed)
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml",
+                "image/x-icon", "image/vnd.microsoft.icon")
+
+
+class Asset(NamedTuple):
+    """One static file, ready to serve"""
+    name: str
+    url: str
+    content_type: str
+    etag: str
+    body: Optional[bytes]
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+    # Set instead of body for files too large to keep in memory
+    path: Optional[str] = None
+
+
+def minify_js(source: str) -> str:
+    """Conservative line-based JS minification
+
+    Drops comments that start a line and blank lines and trims
+    indentation, but keeps line breaks (so automatic semicolon insertion
+    is unaffected) and leaves lines inside multi-line template literals
+    untouched. Code after a leading /* ... */ is kept; a block comment
+    opened after code on a line is kept verbatim up to its closing line.
+    """
+    lines = []
+    in_template = False
+    in_comment = False
+    in_trailing_comment = False
+    for line in source.splitlines():
+        if in_template:
+            lines.append(line)
+            in_template = line.count("`") % 2 == 0
+            continue
+        if in_trailing_comment:
+            lines.append(line)
+            in_trailing_comment = "*/" not in line
+            continue
+        if in_comment:
+            end = line.find("*/")
+            if end < 0:
+                continue
+            in_comment = False
+            line = line[end + 2:]
+        stripped = line.strip()
+        # Strip any number of leading /* ... */ comments, keeping what follows
+        while stripped.startswith("/*"):
+            end = stripped.find("*/", 2)
+            if end < 0:
+                in_comment = True
+                stripped = ""
+                break
+            stripped = stripped[end + 2:].strip()
+        if not stripped or stripped.startswith("//"):
+            continue
+        lines.append(stripped)
+        in_template = stripped.count("`") % 2 == 1
+        in_trailing_comment = not in_template and stripped.rfind("/*") > stripped.rfind("*/")
+    return "\n".join(lines) + "\n"
+
+
+# Quoted strings, comments, whitespace and everything else, so that
+# minify_css never rewrites the inside of a string
+CSS_TOKEN = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|/\*.*?\*/|[^"\'/]+|.', re.S)
+
+
+def _minify_css_text(text: str) -> str:
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    # Whitespace before ':' can be a descendant combinator (a :hover), so only trim after it
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}")
+
+
+def minify_css(source: str) -> str:
+    """Strip comments and collapse whitespace around CSS punctuation, leaving strings alone"""
+    parts, text = [], []
+    for token in CSS_TOKEN.findall(source):
+        if token[0] in "\"'" and len(token) > 1 and token[-1] == token[0]:
+            parts.append(_minify_css_text("".join(text)))
+            parts.append(token)
+            text = []
+        elif token.startswith("/*") and token.endswith("*/") and len(token) >= 4:
+            text.append(" ")
+        else:
+            text.append(token)
+    parts.append(_minify_css_text("".join(text)))
+    return "".join(parts).strip() + "\n"
+
+
+MINIFIERS = {".js": minify_js, ".css": minify_css}
+
+
+def _compressed(content_type: str, body: bytes):
+    """(gzip, brotli) variants, each only kept if it is actually smaller"""
+    if len(body) < 512 or not content_type.startswith(COMPRESSIBLE):
+        return None, None
+    gz = gzip.compress(body, compresslevel=9, mtime=0)
+    br = brotli.compress(body, quality=11) if brotli else None
+    return (gz if len(gz) < len(body) else None), (br if br and len(br) < len(body) else None)
+
+
+def build_asset(name: str, url: str, content_type: str, body: bytes) -> Asset:
+    gz, br = _compressed(content_type, body)
+    etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+    return Asset(name, url, content_type, etag, body, gz, br)
+
+
+def _accepts(request_headers, encoding: str) -> bool:
+    accept = request_headers.get("accept-encoding", "")
+    for item in accept.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def asset_response(asset: Asset, request_headers, cache_control: str) -> Response:
+    """Serve an asset in the best encoding the client accepts, with 304 support"""
+    headers = {"cache-control": cache_control, "etag": asset.etag, "vary": "accept-encoding"}
+    if is_not_modified(request_headers, asset.etag, None):
+        return Response(status_code=304, headers=headers)
+    if asset.body is None:
+        return FileResponse(asset.path, media_type=asset.content_type, headers=headers)
+
+    body = asset.body
+    if asset.br is not None and _accepts(request_headers, "br"):
+        body = asset.br
+        headers["content-encoding"] = "br"
+    elif asset.gzip is not None and _accepts(request_headers, "gzip"):
+        body = asset.gzip
+        headers["content-encoding"] = "gzip"
+    return Response(body, media_type=asset.content_type, headers=headers)
+
+
+class StaticAssets:
+    """Fingerprinted, precompressed copies of a static directory"""
+
+    def __init__(self, directory: str, url_prefix: str = "/static", minify: bool = True,
+                 max_memory_size: int = 1024 * 1024, max_pages: int = 16):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        self.minify = minify
+        # Larger files are fingerprinted but streamed from disk
+        self.max_memory_size = max_memory_size
+        self.max_pages = max_pages
+
+        # name -> Asset, and request path (hashed or plain, without prefix) -> (Asset, hashed?)
+        self._assets = {}
+        self._routes = {}
+        self._pages = {}
+        self._lock = threading.Lock()
+
+        self.bytes_in_memory = 0
+
+    def build(self):
+        """(Re)build every asset from the directory"""
+        assets, routes, in_memory = {}, {}, 0
+        for root, _, files in os.walk(self.directory):
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                stem, ext = os.path.splitext(name)
+                content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                if ext == ".js":
+                    content_type = "application/javascript"
+
+                if os.path.getsize(path) > self.max_memory_size:
+                    digest = hashlib.sha256()
+                    with open(path, "rb") as f:
+                        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                            digest.update(chunk)
+                    fingerprint = digest.hexdigest()
+                    hashed = f"{stem}.{fingerprint[:12]}{ext}"
+                    asset = Asset(name, f"{self.url_prefix}/{hashed}", content_type,
+                                  f'"{fingerprint[:16]}"', None, path=path)
+                else:
+                    with open(path, "rb") as f:
+                        body = f.read()
+                    if self.minify and ext in MINIFIERS:
+                        body = MINIFIERS[ext](body.decode("utf-8")).encode("utf-8")
+                    fingerprint = hashlib.sha256(body).hexdigest()
+                    hashed = f"{stem}.{fingerprint[:12]}{ext}"
+                    asset = build_asset(name, f"{self.url_prefix}/{hashed}", content_type, body)
+                    in_memory += len(body) + len(asset.gzip or b"") + len(asset.br or b"")
+
+                assets[name] = asset
+                routes[name] = (asset, False)
+                routes[hashed] = (asset, True)
+
+        with self._lock:
+            self._assets, self._routes, self._pages = assets, routes, {}
+            self.bytes_in_memory = in_memory
+
+    def url(self, name: str) -> str:
+        """Fingerprinted URL for a static file (plain URL if unknown)"""
+        asset = self._assets.get(name)
+        return asset.url if asset else f"{self.url_prefix}/{name}"
+
+    def get(self, name: str) -> Optional[Asset]:
+        return self._assets.get(name)
+
+    def response(self, path: str, request_headers) -> Optional[Response]:
+        """Response for a request path under the prefix, or None if unknown"""
+        route = self._routes.get(path)
+        if route is None:
+            return None
+        asset, hashed = route
+        # Plain names can change under the same URL, so only cache them briefly
+        return asset_response(asset, request_headers, IMMUTABLE if hashed else "public, max-age=300")
+
+    def cached_page(self, key: str) -> Optional[Asset]:
+        """Rendered page for key if it has been rendered already"""
+        return self._pages.get(key)
+
+    def page(self, key: str, render) -> Asset:
+        """Rendered page for key, calling render() -> str only on first use"""
+        page = self._pages.get(key)
+        if page is None:
+            body = render().encode("utf-8")
+            page = build_asset(key, key, "text/html; charset=utf-8", body)
+            with self._lock:
+                if len(self._pages) >= self.max_pages:
+                    self._pages.pop(next(iter(self._pages)))
+                self._pages[key] = page
+        return page
+
+    def stats(self) -> dict:
+        """Asset counts and memory held"""
+        return {
+            "assets": len(self._assets),
+            "pages": len(self._pages),
+            "bytes_in_memory": self.bytes_in_memory,
+            "brotli": brotli is not None,
+        }
@@ -0,0 +1,716 @@
+#!/usr/bin/env python3
+"""
+Load test and micro-benchmarks for the Zenith Club Certificate Portal.
+
+Runs the app in-process under uvicorn against an in-process fake of the
+S3/MinIO API and a local SMTP sink, then drives the full
+/send-otp -> /verify-otp -> /preview -> /download flow for a number of
+simulated students at a fixed concurrency. Reports throughput, latency
+percentiles and error rates per endpoint, plus micro-benchmarks of hot
+helpers, and saves everything as JSON for comparison between commits.
+
+Worker startup is measured first in fresh interpreters: `import main`
+under `-X importtime`, and the time from spawning uvicorn to the first
+answered request. --max-import-ms / --max-first-request-ms turn these
+into a guard that fails the run, as does --max-eligibility-bytes for the
+memory taken by 100k eligible roll numbers in the /send-otp cache.
+
+Nothing here touches the real database, bucket or mail server: all state
+lives in a temporary directory.
+
+Usage:
+    python benchmark.py [--users 200] [--concurrency 20] [--s3-delay-ms 0]
+                        [--output results.json] [--compare baseline.json]
+    python benchmark.py --startup-only [--max-import-ms 500] [--max-first-request-ms 1500]
+"""
+
+import argparse
+import asyncio
+import email
+import hashlib
+import json
+import os
+import platform
+import re
+import socket
+import socketserver
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+from db import EligibilityCache
+from offload import LatencyWindow
+from rolls import DEFAULT_TENURE
+from storage import tenure_prefix
+
+BUCKET = "bench"
+ROLL_PROGRAMMES = ("btccse", "bca", "btcece", "bba")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Loaded on first use or by the background warm-up, never by `import main`
+LAZY_MODULES = ("boto3", "botocore", "httpx", "jinja2", "requests")
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_rolls(count: int) -> list:
+    """Distinct valid roll numbers, e.g. 220btccse004"""
+    return [
+        f"{220 + (i // 1000) % 10}{ROLL_PROGRAMMES[(i // 10000) % len(ROLL_PROGRAMMES)]}{i % 1000:03d}"
+        for i in range(count)
+    ]
+
+
+# -- fake S3 -------------------------------------------------------------------
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    """Path-style subset of the S3 API: ListObjectsV2, HEAD and ranged GET"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeS3"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: dict = None, head: bool = False):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if "Content-Length" not in (headers or {}):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and not head:
+            self.wfile.write(body)
+
+    def _object(self):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        url = urlparse(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        return bucket, unquote(key), parse_qs(url.query)
+
+    def _not_found(self, head: bool = False):
+        self._send(404, b"<Error><Code>NoSuchKey</Code></Error>", {"Content-Type": "application/xml"}, head)
+
+    def _list(self, bucket: str, query: dict):
+        prefix = query.get("prefix", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        after = query.get("continuation-token", query.get("start-after", [""]))[0]
+        keys = sorted(key for key in self.server.objects if key.startswith(prefix) and key > after)
+        truncated = len(keys) > max_keys
+        keys = keys[:max_keys]
+        token = f"<NextContinuationToken>{escape(keys[-1])}</NextContinuationToken>" if truncated else ""
+        contents = "".join(
+            f"<Contents><Key>{escape(key)}</Key><LastModified>{self.server.last_modified_iso}</LastModified>"
+            f"<ETag>{escape(self.server.etags[key])}</ETag><Size>{len(self.server.objects[key])}</Size>"
+            f"<StorageClass>STANDARD</StorageClass></Contents>"
+            for key in keys
+        )
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{bucket}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(keys)}</KeyCount>"
+            f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>{token}{contents}"
+            "</ListBucketResult>"
+        ).encode()
+        self._send(200, body, {"Content-Type": "application/xml"})
+
+    def do_HEAD(self):
+        bucket, key, _ = self._object()
+        data = self.server.objects.get(key)
+        if data is None:
+            return self._not_found(head=True)
+        self._send(200, headers={
+            "Content-Length": str(len(data)),
+            "Content-Type": "application/pdf",
+            "ETag": self.server.etags[key],
+            "Last-Modified": self.server.last_modified,
+            "Accept-Ranges": "bytes",
+        }, head=True)
+
+    def do_GET(self):
+        bucket, key, query = self._object()
+        if not key:
+            return self._list(bucket, query)
+        data = self.server.objects.get(key)
+        if data is None:
+            return self._not_found()
+
+        headers = {
+            "Content-Type": "application/pdf",
+            "ETag": self.server.etags[key],
+            "Last-Modified": self.server.last_modified,
+            "Accept-Ranges": "bytes",
+        }
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            first, last = match.groups()
+            if first:
+                start, end = int(first), min(int(last), len(data) - 1) if last else len(data) - 1
+            else:
+                start, end = max(len(data) - int(last), 0), len(data) - 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return self._send(206, data[start:end + 1], headers)
+        self._send(200, data, headers)
+
+
+class FakeS3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, objects: dict, delay: float = 0):
+        super().__init__(("127.0.0.1", port), FakeS3Handler)
+        self.objects = objects
+        self.etags = {key: f'"{hashlib.md5(data).hexdigest()}"' for key, data in objects.items()}
+        self.last_modified = formatdate(usegmt=True)
+        self.last_modified_iso = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        self.delay = delay
+
+
+# -- SMTP sink -----------------------------------------------------------------
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail from smtplib and record each OTP"""
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 bench SMTP sink")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("latin-1").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-bench\r\n250 8BITMIME\r\n")
+            elif verb == "HELO":
+                self.reply("250 bench")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip().strip("<>"))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data == b".\r\n":
+                        break
+                    lines.append(data[1:] if data.startswith(b"..") else data)
+                self.server.deliver(recipients, b"".join(lines))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int):
+        super().__init__(("127.0.0.1", port), SmtpSinkHandler)
+        self.otps = {}
+        self.messages = 0
+
+    def deliver(self, recipients: list, data: bytes):
+        message = email.message_from_bytes(data)
+        parts = message.walk() if message.is_multipart() else [message]
+        for part in parts:
+            payload = part.get_payload(decode=True)
+            found = payload and re.search(rb"\b(\d{6})\b", payload)
+            if found:
+                for recipient in recipients:
+                    self.otps[recipient] = found.group(1).decode()
+                break
+        self.messages += 1
+
+
+# -- load test -----------------------------------------------------------------
+
+class EndpointStats:
+    def __init__(self, size: int):
+        self.latency = LatencyWindow(size=size)
+        self.errors = 0
+        self.bytes = 0
+
+    def report(self, elapsed: float) -> dict:
+        summary = self.latency.summary()
+        count = summary["count"]
+        summary.update({
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / elapsed, 1) if elapsed else None,
+            "bytes": self.bytes,
+        })
+        return summary
+
+
+async def run_flow(base_url: str, sink: SmtpSink, rolls: list, concurrency: int,
+                   otp_timeout: float) -> dict:
+    import httpx
+
+    names = ("send_otp", "otp_delivery", "verify_otp", "preview", "download", "flow")
+    stats = {name: EndpointStats(len(rolls)) for name in names}
+    pending = asyncio.Queue()
+    for roll in rolls:
+        pending.put_nowait(roll)
+
+    async def timed(name, request, expected=200):
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception:
+            stats[name].latency.add(time.perf_counter() - started)
+            stats[name].errors += 1
+            return None
+        stats[name].latency.add(time.perf_counter() - started)
+        stats[name].bytes += len(response.content)
+        if response.status_code != expected:
+            stats[name].errors += 1
+            return None
+        return response
+
+    async def wait_for_otp(address):
+        started = time.perf_counter()
+        deadline = started + otp_timeout
+        while time.perf_counter() < deadline:
+            otp = sink.otps.pop(address, None)
+            if otp:
+                stats["otp_delivery"].latency.add(time.perf_counter() - started)
+                return otp
+            await asyncio.sleep(0.002)
+        stats["otp_delivery"].latency.add(time.perf_counter() - started)
+        stats["otp_delivery"].errors += 1
+        return None
+
+    async def student(client, roll):
+        address = f"bench.{roll}@sushantuniversity.edu.in"
+        started = time.perf_counter()
+        ok = False
+        try:
+            if not await timed("send_otp", client.post("/send-otp", data={"email": address})):
+                return
+            otp = await wait_for_otp(address)
+            if not otp:
+                return
+            if not await timed("verify_otp", client.post("/verify-otp", data={"email": address, "otp": otp})):
+                return
+            params = {"email": address}
+            if not await timed("preview", client.get(f"/preview/{roll.upper()}", params=params)):
+                return
+            ok = bool(await timed("download", client.get(f"/download/{roll.upper()}", params=params)))
+        finally:
+            stats["flow"].latency.add(time.perf_counter() - started)
+            if not ok:
+                stats["flow"].errors += 1
+
+    async def worker(client):
+        while not pending.empty():
+            await student(client, pending.get_nowait())
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "students": len(rolls),
+        "completed_flows_per_s": round((len(rolls) - stats["flow"].errors) / elapsed, 1),
+        "endpoints": {name: stat.report(elapsed) for name, stat in stats.items()},
+    }
+
+
+# -- startup -------------------------------------------------------------------
+
+def import_time(module: str = "main") -> dict:
+    """-X importtime of a module in a fresh interpreter: total, heaviest direct imports, eager lazy modules"""
+    code = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True, cwd=REPO_DIR
+    )
+    total, children, direct = None, [], []
+    # Children are printed before their parent, two spaces deeper
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)) // 2, match.group(4)
+        if depth == 1:
+            children.append((name, cumulative))
+        elif depth == 0:
+            if name == module:
+                total, direct = cumulative, children
+            children = []
+    direct.sort(key=lambda item: -item[1])
+    return {
+        "import_ms": round(total / 1000, 1) if total is not None else None,
+        "heaviest_imports": [(name, round(us / 1000, 1)) for name, us in direct[:5]],
+        "eager_lazy_modules": [m for m in result.stdout.strip().split(",") if m],
+    }
+
+
+def time_to_first_request(timeout: float = 30) -> float:
+    """Milliseconds from spawning a uvicorn worker to its first answered GET /"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as response:
+                    response.read()
+                return round((time.perf_counter() - started) * 1000, 1)
+            except (urllib.error.URLError, ConnectionError):
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+                time.sleep(0.005)
+        raise RuntimeError(f"No response from uvicorn within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=15)
+
+
+def run_startup(runs: int) -> dict:
+    """Median import time and time to first request over several fresh workers
+
+    The first worker also creates the schema in the empty benchmark
+    database (cold start); the rest find it current, like a restart.
+    """
+    imports = [import_time() for _ in range(runs)]
+    first_requests = [time_to_first_request() for _ in range(runs + 1)]
+    import_runs = sorted(run["import_ms"] for run in imports)
+    restarts = sorted(first_requests[1:])
+    return {
+        "import_ms": import_runs[len(import_runs) // 2],
+        "import_runs": import_runs,
+        "heaviest_imports": imports[0]["heaviest_imports"],
+        "eager_lazy_modules": imports[0]["eager_lazy_modules"],
+        "cold_start_ms": first_requests[0],
+        "first_request_ms": restarts[len(restarts) // 2],
+        "first_request_runs": restarts,
+    }
+
+
+def budget_failures(results: dict, args) -> list:
+    """Violated startup and memory budgets, as messages"""
+    startup, footprint = results["startup"], results["eligibility"]
+    max_import_ms, max_first_request_ms = args.max_import_ms, args.max_first_request_ms
+    failures = []
+    if args.max_eligibility_bytes and footprint["memory_bytes"] > args.max_eligibility_bytes:
+        failures.append(f"{footprint['rolls']} eligible roll numbers take {footprint['memory_bytes']} bytes "
+                        f"(budget {args.max_eligibility_bytes})")
+    if footprint["eligible"] != footprint["rolls"] or footprint["leading_zero_aliased"]:
+        failures.append("eligibility cache lost or aliased roll numbers")
+    if max_import_ms and startup["import_ms"] > max_import_ms:
+        failures.append(f"import main took {startup['import_ms']} ms (budget {max_import_ms} ms)")
+    if max_first_request_ms and startup["first_request_ms"] > max_first_request_ms:
+        failures.append(f"first request after {startup['first_request_ms']} ms (budget {max_first_request_ms} ms)")
+    if startup["eager_lazy_modules"]:
+        failures.append(f"import main loaded {', '.join(startup['eager_lazy_modules'])}")
+    return failures
+
+
+# -- eligibility cache footprint -----------------------------------------------
+
+FOOTPRINT_PROGRAMMES = ("btccse", "bca", "btcece", "bba", "bsc", "bcom", "mba", "mca", "btcme", "bdes")
+
+
+def eligibility_footprint(workdir: str, count: int = 100000) -> dict:
+    """Load `count` distinct generated roll numbers into an EligibilityCache and measure it"""
+    rolls = [
+        f"{220 + (i // 1000) % 10}{FOOTPRINT_PROGRAMMES[(i // 10000) % len(FOOTPRINT_PROGRAMMES)]}{i % 1000:03d}"
+        for i in range(count)
+    ]
+    path = os.path.join(workdir, "eligibility.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE certificates (roll_number TEXT, has_certificate INTEGER)")
+    conn.execute("CREATE TABLE cache_versions (name TEXT PRIMARY KEY, version INTEGER)")
+    conn.executemany("INSERT INTO certificates VALUES (?, 1)", ((roll,) for roll in rolls))
+    conn.commit()
+    conn.close()
+
+    cache = EligibilityCache(path)
+    started = time.perf_counter()
+    cache.load()
+    load_ms = (time.perf_counter() - started) * 1000
+    stats = cache.stats()
+    # A leading zero must not alias the roll number without it
+    aliased = cache.is_eligible("0" + rolls[0])
+    cache.close()
+    return {
+        "rolls": count,
+        "eligible": stats["eligible"],
+        "memory_bytes": stats["memory_bytes"],
+        "bytes_per_roll": round(stats["memory_bytes"] / count, 2),
+        "load_ms": round(load_ms, 1),
+        "leading_zero_aliased": aliased,
+    }
+
+
+# -- micro-benchmarks ----------------------------------------------------------
+
+def micro(func, iterations: int, setup=None) -> dict:
+    """Time func() per call; setup() runs untimed before each call"""
+    window = LatencyWindow(size=iterations)
+    total = 0.0
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        window.add(elapsed)
+        total += elapsed
+    summary = window.summary()
+    summary["mean_us"] = round(total / iterations * 1e6, 3)
+    return summary
+
+
+def run_micro(main, roll: str, iterations: int) -> dict:
+    address = f"bench.{roll}@sushantuniversity.edu.in"
+    entry = main.get_certificate_object(roll)
+
+    def get_db():
+        main.get_db().close()
+
+    return {
+        "validate_email": micro(lambda: main.validate_email(address), iterations),
+        "get_db": micro(get_db, iterations),
+        "generate_presigned_url_cached": micro(
+            lambda: main.generate_presigned_url(roll, entry=entry), iterations
+        ),
+        "generate_presigned_url_uncached": micro(
+            lambda: main.generate_presigned_url(roll, entry=entry), iterations,
+            setup=main.presigned_url_cache.clear
+        ),
+    }
+
+
+# -- reporting -----------------------------------------------------------------
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_startup(startup: dict):
+    print(f"\nimport main: {startup['import_ms']} ms (median of {len(startup['import_runs'])})  "
+          f"first request: {startup['first_request_ms']} ms after spawn "
+          f"(cold start with schema creation: {startup['cold_start_ms']} ms)")
+    print("  heaviest imports: " + ", ".join(f"{name} {ms} ms" for name, ms in startup["heaviest_imports"]))
+
+
+def print_results(results: dict):
+    print_startup(results["startup"])
+    footprint = results["eligibility"]
+    print(f"eligibility cache: {footprint['memory_bytes']} bytes for {footprint['rolls']} roll numbers "
+          f"({footprint['bytes_per_roll']} B each, loaded in {footprint['load_ms']} ms)")
+    if "flow" not in results:
+        return
+    print(f"\n{'endpoint':<34}{'count':>7}{'err%':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in results["flow"]["endpoints"].items():
+        print(f"{name:<34}{row['count']:>7}{row['error_rate'] * 100:>7.1f}{row['throughput_rps'] or 0:>9}"
+              f"{row['p50_ms'] or 0:>10}{row['p95_ms'] or 0:>10}{row['p99_ms'] or 0:>10}")
+    for name, row in results["micro"].items():
+        print(f"{'micro.' + name:<34}{row['count']:>7}{'':>7}{'':>9}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    print(f"\nCompleted flows/s: {results['flow']['completed_flows_per_s']}  "
+          f"event-loop stalls: {results['event_loop']['stalls']}")
+
+
+def print_comparison(results: dict, baseline: dict):
+    print(f"\nCompared with {baseline.get('commit', '?')} (p50 / p99, negative is faster):")
+
+    def rows(data):
+        if "flow" not in data:
+            return
+        yield from data["flow"]["endpoints"].items()
+        yield from (("micro." + name, row) for name, row in data["micro"].items())
+
+    for metric in ("import_ms", "first_request_ms"):
+        now, before = results["startup"].get(metric), baseline.get("startup", {}).get(metric)
+        if now and before:
+            print(f"  {'startup.' + metric:<34}{(now - before) / before * 100:>+9.1f}%")
+
+    old = dict(rows(baseline))
+    for name, row in rows(results):
+        before = old.get(name)
+        if not before:
+            continue
+        deltas = []
+        for metric in ("p50_ms", "p99_ms"):
+            if row[metric] and before[metric]:
+                deltas.append(f"{(row[metric] - before[metric]) / before[metric] * 100:+.1f}%")
+            else:
+                deltas.append("n/a")
+        print(f"  {name:<34}{deltas[0]:>10}{deltas[1]:>10}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the OTP and download flows")
+    parser.add_argument("--users", type=int, default=200, help="Students driven through the flow")
+    parser.add_argument("--concurrency", type=int, default=20, help="Students in flight at once")
+    parser.add_argument("--object-size", type=int, default=200 * 1024, help="Certificate size in bytes")
+    parser.add_argument("--s3-delay-ms", type=float, default=0, help="Added latency per fake S3 request")
+    parser.add_argument("--micro-iterations", type=int, default=2000)
+    parser.add_argument("--otp-timeout", type=float, default=10, help="Seconds to wait for each OTP email")
+    parser.add_argument("--output", help="JSON results path (default: benchmark-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--startup-only", action="store_true", help="Only measure worker startup")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Fresh workers timed for startup")
+    parser.add_argument("--eager-startup", action="store_true", help="Warm up before serving (LAZY_STARTUP=False)")
+    parser.add_argument("--max-import-ms", type=float, default=0, help="Fail if `import main` is slower")
+    parser.add_argument("--max-first-request-ms", type=float, default=0,
+                        help="Fail if a restarted worker answers its first request later")
+    parser.add_argument("--max-eligibility-bytes", type=int, default=1024 * 1024,
+                        help="Fail if 100k eligible roll numbers take more memory (0 disables)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="certi5r-bench-")
+    rolls = bench_rolls(args.users)
+    prefix = tenure_prefix(DEFAULT_TENURE)
+    body = b"%PDF-1.4\n" + os.urandom(max(args.object_size - 9, 0))
+    objects = {f"{prefix}{roll.upper()}.pdf": body for roll in rolls}
+
+    s3 = FakeS3Server(free_port(), objects, delay=args.s3_delay_ms / 1000)
+    sink = SmtpSink(free_port())
+    for server in (s3, sink):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # main.py reads its configuration at import time
+    os.environ.update({
+        "ENVIRONMENT": "prod",
+        "DATABASE_PATH": os.path.join(workdir, "certificates.db"),
+        "MINIO_ENDPOINT": f"127.0.0.1:{s3.server_address[1]}",
+        "MINIO_USE_SSL": "False",
+        "BUCKET_NAME": BUCKET,
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench-secret",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(sink.server_address[1]),
+        "SMTP_USE_TLS": "False",
+        "SMTP_USERNAME": "",
+        "SMTP_PASSWORD": "",
+        "SMTP_RETRY_BACKOFF": "0.1",
+        "OTP_STORE_BACKEND": "memory",
+        # Every simulated student shares one client IP
+        "RATE_LIMIT_IP": "1000000/1",
+        "LOCAL_CERTIFICATE_DIR": os.path.join(workdir, "local"),
+        "PDF_CACHE_DIR": os.path.join(workdir, "pdf_cache"),
+        "CURRENT_TENURE": DEFAULT_TENURE,
+        "LOOP_STALL_MONITOR": "True",
+        "LAZY_STARTUP": str(not args.eager_startup),
+    })
+    os.chdir(REPO_DIR)
+
+    print(f"Timing worker startup ({args.startup_runs} runs)")
+    startup = run_startup(args.startup_runs)
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "settings": vars(args),
+        "startup": startup,
+        "eligibility": eligibility_footprint(workdir),
+    }
+    if args.startup_only:
+        s3.shutdown()
+        sink.shutdown()
+        finish(results, args)
+        return
+
+    sys.path.insert(0, os.getcwd())
+    import uvicorn
+    import main
+
+    main.init_db()
+    conn = sqlite3.connect(main.DATABASE)
+    conn.executemany(
+        "INSERT OR IGNORE INTO certificates (tenure, roll_number, has_certificate) VALUES (?, ?, 1)",
+        [(main.CURRENT_TENURE, roll) for roll in rolls]
+    )
+    conn.commit()
+    conn.close()
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    print(f"Driving {args.users} students at concurrency {args.concurrency} "
+          f"({args.object_size} byte certificates, S3 delay {args.s3_delay_ms} ms)")
+    try:
+        flow = asyncio.run(run_flow(f"http://127.0.0.1:{port}", sink, rolls, args.concurrency, args.otp_timeout))
+        micro_results = run_micro(main, rolls[0], args.micro_iterations)
+        results.update({
+            "flow": flow,
+            "micro": micro_results,
+            "event_loop": main.loop_monitor.stats(),
+            "io_pools": {"s3": main.s3_io.stats(), "db": main.db_io.stats()},
+            "email_queue": main.otp_mailer.stats(),
+        })
+    finally:
+        server.should_exit = True
+        thread.join(timeout=15)
+        s3.shutdown()
+        sink.shutdown()
+    finish(results, args)
+
+
+def finish(results: dict, args):
+    """Save and print the results, then enforce the startup budgets"""
+    output = args.output or f"benchmark-{results['commit']}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+
+    print_results(results)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+    print(f"\nResults saved to {output}")
+
+    failures = budget_failures(results, args)
+    for failure in failures:
+        print(f"Budget exceeded: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,704 @@
+"""
+SQLite access for the Zenith Club Certificate Portal.
+
+Connections are opened once in WAL mode with tuned pragmas and reused
+across requests instead of reconnecting per call, and download events
+are written behind the request in batches. Eligible roll numbers are
+kept in memory for /send-otp and reloaded when the table changes.
+"""
+
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from metrics import DOWNLOAD_LOGS_DROPPED_FULL, STAGE_SQLITE_COMMIT, STAGE_SQLITE_QUERY
+
+# download_logs.event_type values
+DOWNLOAD_EVENT = "download"
+PREVIEW_EVENT = "preview"
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free in time"""
+
+
+def is_locked_error(error: Exception) -> bool:
+    """True for SQLite lock/busy errors worth retrying"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class PooledConnection:
+    """sqlite3.Connection proxy whose close() returns it to the pool"""
+
+    def __init__(self, pool, conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Fixed-size pool of WAL-mode SQLite connections"""
+
+    def __init__(self, path: str, size: int = 8, checkout_timeout: float = 5,
+                 busy_timeout_ms: int = 5000, mmap_size: int = 64 * 1024 * 1024,
+                 cache_size_kib: int = 8192, write_attempts: int = 3, retry_backoff: float = 0.05):
+        self.path = path
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.write_attempts = write_attempts
+        self.retry_backoff = retry_backoff
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.write_retries = 0
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kib)}')
+        return conn
+
+    def connect(self) -> PooledConnection:
+        """Check out a connection; close() on it returns it to the pool"""
+        if self._closed:
+            raise PoolTimeout("Connection pool is closed")
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._opened < self.size:
+                    self._opened += 1
+                    opening = True
+                else:
+                    opening = False
+            if opening:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                started = time.monotonic()
+                try:
+                    conn = self._idle.get(timeout=self.checkout_timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"No database connection free after {self.checkout_timeout}s")
+                waited = time.monotonic() - started
+                with self._lock:
+                    self.waits += 1
+                    self.wait_seconds += waited
+                    self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        with self._lock:
+            self.checkouts += 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection, rolling back anything left uncommitted"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+            return
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    def run_write(self, work):
+        """Run work(conn) and commit, retrying with backoff if the database is locked"""
+        for attempt in range(1, self.write_attempts + 1):
+            conn = self.connect()
+            try:
+                started = time.perf_counter()
+                result = work(conn)
+                executed = time.perf_counter()
+                conn.commit()
+                STAGE_SQLITE_QUERY.observe(executed - started)
+                STAGE_SQLITE_COMMIT.observe(time.perf_counter() - executed)
+                return result
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                if not is_locked_error(e) or attempt == self.write_attempts:
+                    raise
+                with self._lock:
+                    self.write_retries += 1
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+            finally:
+                conn.close()
+
+    def stats(self) -> dict:
+        """Checkout and wait metrics"""
+        return {
+            "size": self.size,
+            "opened": self._opened,
+            "idle": self._idle.qsize(),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "avg_wait_ms": round(self.wait_seconds / self.waits * 1000, 2) if self.waits else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+            "write_retries": self.write_retries,
+        }
+
+    def close(self):
+        """Close every idle connection; checked-out ones close on release"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+
+class ThreadLocalConnections:
+    """One autocommit WAL-mode connection per thread, all closed together by close()
+
+    For small stores (OTPs, rate limits) called from whichever offload
+    thread runs the request. Every connection opened is also kept in a
+    registry, so close() on the shutdown thread closes the ones opened on
+    worker threads too; each is only ever used by its own thread.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5):
+        self.path = path
+        self.busy_timeout = busy_timeout
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        # Bumped by close(), so threads reopen instead of using a closed connection
+        self._generation = 0
+
+    def get(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.generation != self._generation:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._lock:
+                self._connections.append(conn)
+                self._local.generation = self._generation
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def close(self):
+        """Close every connection opened so far, on any thread"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error closing {self.path} connection: {e}")
+
+
+class DownloadLogWriter:
+    """Write-behind buffer for download_logs rows and download_count updates
+
+    Events are queued in memory and written by a background thread in one
+    transaction every flush_interval seconds, or sooner once max_batch
+    events are waiting. Repeated downloads of the same roll number fold
+    into a single download_count UPDATE per flush; previews are logged
+    but not counted.
+
+    A failed flush keeps its events for the next one, but the buffer never
+    holds more than max_pending events (the oldest are dropped and
+    counted), and the background thread backs off exponentially, up to
+    max_backoff seconds, while writes keep failing.
+    """
+
+    def __init__(self, pool: ConnectionPool, flush_interval: float = 0.5, max_batch: int = 500,
+                 max_pending: int = 50000, max_backoff: float = 30):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+
+        # (roll_number, tenure, email, event_type, downloaded_at UTC, local time for last_downloaded)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._consecutive_failures = 0
+
+        self.events_written = 0
+        self.events_dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+
+    def _trim(self):
+        """Drop the oldest events past max_pending; call with _lock held"""
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            self.events_dropped += excess
+            DOWNLOAD_LOGS_DROPPED_FULL.inc(excess)
+
+    def record(self, roll_number: str, tenure: str, email: str, event_type: str = DOWNLOAD_EVENT):
+        """Queue a download or preview event"""
+        # Same formats the column defaults / previous inline writes used
+        downloaded_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        with self._lock:
+            self._pending.append((roll_number, tenure, email, event_type, downloaded_at, datetime.now()))
+            self._trim()
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write every pending event in one transaction; returns how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            counts = {}
+            for roll_number, tenure, _, event_type, _, local_time in batch:
+                if event_type == DOWNLOAD_EVENT:
+                    total, _ = counts.get((tenure, roll_number), (0, None))
+                    counts[(tenure, roll_number)] = (total + 1, local_time)
+
+            def write(conn):
+                conn.executemany(
+                    "INSERT INTO download_logs (roll_number, tenure, email, event_type, downloaded_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [event[:5] for event in batch]
+                )
+                conn.executemany(
+                    "UPDATE certificates SET download_count = download_count + ?, last_downloaded = ? "
+                    "WHERE tenure = ? AND roll_number = ? COLLATE NOCASE",
+                    [(total, last, tenure, roll_number) for (tenure, roll_number), (total, last) in counts.items()]
+                )
+
+            started = time.monotonic()
+            try:
+                self.pool.run_write(write)
+            except Exception as e:
+                print(f"Failed to flush download logs: {e}")
+                self.failed_flushes += 1
+                self._consecutive_failures += 1
+                # Put the batch back in front so the next flush retries it
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._trim()
+                return 0
+
+            self._consecutive_failures = 0
+            self.last_flush_ms = round((time.monotonic() - started) * 1000, 2)
+            self.flushes += 1
+            self.events_written += len(batch)
+            return len(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._consecutive_failures:
+                # Don't hammer a database that keeps failing; a full buffer can't cut this short
+                delay = min(self.flush_interval * 2 ** min(self._consecutive_failures, 16), self.max_backoff)
+                if self._stop.wait(delay):
+                    break
+            else:
+                self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="download-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still pending"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        """Buffer depth and flush metrics"""
+        return {
+            "pending": len(self._pending),
+            "events_written": self.events_written,
+            "events_dropped": self.events_dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+def _merge_duplicate_roll_numbers(conn):
+    """Fold rows whose roll numbers differ only by case/whitespace into one lowercase row"""
+    duplicates = conn.execute('''
+        SELECT lower(trim(roll_number)) AS roll, MIN(id) AS keep_id,
+               MAX(has_certificate), SUM(download_count), MAX(last_downloaded), MIN(created_at)
+        FROM certificates
+        GROUP BY lower(trim(roll_number))
+        HAVING COUNT(*) > 1
+    ''').fetchall()
+    for roll, keep_id, has_cert, downloads, last_downloaded, created_at in duplicates:
+        conn.execute(
+            'DELETE FROM certificates WHERE lower(trim(roll_number)) = ? AND id != ?',
+            (roll, keep_id)
+        )
+        conn.execute('''
+            UPDATE certificates
+            SET has_certificate = ?, download_count = ?, last_downloaded = ?, created_at = ?
+            WHERE id = ?
+        ''', (has_cert, downloads, last_downloaded, created_at, keep_id))
+    conn.execute('UPDATE certificates SET roll_number = lower(trim(roll_number))')
+    conn.execute('UPDATE download_logs SET roll_number = lower(trim(roll_number))')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_certificates_roll_nocase
+        ON certificates (roll_number COLLATE NOCASE)
+    ''')
+
+
+def _eligibility_triggers(conn):
+    """Bump a version row whenever eligibility-relevant certificate columns change"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('eligibility', 0)")
+    for name, event in (
+        ("trg_eligibility_insert", "AFTER INSERT ON certificates"),
+        ("trg_eligibility_delete", "AFTER DELETE ON certificates"),
+        # Upserts that leave eligibility unchanged don't count as a change
+        ("trg_eligibility_update", "AFTER UPDATE OF roll_number, has_certificate ON certificates "
+                                   "WHEN OLD.roll_number IS NOT NEW.roll_number "
+                                   "OR OLD.has_certificate IS NOT NEW.has_certificate"),
+    ):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} {event}
+            BEGIN
+                UPDATE cache_versions SET version = version + 1 WHERE name = 'eligibility';
+            END
+        ''')
+
+
+def _tenure_catalog(conn):
+    """Give every certificate a tenure, unique per (tenure, roll_number)
+
+    SQLite can't drop the column-level UNIQUE on roll_number, so the table
+    is rebuilt. Every existing row belongs to 2024-25, the only tenure
+    served before this migration.
+    """
+    conn.execute('''
+        CREATE TABLE certificates_by_tenure (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenure TEXT NOT NULL,
+            roll_number TEXT NOT NULL,
+            has_certificate INTEGER DEFAULT 0,
+            download_count INTEGER DEFAULT 0,
+            last_downloaded DATETIME,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO certificates_by_tenure
+            (id, tenure, roll_number, has_certificate, download_count, last_downloaded, created_at)
+        SELECT id, '2024-25', roll_number, has_certificate, download_count, last_downloaded, created_at
+        FROM certificates
+    ''')
+    conn.execute('DROP TABLE certificates')
+    conn.execute('ALTER TABLE certificates_by_tenure RENAME TO certificates')
+    conn.execute('''
+        CREATE UNIQUE INDEX idx_certificates_tenure_roll
+        ON certificates (tenure, roll_number COLLATE NOCASE)
+    ''')
+    # Covers "every certificate of one student" without touching the table
+    conn.execute('''
+        CREATE INDEX idx_certificates_roll_tenures
+        ON certificates (roll_number COLLATE NOCASE, has_certificate, tenure)
+    ''')
+    conn.execute('ALTER TABLE download_logs ADD COLUMN tenure TEXT')
+    conn.execute("UPDATE download_logs SET tenure = '2024-25'")
+    # The eligibility triggers went with the old table
+    _eligibility_triggers(conn)
+
+
+def _download_analytics(conn):
+    """Event types, reporting indexes and rollup tables for download_logs
+
+    Rows logged before this migration mixed previews and downloads, so
+    they are marked 'unknown'. The rollups start empty with a high-water
+    mark of 0 and catch up on the first analytics.rollup() run.
+    """
+    conn.execute("ALTER TABLE download_logs ADD COLUMN event_type TEXT NOT NULL DEFAULT 'download'")
+    conn.execute("UPDATE download_logs SET event_type = 'unknown'")
+    # Covers one student's history (by tenure and event type) without touching the table
+    conn.execute('''
+        CREATE INDEX idx_download_logs_roll
+        ON download_logs (roll_number COLLATE NOCASE, tenure, event_type, downloaded_at)
+    ''')
+    conn.execute('CREATE INDEX idx_download_logs_email ON download_logs (email, downloaded_at)')
+    # Retention archiving walks old rows by time
+    conn.execute('CREATE INDEX idx_download_logs_time ON download_logs (downloaded_at)')
+
+    conn.execute('''
+        CREATE TABLE download_rollup_hourly (
+            hour TEXT NOT NULL,                 -- YYYY-MM-DD HH (UTC)
+            tenure TEXT NOT NULL,
+            program TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            events INTEGER NOT NULL,
+            PRIMARY KEY (hour, tenure, program, event_type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE download_rollup_daily (
+            day TEXT NOT NULL,                  -- YYYY-MM-DD (UTC)
+            tenure TEXT NOT NULL,
+            roll_number TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            program TEXT NOT NULL,
+            events INTEGER NOT NULL,
+            PRIMARY KEY (day, tenure, roll_number, event_type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE rollup_watermarks (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute("INSERT INTO rollup_watermarks (name, last_id) VALUES ('download_logs', 0)")
+    # Same columns as download_logs, without its indexes
+    conn.execute('''
+        CREATE TABLE download_logs_archive (
+            id INTEGER PRIMARY KEY,
+            roll_number TEXT NOT NULL,
+            tenure TEXT,
+            email TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            downloaded_at TIMESTAMP
+        )
+    ''')
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    (1, _merge_duplicate_roll_numbers),
+    (2, _eligibility_triggers),
+    (3, _tenure_catalog),
+    (4, _download_analytics),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn) -> int:
+    """Schema version of a database (0 for a new one)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """Apply pending schema migrations in one transaction; returns the schema version"""
+    version = schema_version(conn)
+    pending = [(target, step) for target, step in MIGRATIONS if target > version]
+    if not pending:
+        return version
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        # Another process may have migrated while we waited for the lock
+        version = schema_version(conn)
+        for target, step in pending:
+            if target > version:
+                step(conn)
+                version = target
+        conn.execute(f'PRAGMA user_version = {int(version)}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version
+
+
+
+class EligibilityCache:
+    """In-memory set of roll numbers that have a certificate
+
+    Roll numbers of up to 12 characters ([0-9a-z]) are packed as base-36
+    integers into a sorted array('Q') and found by binary search, which
+    takes 8 bytes per roll number (about 0.8 MB for 100k; benchmark.py
+    checks this against a budget). Base-36 drops leading zeros, so only
+    roll numbers that don't start with '0' are packed; those that do,
+    and longer ones, fall back to a frozenset.
+
+    Staleness is detected with PRAGMA data_version on a dedicated
+    connection, checked at most every check_interval seconds. When
+    another connection has committed, the trigger-maintained
+    'eligibility' row in cache_versions is read, and the set is reloaded
+    only if it changed. Download-count updates therefore never force a
+    reload.
+    """
+
+    MAX_PACKED_LENGTH = 12  # 36**12 < 2**64
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+
+        self._conn = None
+        self._lock = threading.Lock()
+        self._keys = array('Q')
+        self._overflow = frozenset()
+        self._data_version = None
+        self._version = None
+        self._last_check = 0.0
+
+        self.loads = 0
+        self.checks = 0
+
+    @classmethod
+    def _pack(cls, roll_number: str):
+        # "0220bca001" would pack to the same integer as "220bca001"
+        if (0 < len(roll_number) <= cls.MAX_PACKED_LENGTH and roll_number[0] != "0"
+                and roll_number.isascii() and roll_number.isalnum()):
+            return int(roll_number, 36)
+        return None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        return self._conn
+
+    def _read_version(self, conn):
+        row = conn.execute("SELECT version FROM cache_versions WHERE name = 'eligibility'").fetchone()
+        return row[0] if row else None
+
+    def load(self):
+        """(Re)load every eligible roll number"""
+        with self._lock:
+            started = time.perf_counter()
+            conn = self._connection()
+            self._data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            self._version = self._read_version(conn)
+            packed, overflow = [], set()
+            # Eligible in any tenure; which ones is looked up after OTP verification
+            for (roll_number,) in conn.execute(
+                'SELECT DISTINCT roll_number FROM certificates WHERE has_certificate = 1'
+            ):
+                roll_number = roll_number.strip().lower()
+                key = self._pack(roll_number)
+                if key is None:
+                    overflow.add(roll_number)
+                else:
+                    packed.append(key)
+            packed.sort()
+            self._keys = array('Q', packed)
+            self._overflow = frozenset(overflow)
+            self._last_check = time.monotonic()
+            self.loads += 1
+            STAGE_SQLITE_QUERY.observe(time.perf_counter() - started)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            self.checks += 1
+            conn = self._connection()
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            if self._read_version(conn) == self._version:
+                return
+        self.load()
+
+    def is_eligible(self, roll_number: str) -> bool:
+        """True if the (normalized) roll number has a certificate"""
+        try:
+            self._maybe_reload()
+        except sqlite3.Error as e:
+            print(f"Eligibility cache check failed, serving cached data: {e}")
+        key = self._pack(roll_number)
+        if key is None:
+            return roll_number in self._overflow
+        keys = self._keys
+        i = bisect_left(keys, key)
+        return i < len(keys) and keys[i] == key
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the cached roll numbers"""
+        return (
+            self._keys.buffer_info()[1] * self._keys.itemsize
+            + sys.getsizeof(self._overflow)
+            + sum(sys.getsizeof(roll) for roll in self._overflow)
+        )
+
+    def stats(self) -> dict:
+        """Cache size, footprint and reload counters"""
+        return {
+            "eligible": len(self._keys) + len(self._overflow),
+            "memory_bytes": self.memory_bytes(),
+            "loads": self.loads,
+            "checks": self.checks,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
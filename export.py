@@ -0,0 +1,147 @@
+"""
+Bulk certificate export for the Zenith Club Certificate Portal.
+
+Builds a ZIP archive on the fly while it is being sent: entries are
+written in stored mode (PDFs don't compress further), so each one is
+just a local header followed by the object's bytes, and only the small
+central directory is kept until the end. A bounded number of objects are
+fetched ahead in parallel, so memory is limited by the fetch window, not
+by the number of certificates, and nothing is written to disk.
+"""
+
+import asyncio
+import struct
+import zlib
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_VERSION = 20
+ZIP64_VERSION = 45
+UTF8_FLAG = 0x0800
+
+
+def _dos_datetime(value: Optional[datetime]):
+    """(time, date) in MS-DOS format; ZIP can't represent dates before 1980"""
+    if value is None or value.year < 1980:
+        return 0, (1 << 5) | 1
+    return (
+        (value.hour << 11) | (value.minute << 5) | (value.second // 2),
+        ((value.year - 1980) << 9) | (value.month << 5) | value.day,
+    )
+
+
+class ZipWriter:
+    """Incremental writer for a stored-mode (uncompressed) ZIP archive
+
+    Each add() returns the bytes to send for that entry; finish() returns
+    the central directory. ZIP64 records are used once the archive grows
+    past 4 GiB or 65535 entries.
+    """
+
+    def __init__(self):
+        # (name, crc, size, dos_time, dos_date, offset) per entry
+        self._entries = []
+        self._offset = 0
+
+    @property
+    def size(self) -> int:
+        """Bytes produced so far"""
+        return self._offset
+
+    def add(self, name: str, data: bytes, modified: Optional[datetime] = None) -> bytes:
+        """Local header for one file; send it followed by data"""
+        if len(data) >= ZIP64_LIMIT:
+            raise ValueError(f"{name} is too large for a stored ZIP entry")
+        encoded = name.encode("utf-8")
+        crc = zlib.crc32(data)
+        dos_time, dos_date = _dos_datetime(modified)
+        header = struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, ZIP_VERSION, UTF8_FLAG, 0, dos_time, dos_date,
+            crc, len(data), len(data), len(encoded), 0
+        ) + encoded
+        self._entries.append((encoded, crc, len(data), dos_time, dos_date, self._offset))
+        self._offset += len(header) + len(data)
+        return header
+
+    def finish(self) -> bytes:
+        """Central directory and end-of-archive records"""
+        directory = []
+        for encoded, crc, size, dos_time, dos_date, offset in self._entries:
+            extra = b""
+            version = ZIP_VERSION
+            if offset >= ZIP64_LIMIT:
+                extra = struct.pack("<HHQ", 0x0001, 8, offset)
+                version = ZIP64_VERSION
+                offset = ZIP64_LIMIT
+            directory.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, version, version, UTF8_FLAG, 0, dos_time, dos_date,
+                crc, size, size, len(encoded), len(extra), 0, 0, 0, 0o100644 << 16, offset
+            ) + encoded + extra)
+
+        directory = b"".join(directory)
+        start, count = self._offset, len(self._entries)
+        tail = b""
+        if count >= 0xFFFF or start >= ZIP64_LIMIT or len(directory) >= ZIP64_LIMIT:
+            zip64_end = start + len(directory)
+            tail = struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44, ZIP64_VERSION, ZIP64_VERSION, 0, 0,
+                count, count, len(directory), start
+            ) + struct.pack("<IIQI", 0x07064B50, 0, zip64_end, 1)
+            count = min(count, 0xFFFF)
+            start = min(start, ZIP64_LIMIT)
+        tail += struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, count, count, min(len(directory), ZIP64_LIMIT), start, 0
+        )
+        self._offset += len(directory) + len(tail)
+        return directory + tail
+
+
+async def stream_zip(items, fetch, concurrency: int = 8):
+    """Yield a ZIP of fetched certificates, keeping at most `concurrency` fetches in flight
+
+    items: iterable of roll numbers, written in order
+    fetch: async callable returning (filename, bytes, last_modified) or None if not found
+
+    Roll numbers that are missing or fail to fetch are listed in a
+    MISSING.txt entry at the end instead of aborting the archive.
+    """
+    writer = ZipWriter()
+    items = iter(items)
+    pending = deque()
+    missing = []
+
+    def top_up():
+        while len(pending) < concurrency:
+            roll = next(items, None)
+            if roll is None:
+                return
+            pending.append((roll, asyncio.ensure_future(fetch(roll))))
+
+    try:
+        top_up()
+        while pending:
+            roll, task = pending.popleft()
+            try:
+                result = await task
+            except Exception as e:
+                print(f"Export: failed to fetch {roll}: {e}")
+                result = None
+            top_up()
+            if result is None:
+                missing.append(roll)
+                continue
+            filename, data, modified = result
+            yield writer.add(filename, data, modified)
+            yield data
+
+        if missing:
+            report = "".join(f"{roll}\n" for roll in missing).encode("utf-8")
+            yield writer.add("MISSING.txt", report, datetime.now())
+            yield report
+        yield writer.finish()
+    finally:
+        # Client went away (or we finished): don't leave fetches running
+        for _, task in pending:
+            task.cancel()
@@ -0,0 +1,184 @@
+"""
+Bucket inventory for the Zenith Club Certificate Portal.
+
+Walks every page of a bucket prefix and streams the result as NDJSON,
+one JSON object per line, ending with a summary line. Only one listing
+page is held in memory at a time, so this works the same for 100 or
+100k+ objects.
+
+The diff against the certificates table loads the listing page by page
+into a temporary SQLite table and lets SQLite do the anti-joins, so it
+also runs in constant Python memory.
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+
+from storage import normalize_object_roll
+
+
+def ndjson(record: dict) -> bytes:
+    return (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def iter_objects(s3_client, bucket: str, prefix: str, page_size: int = 1000):
+    """Yield every object under prefix, one listing page at a time"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    pages = paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={'PageSize': page_size})
+    for page in pages:
+        yield from page.get('Contents', [])
+
+
+class InventorySummary:
+    """Running totals over an object listing"""
+
+    def __init__(self, bucket: str, prefix: str):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.count = 0
+        self.total_bytes = 0
+        self.newest = None
+        self.oldest = None
+
+    def add(self, obj: dict):
+        self.count += 1
+        self.total_bytes += obj['Size']
+        modified = obj['LastModified']
+        if self.newest is None or modified > self.newest['LastModified']:
+            self.newest = obj
+        if self.oldest is None or modified < self.oldest['LastModified']:
+            self.oldest = obj
+
+    def as_dict(self, complete: bool = True, error: str = None) -> dict:
+        def describe(obj):
+            return {"key": obj['Key'], "last_modified": _iso(obj['LastModified'])} if obj else None
+
+        record = {
+            "type": "summary",
+            "bucket": self.bucket,
+            "prefix": self.prefix,
+            "count": self.count,
+            "total_bytes": self.total_bytes,
+            "newest": describe(self.newest),
+            "oldest": describe(self.oldest),
+            "complete": complete,
+        }
+        if error:
+            record["error"] = error
+        return record
+
+
+def _iso(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def stream_inventory(s3_client, bucket: str, prefix: str, include_objects: bool = True,
+                     page_size: int = 1000):
+    """NDJSON lines for every object (optional) followed by a summary line"""
+    summary = InventorySummary(bucket, prefix)
+    try:
+        for obj in iter_objects(s3_client, bucket, prefix, page_size):
+            summary.add(obj)
+            if include_objects:
+                yield ndjson({
+                    "type": "object",
+                    "key": obj['Key'],
+                    "roll_number": normalize_object_roll(obj['Key'], prefix) or None,
+                    "size": obj['Size'],
+                    "etag": obj.get('ETag'),
+                    "last_modified": _iso(obj['LastModified']),
+                })
+    except Exception as e:
+        print(f"Inventory listing failed: {e}")
+        yield ndjson(summary.as_dict(complete=False, error=str(e)))
+        return
+    yield ndjson(summary.as_dict())
+
+
+def stream_diff(s3_client, bucket: str, prefix: str, database_path: str, tenure: str,
+                page_size: int = 1000):
+    """NDJSON lines describing mismatches between a tenure's prefix and its certificates rows
+
+    - missing: has_certificate = 1 but no object in the bucket
+    - orphaned: an object with no row in the certificates table
+    - unflagged: an object whose row still has has_certificate = 0
+    - unrecognized: an object whose key isn't a {ROLL_NUMBER}.pdf file
+    """
+    summary = InventorySummary(bucket, prefix)
+    counts = {"missing": 0, "orphaned": 0, "unflagged": 0, "unrecognized": 0, "duplicate": 0}
+    # Starlette advances this generator with iterate_in_threadpool, so each
+    # next() may run on a different thread (but never two at once)
+    conn = sqlite3.connect(database_path, check_same_thread=False)
+    try:
+        conn.execute('''
+            CREATE TEMP TABLE inventory_objects (
+                roll_number TEXT PRIMARY KEY COLLATE NOCASE,
+                key TEXT NOT NULL,
+                size INTEGER NOT NULL
+            )
+        ''')
+
+        batch = []
+
+        def insert(rows):
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO inventory_objects (roll_number, key, size) VALUES (?, ?, ?)', rows
+            )
+            # Case variants of a key already listed collapse onto one roll number
+            counts["duplicate"] += len(rows) - (conn.total_changes - before)
+
+        try:
+            for obj in iter_objects(s3_client, bucket, prefix, page_size):
+                summary.add(obj)
+                roll = normalize_object_roll(obj['Key'], prefix)
+                if not roll:
+                    counts["unrecognized"] += 1
+                    yield ndjson({"type": "unrecognized", "key": obj['Key'], "size": obj['Size']})
+                    continue
+                batch.append((roll.lower(), obj['Key'], obj['Size']))
+                if len(batch) >= page_size:
+                    insert(batch)
+                    batch = []
+            if batch:
+                insert(batch)
+        except Exception as e:
+            print(f"Inventory listing failed: {e}")
+            yield ndjson(dict(summary.as_dict(complete=False, error=str(e)), differences=counts))
+            return
+
+        queries = (
+            ("missing", '''
+                SELECT c.roll_number, NULL, NULL FROM certificates c
+                WHERE c.tenure = :tenure AND c.has_certificate = 1 AND NOT EXISTS (
+                    SELECT 1 FROM inventory_objects i WHERE i.roll_number = c.roll_number COLLATE NOCASE
+                )
+                ORDER BY c.roll_number
+            '''),
+            ("orphaned", '''
+                SELECT i.roll_number, i.key, i.size FROM inventory_objects i
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM certificates c
+                    WHERE c.tenure = :tenure AND c.roll_number = i.roll_number COLLATE NOCASE
+                )
+                ORDER BY i.roll_number
+            '''),
+            ("unflagged", '''
+                SELECT i.roll_number, i.key, i.size FROM inventory_objects i
+                JOIN certificates c ON c.tenure = :tenure AND c.roll_number = i.roll_number COLLATE NOCASE
+                WHERE c.has_certificate = 0
+                ORDER BY i.roll_number
+            '''),
+        )
+        for kind, sql in queries:
+            for roll_number, key, size in conn.execute(sql, {"tenure": tenure}):
+                counts[kind] += 1
+                record = {"type": kind, "roll_number": roll_number}
+                if key is not None:
+                    record.update(key=key, size=size)
+                yield ndjson(record)
+
+        yield ndjson(dict(summary.as_dict(), differences=counts))
+    finally:
+        conn.close()
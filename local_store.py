@@ -0,0 +1,105 @@
+"""
+Local certificate store for the Zenith Club Certificate Portal.
+
+Indexes a dedicated directory of {ROLL_NUMBER}.pdf files by exact roll
+number, so the S3 fallback path doesn't scan the directory per request.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+
+class LocalCertificateStore:
+    """Exact-match index of roll number -> local certificate PDF"""
+
+    def __init__(self, directory: str, rescan_interval: float = 5):
+        self.directory = directory
+        # Minimum seconds between directory mtime checks
+        self.rescan_interval = rescan_interval
+
+        # roll number (uppercase) -> {"path", "size", "mtime"}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._dir_mtime = None
+        self._last_check = 0.0
+
+        self.scans = 0
+
+    def scan(self):
+        """Rebuild the index from the directory listing"""
+        entries = {}
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    name = item.name
+                    if not name.lower().endswith(".pdf") or not item.is_file():
+                        continue
+                    roll = name[:-4].upper()
+                    # Prefer the uppercase filename when both case variants exist
+                    if roll in entries and name[:-4] != roll:
+                        continue
+                    stat_result = item.stat()
+                    entries[roll] = {
+                        "path": item.path,
+                        "size": stat_result.st_size,
+                        "mtime": stat_result.st_mtime,
+                    }
+        except FileNotFoundError:
+            dir_mtime = None
+        except OSError as e:
+            print(f"Failed to scan local certificates in {self.directory}: {e}")
+            return
+
+        with self._lock:
+            self._entries = entries
+            self._dir_mtime = dir_mtime
+            self.scans += 1
+
+    def _maybe_rescan(self):
+        """Rescan if the directory changed since the last scan"""
+        now = time.monotonic()
+        if now - self._last_check < self.rescan_interval:
+            return
+        self._last_check = now
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            dir_mtime = None
+        if dir_mtime != self._dir_mtime or self.scans == 0:
+            self.scan()
+
+    def lookup(self, roll_number: str) -> Optional[dict]:
+        """Return {"path", "size", "mtime"} for a roll number, or None"""
+        self._maybe_rescan()
+        roll = roll_number.strip().upper()
+        entry = self._entries.get(roll)
+        if entry is None:
+            return None
+
+        # Files overwritten in place don't touch the directory mtime
+        try:
+            stat_result = os.stat(entry["path"])
+        except OSError:
+            with self._lock:
+                self._entries.pop(roll, None)
+            return None
+        if stat_result.st_size != entry["size"] or stat_result.st_mtime != entry["mtime"]:
+            entry = {"path": entry["path"], "size": stat_result.st_size, "mtime": stat_result.st_mtime}
+            with self._lock:
+                self._entries[roll] = entry
+        return entry
+
+    def exists(self, roll_number: str) -> bool:
+        """True if a local certificate exists for the roll number"""
+        return self.lookup(roll_number) is not None
+
+    def stats(self) -> dict:
+        """Snapshot of the local index"""
+        return {
+            "directory": self.directory,
+            "entries": len(self._entries),
+            "scans": self.scans,
+        }
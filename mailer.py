@@ -0,0 +1,318 @@
+"""
+Background OTP email delivery for the Zenith Club Certificate Portal.
+
+Messages are queued in-process and sent by a small pool of worker
+threads, each holding one long-lived authenticated SMTP connection, so
+request handlers never wait on the SMTP server.
+"""
+
+import email.quoprimime
+import itertools
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from email.header import Header
+from email.utils import formataddr
+from typing import NamedTuple, Optional
+
+from metrics import EMAIL_FAILED, EMAIL_RETRIED, EMAIL_SENT, STAGE_SMTP_SEND, STAGE_TEMPLATE_RENDER
+from offload import LatencyWindow
+
+# Errors that will not go away by retrying the same message
+PERMANENT_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPAuthenticationError,
+)
+
+
+class MailQueueFull(Exception):
+    """Raised when the delivery queue cannot take another message"""
+
+
+class PreparedMessage(NamedTuple):
+    """An already-serialized message ready for SMTP sendmail"""
+    from_addr: str
+    to_addr: str
+    data: bytes
+
+
+def _qp(text: str) -> str:
+    """Quoted-printable encode UTF-8 text with CRLF line endings"""
+    return email.quoprimime.body_encode(text.encode("utf-8").decode("latin-1"), eol="\r\n")
+
+
+def _concat(segments: list, glue: str, more: list) -> list:
+    """Join two slot-separated segment lists, gluing the last onto the first"""
+    return segments[:-1] + [segments[-1] + glue + more[0]] + more[1:]
+
+
+class OtpEmailTemplate:
+    """OTP email rendered and serialized once, with per-send recipient/OTP slots
+
+    The Jinja2 templates are rendered a single time with a placeholder OTP
+    and quoted-printable encoded around each placeholder, so a send only
+    joins pre-encoded segments with the recipient and the code.
+    """
+
+    OTP_SLOT = "ZENITHOTPSLOT"
+    PART_HEADERS = 'Content-Type: text/{subtype}; charset="utf-8"\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n'
+
+    def __init__(self, env, html_template: str, from_name: str, from_addr: str, subject: str,
+                 text_template: Optional[str] = None, context: Optional[dict] = None):
+        context = dict(context or {}, otp=self.OTP_SLOT)
+        html = env.get_template(html_template).render(**context)
+
+        if not subject.isascii():
+            subject = Header(subject, "utf-8").encode()
+        self.from_addr = from_addr
+        self._to_prefix = f"From: {formataddr((from_name, from_addr))}\r\nTo: "
+        headers = f"\r\nSubject: {subject}\r\nMIME-Version: 1.0\r\n"
+
+        if text_template is None:
+            segments = _concat([headers + self.PART_HEADERS.format(subtype="html")], "", self._split(html))
+        else:
+            text = env.get_template(text_template).render(**context)
+            boundary = f"===============zenith{uuid.uuid4().hex}=="
+            segments = [
+                headers
+                + f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n\r\n'
+                + f"--{boundary}\r\n" + self.PART_HEADERS.format(subtype="plain")
+            ]
+            segments = _concat(segments, "", self._split(text))
+            segments = _concat(segments, f"\r\n--{boundary}\r\n" + self.PART_HEADERS.format(subtype="html"), self._split(html))
+            segments[-1] += f"\r\n--{boundary}--\r\n"
+
+        self._segments = segments
+
+    def _split(self, body: str) -> list:
+        """QP-encode the text between OTP slots; each slot gets its own line"""
+        return [_qp(segment) for segment in body.split(self.OTP_SLOT)]
+
+    def render(self, to_addr: str, otp: str) -> PreparedMessage:
+        """Fill in the recipient and OTP and return the serialized message"""
+        if any(c in to_addr or c in otp for c in "\r\n"):
+            raise ValueError("Invalid characters in email address or OTP")
+        started = time.perf_counter()
+        body = ("=\r\n" + otp + "=\r\n").join(self._segments)
+        message = PreparedMessage(self.from_addr, to_addr, (self._to_prefix + to_addr + body).encode("utf-8"))
+        STAGE_TEMPLATE_RENDER.observe(time.perf_counter() - started)
+        return message
+
+
+class OtpMailer:
+    """In-process email queue served by a pool of persistent SMTP connections"""
+
+    def __init__(self, server: str, port: int, username: str = "", password: str = "",
+                 use_tls: bool = True, pool_size: int = 2, queue_size: int = 1000,
+                 max_attempts: int = 3, retry_backoff: float = 2, timeout: float = 15,
+                 status_history: int = 10000):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.pool_size = pool_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.status_history = status_history
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._ids = itertools.count(1)
+        self._workers = []
+        self._running = False
+
+        # message id -> {"email", "status", "attempts", "error", "queued_at", "sent_at"}
+        self._statuses = OrderedDict()
+        self._status_lock = threading.Lock()
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.connections_opened = 0
+        self._sending = 0
+        self.queue_wait = LatencyWindow()
+        self.send_time = LatencyWindow()
+
+    # -- connection handling -------------------------------------------------
+
+    def _connect(self) -> smtplib.SMTP:
+        """Open and authenticate one SMTP connection"""
+        # Use SMTP_SSL for port 465, regular SMTP with starttls for port 587
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+            if self.use_tls:
+                server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self.connections_opened += 1
+        return server
+
+    @staticmethod
+    def _disconnect(server: Optional[smtplib.SMTP]):
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    # -- status tracking -----------------------------------------------------
+
+    def _set_status(self, message_id: str, **fields):
+        with self._status_lock:
+            entry = self._statuses.get(message_id)
+            if entry is None:
+                entry = self._statuses[message_id] = {}
+                while len(self._statuses) > self.status_history:
+                    self._statuses.popitem(last=False)
+            entry.update(fields)
+
+    def status(self, message_id: str) -> Optional[dict]:
+        """Delivery status of a queued message, or None if unknown/forgotten"""
+        with self._status_lock:
+            entry = self._statuses.get(message_id)
+            return dict(entry) if entry else None
+
+    # -- queue ---------------------------------------------------------------
+
+    def enqueue(self, msg) -> str:
+        """Queue a PreparedMessage or email.message.Message and return its message id"""
+        message_id = f"otp-{next(self._ids)}"
+        self._set_status(
+            message_id,
+            email=msg.to_addr if isinstance(msg, PreparedMessage) else msg['To'],
+            status="queued",
+            attempts=0,
+            error=None,
+            queued_at=time.time(),
+            sent_at=None
+        )
+        try:
+            self._queue.put_nowait((message_id, msg, time.perf_counter()))
+        except queue.Full:
+            with self._status_lock:
+                self._statuses.pop(message_id, None)
+            raise MailQueueFull("Email delivery queue is full")
+        return message_id
+
+    def in_flight(self) -> int:
+        """Messages queued or being sent right now"""
+        return self._queue.qsize() + self._sending
+
+    def estimated_wait(self) -> float:
+        """Rough seconds until the current backlog has been sent"""
+        typical = self.send_time.summary()["p50_ms"]
+        per_message = typical / 1000 if typical else 1.0
+        return self.in_flight() * per_message / max(self.pool_size, 1)
+
+    def _deliver(self, server: Optional[smtplib.SMTP], message_id: str, msg):
+        """Send one message with bounded retries; returns the (possibly new) connection"""
+        for attempt in range(1, self.max_attempts + 1):
+            self._set_status(message_id, status="sending", attempts=attempt)
+            reused = server is not None
+            try:
+                if server is None:
+                    server = self._connect()
+                started = time.perf_counter()
+                if isinstance(msg, PreparedMessage):
+                    server.sendmail(msg.from_addr, [msg.to_addr], msg.data)
+                else:
+                    server.send_message(msg)
+                STAGE_SMTP_SEND.observe(time.perf_counter() - started)
+                self._set_status(message_id, status="sent", error=None, sent_at=time.time())
+                self.sent += 1
+                EMAIL_SENT.inc()
+                return server
+            except PERMANENT_ERRORS as e:
+                print(f"Failed to send email: {e}")
+                self._set_status(message_id, status="failed", error=str(e))
+                self.failed += 1
+                EMAIL_FAILED.inc()
+                return server
+            except Exception as e:
+                # Drop the connection; the next attempt reconnects
+                self._disconnect(server)
+                server = None
+                self._set_status(message_id, error=str(e))
+                if attempt == self.max_attempts:
+                    print(f"Failed to send email: {e}")
+                    self._set_status(message_id, status="failed")
+                    self.failed += 1
+                    EMAIL_FAILED.inc()
+                    return server
+                self.retries += 1
+                EMAIL_RETRIED.inc()
+                # An idle connection closed by the server is retried straight away
+                if not (reused and isinstance(e, smtplib.SMTPServerDisconnected)):
+                    time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+        return server
+
+    def _worker(self):
+        server = None
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    break
+                message_id, msg, queued_at = item
+                started_at = time.perf_counter()
+                self.queue_wait.add(started_at - queued_at)
+                # Several workers update this; unlocked += would lose counts
+                with self._status_lock:
+                    self._sending += 1
+                try:
+                    server = self._deliver(server, message_id, msg)
+                finally:
+                    with self._status_lock:
+                        self._sending -= 1
+                self.send_time.add(time.perf_counter() - started_at)
+            finally:
+                self._queue.task_done()
+        self._disconnect(server)
+
+    def start(self):
+        """Start the delivery workers"""
+        if self._running:
+            return
+        self._running = True
+        for i in range(self.pool_size):
+            worker = threading.Thread(target=self._worker, name=f"otp-mailer-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout: float = 10):
+        """Drain queued messages, then close every SMTP connection"""
+        if not self._running:
+            return
+        self._running = False
+        for _ in self._workers:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(timeout=max(deadline - time.monotonic(), 0))
+        self._workers = []
+
+    def stats(self) -> dict:
+        """Snapshot of queue depth, delivery counters and latencies"""
+        return {
+            "running": self._running,
+            "pool_size": self.pool_size,
+            "queued": self._queue.qsize(),
+            "sending": self._sending,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "connections_opened": self.connections_opened,
+            "queue_wait": self.queue_wait.summary(),
+            "send": self.send_time.summary(),
+        }
@@ -1,28 +1,61 @@
 from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-import sqlite3
-import boto3
-from botocore.exceptions import ClientError
-import smtplib
-import email.mime.text
-import email.mime.multipart
+from fastapi.responses import (
+    HTMLResponse, FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+)
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 import os
 from pathlib import Path
 import tempfile
 from typing import Optional
+import fnmatch
+import functools
+import importlib
+import threading
+import hmac
+import math
 import re
 import random
 import string
+import time
 from datetime import datetime, timedelta
 from decouple import config
-import requests
+from assets import StaticAssets, asset_response
+from export import stream_zip
+from analytics import RollupScheduler
+from db import (
+    DOWNLOAD_EVENT, PREVIEW_EVENT, SCHEMA_VERSION, ConnectionPool, DownloadLogWriter, EligibilityCache,
+    migrate, schema_version
+)
+from inventory import stream_diff, stream_inventory
+from local_store import LocalCertificateStore
+from mailer import OtpMailer, OtpEmailTemplate
+from metrics import (
+    LOCAL_FALLBACK_DOWNLOAD, LOCAL_FALLBACK_PREVIEW, OTP_EXPIRED, OTP_INVALID, OTP_ISSUED,
+    OTP_VERIFIED, RATE_LIMITED_EMAIL, RATE_LIMITED_IP, RATE_LIMITED_ROLL, RATE_LIMITED_SMTP,
+    REGISTRY, STAGE_PRESIGN, STAGE_TEMPLATE_RENDER
+)
+from offload import LoopStallMonitor, OffloadPool
+from pdf_cache import CertificateCache
+from otp_store import create_otp_store
+from ratelimit import Rate, create_rate_limiter
+from rolls import DEFAULT_TENURE, display_roll_number, is_valid_roll_number, is_valid_tenure, normalize_roll_number
+from storage import (
+    S3ClientManager, CertificateCatalog, PresignedUrlCache, endpoint_url, is_stale_object_error, tenure_prefix
+)
+from streaming import (
+    CertificateStreamer, RangeNotSatisfiable, UpstreamError, file_response, not_modified_response,
+    range_not_satisfiable_response, requested_range
+)
 
 # Environment Configuration
 ENVIRONMENT = config("ENVIRONMENT", default="dev").lower()
 IS_PRODUCTION = ENVIRONMENT == "prod"
 
+# Import boto3/httpx/Jinja2 in a background warm-up once the worker is serving,
+# rather than before it accepts its first request
+LAZY_STARTUP = config("LAZY_STARTUP", default=True, cast=bool)
+
 # Configure FastAPI based on environment
 app = FastAPI(
     title="Zenith Club Certificate Portal",
@@ -33,20 +66,144 @@ app = FastAPI(
     openapi_url=None if IS_PRODUCTION else "/openapi.json"
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Static files: minified, fingerprinted and precompressed at startup
+PUBLIC_BASE_URL = config("PUBLIC_BASE_URL", default="").rstrip("/")  # e.g. https://certificates.zenithclub.in
+STATIC_MINIFY = config("STATIC_MINIFY", default=True, cast=bool)
+static_assets = StaticAssets("static", minify=STATIC_MINIFY)
 
-# Templates
-templates = Jinja2Templates(directory="templates")
+# Templates (Jinja2 is only imported on first use)
+@functools.lru_cache(maxsize=None)
+def get_templates():
+    """Jinja2 templates for the index page and OTP email"""
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory="templates")
 
 # Database setup
-DATABASE = "certificates.db"
+DATABASE = config("DATABASE_PATH", default="certificates.db")
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=8, cast=int)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=5, cast=float)
+DB_BUSY_TIMEOUT_MS = config("DB_BUSY_TIMEOUT_MS", default=5000, cast=int)
+DB_MMAP_SIZE = config("DB_MMAP_SIZE", default=64 * 1024 * 1024, cast=int)
+DB_CACHE_SIZE_KIB = config("DB_CACHE_SIZE_KIB", default=8192, cast=int)
+
+# Reused WAL-mode SQLite connections
+db_pool = ConnectionPool(
+    DATABASE,
+    size=DB_POOL_SIZE,
+    checkout_timeout=DB_POOL_TIMEOUT,
+    busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+    mmap_size=DB_MMAP_SIZE,
+    cache_size_kib=DB_CACHE_SIZE_KIB
+)
+
+# Download/preview events are buffered and written in batches
+DOWNLOAD_LOG_FLUSH_MS = config("DOWNLOAD_LOG_FLUSH_MS", default=500, cast=int)
+DOWNLOAD_LOG_BATCH = config("DOWNLOAD_LOG_BATCH", default=500, cast=int)
+DOWNLOAD_LOG_MAX_PENDING = config("DOWNLOAD_LOG_MAX_PENDING", default=50000, cast=int)
+download_log_writer = DownloadLogWriter(
+    db_pool,
+    flush_interval=DOWNLOAD_LOG_FLUSH_MS / 1000,
+    max_batch=DOWNLOAD_LOG_BATCH,
+    max_pending=DOWNLOAD_LOG_MAX_PENDING
+)
+
+# Download logs are rolled up for reporting, and optionally archived after a retention window
+ANALYTICS_ROLLUP_SECONDS = config("ANALYTICS_ROLLUP_SECONDS", default=60, cast=float)
+DOWNLOAD_LOG_RETENTION_DAYS = config("DOWNLOAD_LOG_RETENTION_DAYS", default=0, cast=int)
+download_rollups = RollupScheduler(
+    db_pool,
+    interval=ANALYTICS_ROLLUP_SECONDS,
+    retention_days=DOWNLOAD_LOG_RETENTION_DAYS
+)
+
+# Blocking sqlite3 calls (OTP store, eligibility checks) run on their own threads
+DB_IO_THREADS = config("DB_IO_THREADS", default=DB_POOL_SIZE, cast=int)
+db_io = OffloadPool("db", DB_IO_THREADS)
+
+# Roll numbers with a certificate, kept in memory for /send-otp
+ELIGIBILITY_CHECK_INTERVAL = config("ELIGIBILITY_CHECK_INTERVAL", default=1, cast=float)
+eligibility_cache = EligibilityCache(DATABASE, check_interval=ELIGIBILITY_CHECK_INTERVAL)
 
 # MinIO/S3 Configuration
 MINIO_ENDPOINT = config("MINIO_ENDPOINT", default="s3.zenithclub.in")
+MINIO_USE_SSL = config("MINIO_USE_SSL", default=True, cast=bool)
 ACCESS_KEY = config("AWS_ACCESS_KEY_ID", default="your_access_key_here")
 SECRET_KEY = config("AWS_SECRET_ACCESS_KEY", default="your_secret_key_here")
 BUCKET_NAME = config("BUCKET_NAME", default="certificates")
+CURRENT_TENURE = config("CURRENT_TENURE", default=DEFAULT_TENURE)  # Used when a request names no tenure
+S3_MAX_POOL_CONNECTIONS = config("S3_MAX_POOL_CONNECTIONS", default=20, cast=int)
+S3_CONNECT_TIMEOUT = config("S3_CONNECT_TIMEOUT", default=5, cast=float)
+S3_READ_TIMEOUT = config("S3_READ_TIMEOUT", default=15, cast=float)
+S3_MAX_ATTEMPTS = config("S3_MAX_ATTEMPTS", default=3, cast=int)
+S3_TCP_KEEPALIVE = config("S3_TCP_KEEPALIVE", default=True, cast=bool)
+S3_INDEX_REFRESH_SECONDS = config("S3_INDEX_REFRESH_SECONDS", default=300, cast=float)
+S3_INDEX_MAX_STALENESS = config("S3_INDEX_MAX_STALENESS", default=900, cast=float)
+S3_INDEX_FULL_REFRESH_SECONDS = config("S3_INDEX_FULL_REFRESH_SECONDS", default=3600, cast=float)
+PRESIGN_CACHE_SIZE = config("PRESIGN_CACHE_SIZE", default=2048, cast=int)
+PRESIGN_CACHE_MIN_REMAINING = config("PRESIGN_CACHE_MIN_REMAINING", default=300, cast=float)
+
+# Local certificate fallback (used when S3/MinIO is unavailable)
+LOCAL_CERTIFICATE_DIR = config("LOCAL_CERTIFICATE_DIR", default="certificates")
+LOCAL_RESCAN_SECONDS = config("LOCAL_RESCAN_SECONDS", default=5, cast=float)
+
+# Download Configuration
+DOWNLOAD_MODE = config("DOWNLOAD_MODE", default="stream").lower()  # "stream" or "spool"
+DOWNLOAD_BUFFER_SIZE = config("DOWNLOAD_BUFFER_SIZE", default=65536, cast=int)
+DOWNLOAD_MAX_CONNECTIONS = config("DOWNLOAD_MAX_CONNECTIONS", default=50, cast=int)
+
+# On-disk certificate cache in front of S3/MinIO (0 MB disables it)
+PDF_CACHE_DIR = config("PDF_CACHE_DIR", default="pdf_cache")
+PDF_CACHE_MAX_MB = config("PDF_CACHE_MAX_MB", default=512, cast=int)
+PDF_CACHE_FILL_THREADS = config("PDF_CACHE_FILL_THREADS", default=2, cast=int)
+PDF_CACHE_PREFETCH = config("PDF_CACHE_PREFETCH", default=False, cast=bool)  # Warm the whole tenure at startup
+
+# Shared S3/MinIO client (one per worker process)
+s3_clients = S3ClientManager(
+    endpoint_url=endpoint_url(MINIO_ENDPOINT, MINIO_USE_SSL),
+    access_key=ACCESS_KEY,
+    secret_key=SECRET_KEY,
+    region_name='us-east-1',  # MinIO typically uses this
+    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+    connect_timeout=S3_CONNECT_TIMEOUT,
+    read_timeout=S3_READ_TIMEOUT,
+    max_attempts=S3_MAX_ATTEMPTS,
+    tcp_keepalive=S3_TCP_KEEPALIVE
+)
+
+# Blocking boto3/requests calls run on their own threads, so a slow S3
+# endpoint can't hold up database work or the event loop
+S3_IO_THREADS = config("S3_IO_THREADS", default=S3_MAX_POOL_CONNECTIONS, cast=int)
+s3_io = OffloadPool("s3", S3_IO_THREADS)
+
+# Roll number -> object key/size/ETag indexes, one per tenure prefix, built on first use
+certificate_catalog = CertificateCatalog(
+    s3_clients,
+    bucket=BUCKET_NAME,
+    refresh_interval=S3_INDEX_REFRESH_SECONDS,
+    max_staleness=S3_INDEX_MAX_STALENESS,
+    full_refresh_interval=S3_INDEX_FULL_REFRESH_SECONDS
+)
+
+# Local copies of certificate PDFs, keyed by object key and ETag
+certificate_cache = CertificateCache(
+    PDF_CACHE_DIR, PDF_CACHE_MAX_MB * 1024 * 1024, BUCKET_NAME, on_stale=certificate_catalog.invalidate
+)
+cache_io = OffloadPool("pdf-cache", PDF_CACHE_FILL_THREADS)
+
+# Already-signed URLs, reused while they have enough validity left
+presigned_url_cache = PresignedUrlCache(
+    max_entries=PRESIGN_CACHE_SIZE,
+    min_remaining=PRESIGN_CACHE_MIN_REMAINING
+)
+
+# Roll number -> local PDF index for the fallback path
+local_certificates = LocalCertificateStore(LOCAL_CERTIFICATE_DIR, rescan_interval=LOCAL_RESCAN_SECONDS)
+
+# Pooled async HTTP client that relays certificate bodies to the browser
+certificate_streamer = CertificateStreamer(
+    buffer_size=DOWNLOAD_BUFFER_SIZE,
+    max_connections=DOWNLOAD_MAX_CONNECTIONS
+)
 
 # SMTP Configuration
 SMTP_SERVER = config("SMTP_SERVER", default="smtp.gmail.com")
@@ -55,12 +212,97 @@ SMTP_USERNAME = config("SMTP_USERNAME", default="your_email@gmail.com")
 SMTP_PASSWORD = config("SMTP_PASSWORD", default="your_app_password")
 SMTP_FROM_NAME = config("SMTP_FROM_NAME", default="Zenith Club")
 SMTP_FROM_EMAIL = config("SMTP_FROM_EMAIL", default="noreply@zenithclub.in")
+SMTP_USE_TLS = config("SMTP_USE_TLS", default=True, cast=bool)
+SMTP_POOL_SIZE = config("SMTP_POOL_SIZE", default=2, cast=int)
+SMTP_QUEUE_SIZE = config("SMTP_QUEUE_SIZE", default=1000, cast=int)
+SMTP_MAX_ATTEMPTS = config("SMTP_MAX_ATTEMPTS", default=3, cast=int)
+SMTP_RETRY_BACKOFF = config("SMTP_RETRY_BACKOFF", default=2, cast=float)
+SMTP_TIMEOUT = config("SMTP_TIMEOUT", default=15, cast=float)
+
+# Background OTP email delivery over pooled SMTP connections
+otp_mailer = OtpMailer(
+    server=SMTP_SERVER,
+    port=SMTP_PORT,
+    username=SMTP_USERNAME,
+    password=SMTP_PASSWORD,
+    use_tls=SMTP_USE_TLS,
+    pool_size=SMTP_POOL_SIZE,
+    queue_size=SMTP_QUEUE_SIZE,
+    max_attempts=SMTP_MAX_ATTEMPTS,
+    retry_backoff=SMTP_RETRY_BACKOFF,
+    timeout=SMTP_TIMEOUT
+)
 
 # OTP Configuration
 OTP_EXPIRY_MINUTES = 10
+OTP_EMAIL_PLAIN_TEXT = config("OTP_EMAIL_PLAIN_TEXT", default=True, cast=bool)
+
+@functools.lru_cache(maxsize=None)
+def get_otp_email_template() -> OtpEmailTemplate:
+    """OTP email compiled and serialized once; only recipient and code vary per send"""
+    return OtpEmailTemplate(
+        get_templates().env,
+        "otp_email.html",
+        from_name=SMTP_FROM_NAME,
+        from_addr=SMTP_FROM_EMAIL,
+        subject="Zenith Club - Certificate Download OTP",
+        text_template="otp_email.txt" if OTP_EMAIL_PLAIN_TEXT else None,
+        context={"expiry_minutes": OTP_EXPIRY_MINUTES}
+    )
+
+# Event-loop stall detection (on by default outside production)
+LOOP_STALL_MONITOR = config("LOOP_STALL_MONITOR", default=not IS_PRODUCTION, cast=bool)
+LOOP_STALL_THRESHOLD_MS = config("LOOP_STALL_THRESHOLD_MS", default=100, cast=float)
+LOOP_DEBUG = config("LOOP_DEBUG", default=False, cast=bool)  # Log the slow callbacks themselves
+loop_monitor = LoopStallMonitor(threshold=LOOP_STALL_THRESHOLD_MS / 1000, debug=LOOP_DEBUG)
+
+# Metrics: open in development; in production only served with METRICS_TOKEN
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Admin endpoints (bucket inventory): open in development; in production only served with ADMIN_TOKEN
+ADMIN_TOKEN = config("ADMIN_TOKEN", default="")
 
-# Store OTPs temporarily (in production, use Redis or database)
-otp_store = {}
+# Bulk ZIP export for coordinators: only served with EXPORT_TOKEN (defaults to ADMIN_TOKEN)
+EXPORT_TOKEN = config("EXPORT_TOKEN", default=ADMIN_TOKEN)
+EXPORT_MAX_FILES = config("EXPORT_MAX_FILES", default=5000, cast=int)
+EXPORT_FETCH_THREADS = config("EXPORT_FETCH_THREADS", default=8, cast=int)
+EXPORT_PATTERN = re.compile(r'^[0-9a-zA-Z*?]+$')
+
+# Bulk exports fetch on their own threads so they can't crowd out /download
+export_io = OffloadPool("export", EXPORT_FETCH_THREADS)
+
+# Store OTPs temporarily ("sqlite" shares them across uvicorn workers)
+OTP_STORE_BACKEND = config("OTP_STORE_BACKEND", default="memory").lower()
+OTP_STORE_PATH = config("OTP_STORE_PATH", default="otp_store.db")
+OTP_STORE_MAX_SIZE = config("OTP_STORE_MAX_SIZE", default=100000, cast=int)
+otp_store = create_otp_store(
+    OTP_STORE_BACKEND,
+    path=OTP_STORE_PATH,
+    max_size=OTP_STORE_MAX_SIZE,
+    retention=OTP_EXPIRY_MINUTES * 60
+)
+
+# /send-otp throttling: token buckets written as "COUNT/SECONDS"
+RATE_LIMIT_BACKEND = config("RATE_LIMIT_BACKEND", default="memory").lower()  # "sqlite" shares limits across workers
+RATE_LIMIT_PATH = config("RATE_LIMIT_PATH", default="rate_limits.db")
+RATE_LIMIT_MAX_KEYS = config("RATE_LIMIT_MAX_KEYS", default=100000, cast=int)
+RATE_LIMIT_EMAIL = config("RATE_LIMIT_EMAIL", default="3/600")
+RATE_LIMIT_ROLL = config("RATE_LIMIT_ROLL", default="5/600")
+RATE_LIMIT_IP = config("RATE_LIMIT_IP", default="30/60")
+TRUST_PROXY_HEADERS = config("TRUST_PROXY_HEADERS", default=False, cast=bool)
+SMTP_MAX_IN_FLIGHT = config("SMTP_MAX_IN_FLIGHT", default=200, cast=int)
+rate_limiter = create_rate_limiter(
+    RATE_LIMIT_BACKEND,
+    {
+        "email": Rate.parse(RATE_LIMIT_EMAIL),
+        "roll": Rate.parse(RATE_LIMIT_ROLL),
+        "ip": Rate.parse(RATE_LIMIT_IP),
+    },
+    path=RATE_LIMIT_PATH,
+    max_keys=RATE_LIMIT_MAX_KEYS
+)
+RATE_LIMITED_BY_SCOPE = {"email": RATE_LIMITED_EMAIL, "roll": RATE_LIMITED_ROLL, "ip": RATE_LIMITED_IP}
 
 def get_allowed_emails():
     """Get list of allowed email domains/addresses"""
@@ -93,9 +335,7 @@ def validate_email(email: str) -> bool:
     
     # Validate roll number format (3 digits + letters + 3 digits)
     # Examples: 220btccse004, 230bca006, 240btccse046
-    roll_pattern = r'^\d{3}[a-z]+\d{3}$'
-    
-    return bool(re.match(roll_pattern, roll_number))
+    return is_valid_roll_number(roll_number)
 
 def extract_roll_number_from_email(email: str) -> str:
     """Extract roll number from email (e.g., aditya.220btccse004@sushantuniversity.edu.in -> 220btccse004)"""
@@ -113,8 +353,11 @@ def extract_roll_number_from_email(email: str) -> str:
     return parts[-1].lower()  # Return the roll number part
 
 def init_db():
-    """Initialize database"""
-    conn = sqlite3.connect(DATABASE)
+    """Create and migrate the schema; a no-op when it is already current"""
+    conn = get_db()
+    if schema_version(conn) >= SCHEMA_VERSION:
+        conn.close()
+        return
     cursor = conn.cursor()
     
     # Create certificates table
@@ -140,13 +383,14 @@ def init_db():
     ''')
     
     conn.commit()
+    
+    # Normalize roll numbers and add the case-insensitive unique index
+    migrate(conn)
     conn.close()
 
 def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get a pooled database connection (close() returns it to the pool)"""
+    return db_pool.connect()
 
 def generate_otp(email: str = ""):
     """Generate 6-digit OTP"""
@@ -155,187 +399,83 @@ def generate_otp(email: str = ""):
         return "123456"
     return ''.join(random.choices(string.digits, k=6))
 
-def send_otp_email(email_address: str, otp: str):
-    """Send OTP via email"""
+def build_otp_message(email_address: str, otp: str):
+    """Build the OTP email message from the cached template"""
+    return get_otp_email_template().render(email_address, otp)
+
+def send_otp_email(email_address: str, otp: str) -> Optional[str]:
+    """Queue the OTP email for background delivery; returns the message id"""
     try:
-        msg = email.mime.multipart.MIMEMultipart()
-        msg['From'] = f"{SMTP_FROM_NAME} <{SMTP_FROM_EMAIL}>"
-        msg['To'] = email_address
-        msg['Subject'] = "Zenith Club - Certificate Download OTP"
-        
-        body = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Zenith Club - Certificate Download OTP</title>
-            <link rel="preconnect" href="https://fonts.googleapis.com">
-            <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
-            <link href="https://fonts.googleapis.com/css2?family=Fira+Code:wght@400;500;700&display=swap" rel="stylesheet">
-        </head>
-        <body style="margin: 0; padding: 0; font-family: 'Fira Code', monospace; background: radial-gradient(1200px 800px at 10% 10%, rgba(0,255,157,0.07), transparent 60%), radial-gradient(1000px 600px at 90% 10%, rgba(0,200,255,0.06), transparent 60%), #0a0a0a; color: #f0f0f0; min-height: 100vh;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                
-                <!-- Header matching website theme -->
-                <div style="background: rgba(255,255,255,0.03); backdrop-filter: blur(10px); padding: 20px 30px; text-align: center; border-radius: 12px 12px 0 0; border: 1px solid rgba(255,255,255,0.1); position: relative; overflow: hidden;">
-                    <div style="position: absolute; top: 0; left: 0; right: 0; bottom: 0; background: linear-gradient(135deg, rgba(0,255,157,.6), rgba(0,160,255,.35)); opacity: 0.1; border-radius: 12px 12px 0 0;"></div>
-                    <div style="position: relative; z-index: 2;">
-                        <div style="display: inline-flex; align-items: center; gap: 8px; margin-bottom: 10px; line-height: 1;">
-                            <span style="color: #9ca3af; font-size: 24px; font-weight: bold;">&lt;</span>
-                            <span style="color: #ffffff; font-size: 28px; font-weight: bold; line-height: 1;">
-                                <span style="color: #00ff9d;">Z</span>enith
-                            </span>
-                            <span style="color: #9ca3af; font-size: 24px; font-weight: bold;">/&gt;</span>
-                        </div>
-                        <div style="color: #9ca3af; font-size: 14px; font-family: 'Fira Code', monospace; line-height: 1.4;">
-                            <span style="color: #00ff9d;">./certificates</span> • Tenure 2024-25
-                        </div>
-                    </div>
-                </div>
-                
-                <!-- Main content with matching glass theme -->
-                <div style="background: rgba(255,255,255,0.03); backdrop-filter: blur(10px); padding: 40px 30px; border-radius: 0 0 12px 12px; border: 1px solid rgba(255,255,255,0.1); border-top: none;">
-                    
-                    <!-- Status indicator -->
-                    <div style="display: inline-flex; align-items: center; gap: 10px; padding: 10px 18px; border-radius: 20px; border: 1px solid rgba(128, 128, 128, 0.3); background: rgba(255,255,255,0.03); color: #d1d5db; font-size: 14px; margin-bottom: 30px; font-family: 'Fira Code', monospace; line-height: 1;">
-                        <span style="height: 8px; width: 8px; border-radius: 50%; background: #00ff9d; flex-shrink: 0;"></span>
-                        <span style="white-space: nowrap;">OTP Verification • Certificate Portal</span>
-                    </div>
-                    
-                    <h2 style="color: #f0f0f0; margin: 0 0 15px 0; font-size: 26px; text-align: center; font-weight: 700; line-height: 1.3; letter-spacing: 0.5px;">🔐&nbsp;&nbsp;Authentication Required</h2>
-                    <p style="color: #9ca3af; text-align: center; margin: 0 0 30px 0; font-size: 16px; line-height: 1.5;">Enter this verification code to access your certificate</p>
-                    
-                    <!-- OTP Code Box with neon glow matching website -->
-                    <div style="background: linear-gradient(135deg, rgba(0,255,157,0.1), rgba(0,160,255,0.05)); border: 1px solid rgba(0,255,157,0.35); padding: 30px; text-align: center; border-radius: 12px; margin: 30px 0; box-shadow: 0 0 0 1px rgba(0,255,157,0.35), 0 0 30px 2px rgba(0,255,157,0.15); position: relative;">
-                        <div style="position: absolute; inset: 0; background: linear-gradient(135deg, rgba(0,255,157,.6), rgba(0,160,255,.35)); opacity: 0.1; border-radius: 12px; pointer-events: none;"></div>
-                        <div style="position: relative; z-index: 2;">
-                            <h3 style="margin: 0; font-size: 48px; letter-spacing: 12px; font-weight: bold; color: #00ff9d; text-shadow: 0 0 20px rgba(0,255,157,0.5); font-family: 'Fira Code', monospace;">{otp}</h3>
-                            <p style="margin: 15px 0 0 0; color: #9ca3af; font-size: 14px;">⏱️ Expires in 10 minutes</p>
-                        </div>
-                    </div>
-                    
-                    <!-- Security info with terminal-like styling -->
-                    <div style="background: rgba(239, 68, 68, 0.05); border: 1px solid rgba(239, 68, 68, 0.2); border-radius: 12px; padding: 20px; margin: 20px 0; font-family: 'Fira Code', monospace;">
-                        <p style="color: #fca5a5; margin: 0 0 15px 0; font-weight: bold; font-size: 16px;">🛡️ Security Notice</p>
-                        <div style="color: #fecaca; margin: 0; line-height: 1.8; font-size: 14px;">
-                            <div style="margin-bottom: 8px;">• This code expires in 10 minutes</div>
-                            <div style="margin-bottom: 8px;">• Never share this code with anyone</div>
-                            <div style="margin-bottom: 8px;">• Zenith Club will never ask for this code</div>
-                            <div>• If you didn't request this, please ignore this email</div>
-                        </div>
-                    </div>
-                    
-                    <!-- Support section with theme colors -->
-                    <div style="text-align: center; margin-top: 30px; padding-top: 20px; border-top: 1px solid rgba(255,255,255,0.1);">
-                        <p style="color: #9ca3af; font-size: 14px; margin: 0;">Need help? Contact our support team</p>
-                        <p style="color: #00ff9d; font-size: 14px; margin: 5px 0 0 0; font-weight: 500;">contact@zenithclub.in</p>
-                    </div>
-                    
-                    <!-- Footer with terminal styling -->
-                    <div style="border-top: 1px solid rgba(255,255,255,0.1); margin: 30px 0 0 0; padding: 20px 0 0 0;">
-                        <p style="font-size: 12px; color: #6b7280; text-align: center; margin: 0; line-height: 1.6; font-family: 'Fira Code', monospace;">
-                            <span style="color: #9ca3af;">$</span> <span style="color: #00ff9d;">zenith-club</span> <span style="color: #6b7280;">--automated-email</span><br>
-                            <span style="color: #6b7280; font-size: 11px;">This is an automated message from Zenith Club Certificate Portal</span><br>
-                            <span style="color: #6b7280; font-size: 11px;">Please do not reply to this email</span>
-                        </p>
-                    </div>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        msg.attach(email.mime.text.MIMEText(body, 'html'))
-        
-        # Use SMTP_SSL for port 465, regular SMTP with starttls for port 587
-        if SMTP_PORT == 465:
-            server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT)
-        else:
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-            server.starttls()
-            
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        
-        return True
+        return otp_mailer.enqueue(build_otp_message(email_address, otp))
     except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+        print(f"Failed to queue email: {e}")
+        return None
 
-def check_certificate_exists(roll_number: str) -> bool:
+def check_certificate_exists(roll_number: str, tenure: Optional[str] = None) -> bool:
     """Check if certificate exists in S3/MinIO"""
-    try:
-        s3_client = get_s3_client()
-        if not s3_client:
-            print("S3 client not available, checking local files as fallback")
-            # Fallback to local file check
-            pdf_files = [f for f in os.listdir('.') if f.endswith('.pdf') and roll_number.upper() in f.upper()]
-            return len(pdf_files) > 0
-            
-        s3_key = f"certificates/tenure2024-25/{roll_number.upper()}.pdf"
-        
-        s3_client.head_object(Bucket=BUCKET_NAME, Key=s3_key)
+    tenure = tenure or CURRENT_TENURE
+    if get_certificate_object(roll_number, tenure):
         return True
-    except ClientError as e:
-        # Try lowercase version
-        try:
-            if s3_client:
-                s3_key = f"certificates/tenure2024-25/{roll_number.lower()}.pdf"
-                s3_client.head_object(Bucket=BUCKET_NAME, Key=s3_key)
-                return True
-        except ClientError:
-            pass
-        
-        # Fallback to local file check
-        try:
-            pdf_files = [f for f in os.listdir('.') if f.endswith('.pdf') and roll_number.upper() in f.upper()]
-            return len(pdf_files) > 0
-        except Exception:
-            return False
-    except Exception as e:
-        print(f"S3 connection error: {e}")
-        # Fallback to local file check
-        try:
-            pdf_files = [f for f in os.listdir('.') if f.endswith('.pdf') and roll_number.upper() in f.upper()]
-            return len(pdf_files) > 0
-        except Exception:
-            return False
+    
+    # Fallback to local file check (local files are the current tenure's)
+    return tenure == CURRENT_TENURE and local_certificates.exists(roll_number)
 
-def update_certificate_status(roll_number: str):
+def update_certificate_status(roll_number: str, tenure: Optional[str] = None):
     """Update certificate status in database"""
-    conn = get_db()
-    cursor = conn.cursor()
+    tenure = tenure or CURRENT_TENURE
+    has_cert = 1 if check_certificate_exists(roll_number, tenure) else 0
     
-    has_cert = 1 if check_certificate_exists(roll_number) else 0
-    
-    cursor.execute(
-        "INSERT OR REPLACE INTO certificates (roll_number, has_certificate) VALUES (?, ?)",
-        (roll_number.upper(), has_cert)
-    )
-    
-    conn.commit()
-    conn.close()
+    db_pool.run_write(lambda conn: conn.execute(
+        "INSERT INTO certificates (tenure, roll_number, has_certificate) VALUES (?, ?, ?) "
+        "ON CONFLICT(tenure, roll_number) DO UPDATE SET has_certificate = excluded.has_certificate",
+        (tenure, normalize_roll_number(roll_number), has_cert)
+    ))
     return has_cert
 
+def student_tenures(roll_number: str) -> list:
+    """Every tenure a student has a certificate in, newest first (one indexed query)"""
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT tenure FROM certificates WHERE roll_number = ? COLLATE NOCASE AND has_certificate = 1 "
+            "ORDER BY tenure DESC",
+            (normalize_roll_number(roll_number),)
+        ).fetchall()
+    return [row[0] for row in rows]
+
 def get_s3_client():
-    """Get MinIO/S3 client"""
-    try:
-        return boto3.client(
-            's3',
-            endpoint_url=f'https://{MINIO_ENDPOINT}',
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name='us-east-1'  # MinIO typically uses this
-        )
-    except Exception as e:
-        print(f"Failed to create S3 client: {e}")
-        return None
+    """Get the shared MinIO/S3 client"""
+    return s3_clients.get()
+
+def warm_up():
+    """Import the heavy client libraries and build what the first requests need"""
+    started = time.perf_counter()
+    for module in ("boto3", "httpx", "jinja2") + (("requests",) if DOWNLOAD_MODE == "spool" else ()):
+        importlib.import_module(module)
+    s3_clients.get()
+    get_otp_email_template()
+    render_index_page()
+    print(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms")
 
 @app.on_event("startup")
 async def startup_event():
+    static_assets.build()
     init_db()
+    eligibility_cache.load()
+    local_certificates.scan()
+    download_log_writer.start()
+    download_rollups.start()
+    # Other tenures' indexes are built when first asked for
+    current_index = certificate_catalog.index(CURRENT_TENURE)
+    certificate_cache.load()
+    if PDF_CACHE_PREFETCH:
+        certificate_cache.start_prefetch(s3_clients, current_index)
+    otp_mailer.start()
+    if LOOP_STALL_MONITOR:
+        loop_monitor.start()
+    if LAZY_STARTUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    else:
+        warm_up()
     
     # Print startup info only in development
     if not IS_PRODUCTION:
@@ -345,14 +485,72 @@ async def startup_event():
     else:
         print("🚀 Zenith Club Certificate Portal starting in PRODUCTION mode")
         print("📚 API Documentation: DISABLED for production")
+        if not PUBLIC_BASE_URL:
+            print("⚠️ PUBLIC_BASE_URL is not set; the index page's Open Graph and canonical URLs will be relative")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await loop_monitor.stop()
+    rate_limiter.close()
+    certificate_cache.stop()
+    cache_io.close()
+    export_io.close()
+    s3_io.close()
+    db_io.close()
+    otp_store.close()
+    otp_mailer.stop()
+    certificate_catalog.stop()
+    s3_clients.close()
+    await certificate_streamer.close()
+    download_log_writer.stop()
+    download_rollups.stop()
+    eligibility_cache.close()
+    db_pool.close()
+
+def render_index_page():
+    """The index page, rendered once and then served from memory
+
+    Absolute URLs only come from PUBLIC_BASE_URL, never from the request's
+    Host header; without it the page links relative URLs.
+    """
+    def render():
+        started = time.perf_counter()
+        html = get_templates().get_template("index.html").render(
+            base_url=PUBLIC_BASE_URL, asset_url=static_assets.url
+        )
+        STAGE_TEMPLATE_RENDER.observe(time.perf_counter() - started)
+        return html
+    return static_assets.page("index.html", render)
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    """Render the index page"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    """Serve the pre-rendered index page"""
+    page = static_assets.cached_page("index.html")
+    if page is None:
+        # First request beat the warm-up: compile and render off the event loop
+        page = await run_in_threadpool(render_index_page)
+    return asset_response(page, request.headers, "no-cache")
+
+def client_ip(request: Request) -> str:
+    """Client address, taken from X-Forwarded-For when behind a trusted proxy"""
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # The last hop is the one our proxy appended
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else ""
+
+def too_many_requests(retry_after: float, error: str) -> JSONResponse:
+    """429 response with a whole-second Retry-After"""
+    return JSONResponse(
+        status_code=429,
+        content={"error": error},
+        headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+    )
 
 @app.post("/send-otp")
 async def send_otp_route(
+    request: Request,
     email: str = Form(...)
 ):
     """Send OTP to email"""
@@ -372,17 +570,27 @@ async def send_otp_route(
             content={"error": "Could not extract roll number from email"}
         )
     
-    # Check if certificate exists in database
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT has_certificate FROM certificates WHERE roll_number = ?", (roll_number.upper(),))
-    result = cursor.fetchone()
-    conn.close()
+    # Throttle per email, roll number and client IP before any lookup or email
+    limited = await db_io.run(rate_limiter.hit, {
+        "email": email.lower(),
+        "roll": normalize_roll_number(roll_number),
+        "ip": client_ip(request),
+    })
+    if limited:
+        scope, retry_after = limited
+        RATE_LIMITED_BY_SCOPE[scope].inc()
+        return too_many_requests(retry_after, "Too many OTP requests. Please wait before trying again.")
+    
+    # Shed load while the email backlog is already at its cap
+    if otp_mailer.in_flight() >= SMTP_MAX_IN_FLIGHT:
+        RATE_LIMITED_SMTP.inc()
+        return too_many_requests(otp_mailer.estimated_wait(), "Email service is busy. Please try again shortly.")
     
-    if not result or not result['has_certificate']:
+    # Check if certificate exists (in-memory copy of the certificates table)
+    if not await db_io.run(eligibility_cache.is_eligible, normalize_roll_number(roll_number)):
         return JSONResponse(
             status_code=404,
-            content={"error": f"No certificate found for roll number: {roll_number.upper()}"}
+            content={"error": f"No certificate found for roll number: {display_roll_number(roll_number)}"}
         )
     
     # Generate and send OTP
@@ -390,11 +598,13 @@ async def send_otp_route(
     expiry = datetime.now() + timedelta(minutes=OTP_EXPIRY_MINUTES)
     
     # Store OTP
-    otp_store[email] = {
+    await db_io.run(otp_store.__setitem__, email, {
         "otp": otp,
-        "roll_number": roll_number.upper(),
-        "expiry": expiry
-    }
+        "roll_number": display_roll_number(roll_number),
+        "expiry": expiry,
+        "tenures": []
+    })
+    OTP_ISSUED.inc()
     
     # Send OTP email (for demo, we'll just print it and return success)
     # Print OTP only in development mode or for dummy user
@@ -423,17 +633,17 @@ async def verify_otp_route(
 ):
     """Verify OTP and return certificate status"""
     
-    if email not in otp_store:
+    stored_data = await db_io.run(otp_store.get, email)
+    if stored_data is None:
         return JSONResponse(
             status_code=400,
             content={"error": "No OTP found for this email"}
         )
     
-    stored_data = otp_store[email]
-    
     # Check if OTP has expired
     if datetime.now() > stored_data["expiry"]:
-        del otp_store[email]
+        await db_io.run(otp_store.pop, email)
+        OTP_EXPIRED.inc()
         return JSONResponse(
             status_code=400,
             content={"error": "OTP has expired. Please request a new one."}
@@ -441,100 +651,259 @@ async def verify_otp_route(
     
     # Verify OTP
     if stored_data["otp"] != otp:
+        OTP_INVALID.inc()
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid OTP"}
+        )
+    
+    # Claim the code: of concurrent requests (in any worker) only one gets it
+    claimed = await db_io.run(otp_store.take, email, otp)
+    if claimed is None:
+        OTP_INVALID.inc()
         return JSONResponse(
             status_code=400,
             content={"error": "Invalid OTP"}
         )
     
-    # OTP is valid
-    return JSONResponse(content={"success": True, "roll_number": stored_data["roll_number"]})
+    # OTP is valid: unlock every tenure the student has a certificate in.
+    # The entry stays for the downloads, without the code, so it can't be verified again.
+    OTP_VERIFIED.inc()
+    tenures = await db_io.run(student_tenures, claimed["roll_number"])
+    await db_io.run(otp_store.__setitem__, email, dict(claimed, otp="", tenures=tenures))
+    return JSONResponse(content={
+        "success": True,
+        "roll_number": claimed["roll_number"],
+        "certificates": [{"tenure": tenure} for tenure in tenures]
+    })
 
-def generate_presigned_url(roll_number: str, expiration: int = 3600) -> Optional[str]:
+def get_certificate_object(roll_number: str, tenure: Optional[str] = None) -> Optional[dict]:
+    """Look up certificate object metadata (key, size, ETag, Last-Modified) in S3/MinIO"""
+    try:
+        if not get_s3_client():
+            print("S3 client not available")
+            return None
+        
+        entry = certificate_catalog.lookup(roll_number, tenure or CURRENT_TENURE)
+        if not entry:
+            print(f"Certificate file not found for {roll_number}")
+        return entry
+    except Exception as e:
+        print(f"S3 connection error: {e}")
+        s3_clients.mark_unhealthy(e)
+        return None
+
+def generate_presigned_url(roll_number: str, expiration: int = 3600, entry: Optional[dict] = None,
+                           tenure: Optional[str] = None) -> Optional[str]:
     """Generate presigned URL for certificate download from S3/MinIO"""
+    if entry is None:
+        entry = get_certificate_object(roll_number, tenure)
+        if not entry:
+            return None
+    
     try:
         s3_client = get_s3_client()
         if not s3_client:
             print("S3 client not available")
             return None
-            
-        # Try uppercase first
-        s3_key = f"certificates/tenure2024-25/{roll_number.upper()}.pdf"
         
-        try:
-            # Check if file exists with uppercase
-            s3_client.head_object(Bucket=BUCKET_NAME, Key=s3_key)
-        except ClientError:
-            # Try lowercase
-            s3_key = f"certificates/tenure2024-25/{roll_number.lower()}.pdf"
-            try:
-                s3_client.head_object(Bucket=BUCKET_NAME, Key=s3_key)
-            except ClientError:
-                print(f"Certificate file not found for {roll_number}")
-                return None
+        s3_key = entry["key"]
+        
+        cached_url = presigned_url_cache.get(s3_key, expiration)
+        if cached_url:
+            return cached_url
         
         # Generate presigned URL
+        signed_at = time.monotonic()
+        started = time.perf_counter()
         presigned_url = s3_client.generate_presigned_url(
             'get_object',
             Params={'Bucket': BUCKET_NAME, 'Key': s3_key},
             ExpiresIn=expiration
         )
+        STAGE_PRESIGN.observe(time.perf_counter() - started)
+        presigned_url_cache.put(s3_key, expiration, presigned_url, signed_at)
         
         return presigned_url
         
     except Exception as e:
         print(f"Error generating presigned URL: {e}")
+        s3_clients.mark_unhealthy(e)
+        return None
+
+def is_first_fetch(response) -> bool:
+    """True unless the response is a 304 or a follow-up byte range (e.g. from PDF.js)"""
+    if response.status_code == 206:
+        return response.headers.get("content-range", "").startswith("bytes 0-")
+    return response.status_code == 200
+
+def spool_certificate(presigned_url: str) -> str:
+    """Download a certificate to a temporary file and return its path"""
+    import requests
+    response = requests.get(presigned_url, stream=True)
+    response.raise_for_status()
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+        for chunk in response.iter_content(chunk_size=8192):
+            temp_file.write(chunk)
+    return temp_file.name
+
+def cache_certificate(entry: dict):
+    """Copy an object into the on-disk cache in the background
+
+    Only for responses that can't carry a copy themselves (ranges,
+    spooling, redirects); a full stream tees into the cache instead.
+    """
+    if certificate_cache.enabled:
+        cache_io.submit(fill_certificate_cache, entry)
+
+def fill_certificate_cache(entry: dict):
+    """Copy an object into the on-disk cache (runs on the cache pool)"""
+    s3_client = get_s3_client()
+    if s3_client:
+        certificate_cache.fill(s3_client, entry)
+
+def stream_cache_writer(entry: dict, byte_range):
+    """Opener for a cache writer to tee a full streamed body into, or None
+
+    The streamer only opens it (off the event loop) once the body starts.
+    """
+    if byte_range is not None:
+        cache_certificate(entry)
+        return None
+    if not certificate_cache.enabled:
         return None
+    return functools.partial(certificate_cache.writer, entry, teed=True)
+
+async def stream_certificate(presigned_url: str, entry: dict, filename: str, byte_range, open_sink,
+                             disposition: str = "attachment"):
+    """Relay an object from S3, dropping its index entry if S3 says it is gone or re-uploaded"""
+    try:
+        response = await certificate_streamer.stream(
+            presigned_url,
+            filename=filename,
+            disposition=disposition,
+            byte_range=byte_range,
+            etag=entry["etag"],
+            last_modified=entry["last_modified"],
+            open_sink=open_sink
+        )
+    except UpstreamError as e:
+        if e.status_code == 404:
+            certificate_catalog.invalidate(entry)
+            raise HTTPException(status_code=404, detail="Certificate file not found")
+        raise
+    upstream_etag = response.headers.get("etag")
+    if upstream_etag and upstream_etag != entry["etag"]:
+        # Re-uploaded since it was indexed: this body (and its ETag) is already the new version
+        certificate_catalog.invalidate(entry)
+    return response
+
+def cached_certificate_response(cached: dict, entry: dict, filename: str, request: Request,
+                                disposition: str = "attachment"):
+    """Serve a cached copy with the S3 object's validators"""
+    return file_response(
+        cached["path"], filename, request.headers, disposition=disposition,
+        size=cached["size"], etag=entry["etag"], last_modified=entry["last_modified"]
+    )
+
+def log_download(roll_number: str, tenure: str, email: str, event_type: str = DOWNLOAD_EVENT):
+    """Record a download (or preview) of a certificate"""
+    download_log_writer.record(normalize_roll_number(roll_number), tenure, email, event_type)
+
+def certificate_tenure(stored_data: dict, tenure: Optional[str]) -> str:
+    """The requested tenure, if the verified student has a certificate in it
+
+    Defaults to the current tenure, or the student's newest one if they
+    have none in the current tenure.
+    """
+    allowed = stored_data.get("tenures") or [CURRENT_TENURE]
+    if tenure is None:
+        return CURRENT_TENURE if CURRENT_TENURE in allowed else allowed[0]
+    if tenure not in allowed:
+        raise HTTPException(status_code=403, detail="Invalid access")
+    return tenure
+
+def certificate_filename(roll_number: str, tenure: str) -> str:
+    """Download filename; certificates from past tenures carry the tenure"""
+    if tenure == CURRENT_TENURE:
+        return f"{display_roll_number(roll_number)}_certificate.pdf"
+    return f"{display_roll_number(roll_number)}_{tenure}_certificate.pdf"
+
+async def release_otp(email: str, stored_data: dict, tenure: str):
+    """Drop the OTP once every certificate it unlocked has been downloaded
+
+    Raises 403 if a concurrent request already used up the OTP.
+    """
+    remaining = [other for other in stored_data.get("tenures", []) if other != tenure]
+    if remaining:
+        await db_io.run(otp_store.__setitem__, email, dict(stored_data, tenures=remaining))
+    elif await db_io.run(otp_store.pop, email) is None:
+        raise HTTPException(status_code=403, detail="Please complete OTP verification first")
 
 @app.get("/download/{roll_number}")
-async def download_certificate(roll_number: str, email: str):
-    """Download certificate PDF via presigned URL or redirect"""
+async def download_certificate(roll_number: str, email: str, request: Request, tenure: Optional[str] = None):
+    """Download certificate PDF via the S3 streaming proxy or local files"""
     
     # Verify that user has completed OTP verification
-    if email not in otp_store:
+    stored_data = await db_io.run(otp_store.get, email)
+    if stored_data is None:
         raise HTTPException(status_code=403, detail="Please complete OTP verification first")
     
-    stored_data = otp_store[email]
-    if stored_data["roll_number"] != roll_number.upper():
+    if stored_data["roll_number"] != display_roll_number(roll_number):
         raise HTTPException(status_code=403, detail="Invalid access")
     
+    tenure = certificate_tenure(stored_data, tenure)
+    filename = certificate_filename(roll_number, tenure)
+    
     try:
-        # First try to get presigned URL from S3/MinIO
-        presigned_url = generate_presigned_url(roll_number)
+        # First try the on-disk cache, then a presigned URL from S3/MinIO
+        entry = await s3_io.run(get_certificate_object, roll_number, tenure)
+        cached = certificate_cache.lookup(entry["key"], entry["etag"]) if entry else None
+        presigned_url = None
+        if entry and not cached:
+            presigned_url = await s3_io.run(generate_presigned_url, roll_number, entry=entry)
         
-        if presigned_url:
-            # Log download
-            conn = get_db()
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO download_logs (roll_number, email) VALUES (?, ?)",
-                (roll_number.upper(), email)
-            )
-            cursor.execute(
-                "UPDATE certificates SET download_count = download_count + 1, last_downloaded = ? WHERE roll_number = ?",
-                (datetime.now(), roll_number.upper())
-            )
-            conn.commit()
-            conn.close()
+        if cached or presigned_url:
+            # Answer revalidations and bad ranges from the object metadata alone
+            not_modified = not_modified_response(request.headers, entry["etag"], entry["last_modified"])
+            if not_modified:
+                return not_modified
+            try:
+                byte_range = requested_range(request.headers, entry["size"], entry["etag"], entry["last_modified"])
+            except RangeNotSatisfiable:
+                return range_not_satisfiable_response(entry["size"])
             
-            # Clean up OTP after successful download
-            if email in otp_store:
-                del otp_store[email]
+            # Log download and clean up OTP (not again for follow-up ranges)
+            if byte_range is None or byte_range[0] == 0:
+                await release_otp(email, stored_data, tenure)
+                log_download(roll_number, tenure, email)
             
-            # Download file from S3 and return as FileResponse
+            if cached:
+                return cached_certificate_response(cached, entry, filename, request)
+            
+            # Stream the object straight from S3/MinIO to the client
+            if DOWNLOAD_MODE != "spool":
+                open_sink = stream_cache_writer(entry, byte_range)
+                try:
+                    return await stream_certificate(presigned_url, entry, filename, byte_range, open_sink)
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    print(f"Error streaming from S3: {e}")
+                    cache_certificate(entry)
+                    # Fallback to redirect if streaming fails
+                    return RedirectResponse(url=presigned_url)
+            cache_certificate(entry)
+            
+            # Opt-in fallback: download file from S3 and return as FileResponse
             try:
-                response = requests.get(presigned_url, stream=True)
-                response.raise_for_status()
-                
-                # Save to temporary file
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        temp_file.write(chunk)
-                    temp_file.flush()
+                temp_path = await s3_io.run(spool_certificate, presigned_url)
                 
                 return FileResponse(
-                    temp_file.name,
+                    temp_path,
                     media_type='application/pdf',
-                    filename=f"{roll_number.upper()}_certificate.pdf"
+                    filename=filename,
+                    background=BackgroundTask(os.unlink, temp_path)
                 )
                 
             except Exception as e:
@@ -543,136 +912,171 @@ async def download_certificate(roll_number: str, email: str):
                 return RedirectResponse(url=presigned_url)
         
         else:
-            # Fallback to local files if S3 is not available
-            pdf_files = [f for f in os.listdir('.') if f.endswith('.pdf') and roll_number.upper() in f.upper()]
-            if pdf_files:
-                pdf_path = pdf_files[0]
-                
-                # Log download
-                conn = get_db()
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO download_logs (roll_number, email) VALUES (?, ?)",
-                    (roll_number.upper(), email)
-                )
-                cursor.execute(
-                    "UPDATE certificates SET download_count = download_count + 1, last_downloaded = ? WHERE roll_number = ?",
-                    (datetime.now(), roll_number.upper())
+            # Fallback to local files if S3 is not available (current tenure only)
+            local_entry = None
+            if tenure == CURRENT_TENURE:
+                local_entry = await run_in_threadpool(local_certificates.lookup, roll_number)
+            if local_entry:
+                LOCAL_FALLBACK_DOWNLOAD.inc()
+                response = file_response(
+                    local_entry["path"], filename, request.headers,
+                    size=local_entry["size"], mtime=local_entry["mtime"]
                 )
-                conn.commit()
-                conn.close()
                 
-                # Clean up OTP after successful download
-                if email in otp_store:
-                    del otp_store[email]
+                # Log download and clean up OTP
+                if is_first_fetch(response):
+                    await release_otp(email, stored_data, tenure)
+                    log_download(roll_number, tenure, email)
                 
-                return FileResponse(
-                    pdf_path,
-                    media_type='application/pdf',
-                    filename=f"{roll_number.upper()}_certificate.pdf"
-                )
+                return response
             else:
                 raise HTTPException(status_code=404, detail="Certificate file not found")
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Download error: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred while downloading: {str(e)}")
 
 @app.get("/preview/{roll_number}")
-async def preview_certificate(roll_number: str, email: str):
-    """Preview certificate PDF via presigned URL or redirect"""
+async def preview_certificate(roll_number: str, email: str, request: Request, tenure: Optional[str] = None):
+    """Preview certificate PDF inline via the S3 streaming proxy or local files"""
     
     # Verify that user has completed OTP verification
-    if email not in otp_store:
+    stored_data = await db_io.run(otp_store.get, email)
+    if stored_data is None:
         raise HTTPException(status_code=403, detail="Please complete OTP verification first")
     
-    stored_data = otp_store[email]
-    if stored_data["roll_number"] != roll_number.upper():
+    if stored_data["roll_number"] != display_roll_number(roll_number):
         raise HTTPException(status_code=403, detail="Invalid access")
     
+    tenure = certificate_tenure(stored_data, tenure)
+    filename = certificate_filename(roll_number, tenure)
+    
     try:
-        # Generate presigned URL for preview (shorter expiration)
-        presigned_url = generate_presigned_url(roll_number, expiration=900)  # 15 minutes
+        # On-disk cache first, else a presigned URL for preview (shorter expiration)
+        entry = await s3_io.run(get_certificate_object, roll_number, tenure)
+        cached = certificate_cache.lookup(entry["key"], entry["etag"]) if entry else None
+        presigned_url = None
+        if entry and not cached:
+            presigned_url = await s3_io.run(generate_presigned_url, roll_number, expiration=900, entry=entry)  # 15 minutes
         
-        if presigned_url:
+        if cached or presigned_url:
+            not_modified = not_modified_response(request.headers, entry["etag"], entry["last_modified"])
+            if not_modified:
+                return not_modified
+            try:
+                byte_range = requested_range(request.headers, entry["size"], entry["etag"], entry["last_modified"])
+            except RangeNotSatisfiable:
+                return range_not_satisfiable_response(entry["size"])
+            
             # Log preview (don't increment download count for preview)
-            conn = get_db()
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO download_logs (roll_number, email) VALUES (?, ?)",
-                (roll_number.upper(), email)
-            )
-            conn.commit()
-            conn.close()
+            if byte_range is None or byte_range[0] == 0:
+                log_download(roll_number, tenure, email, PREVIEW_EVENT)
+            
+            if cached:
+                return cached_certificate_response(cached, entry, filename, request, disposition="inline")
+            
+            if DOWNLOAD_MODE != "spool":
+                open_sink = stream_cache_writer(entry, byte_range)
+                try:
+                    return await stream_certificate(presigned_url, entry, filename, byte_range, open_sink, disposition="inline")
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    print(f"Error streaming from S3: {e}")
+            cache_certificate(entry)
             
             # Redirect to presigned URL for preview
             return RedirectResponse(url=presigned_url)
         
         else:
-            # Fallback to local files
-            pdf_files = [f for f in os.listdir('.') if f.endswith('.pdf') and roll_number.upper() in f.upper()]
-            if pdf_files:
-                pdf_path = pdf_files[0]
-                return FileResponse(
-                    pdf_path,
-                    media_type='application/pdf',
-                    filename=f"{roll_number.upper()}_certificate.pdf"
+            # Fallback to local files (current tenure only)
+            local_entry = None
+            if tenure == CURRENT_TENURE:
+                local_entry = await run_in_threadpool(local_certificates.lookup, roll_number)
+            if local_entry:
+                LOCAL_FALLBACK_PREVIEW.inc()
+                return file_response(
+                    local_entry["path"], filename, request.headers, disposition="inline",
+                    size=local_entry["size"], mtime=local_entry["mtime"]
                 )
             else:
                 raise HTTPException(status_code=404, detail="Certificate file not found")
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Preview error: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred while previewing: {str(e)}")
 
-# Additional static file routes
+# Static files and legacy unhashed asset URLs
+def static_response(path: str, request: Request):
+    response = static_assets.response(path, request.headers)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return response
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def get_static(path: str, request: Request):
+    """Serve a static file (immutable when requested by its hashed name)"""
+    return static_response(path, request)
+
 @app.get("/script.js")
-async def get_script():
+async def get_script(request: Request):
     """Serve JavaScript file"""
-    return FileResponse("static/script.js", media_type="application/javascript")
+    return static_response("script.js", request)
 
 @app.get("/style.css")
-async def get_style():
-    """Serve CSS file"""
-    return FileResponse("static/style.css", media_type="text/css")
+async def get_style(request: Request):
+    """Serve CSS file (404 until a static/style.css exists)"""
+    return static_response("style.css", request)
 
 @app.get("/favicon.ico")
-async def get_favicon():
+async def get_favicon(request: Request):
     """Serve favicon file"""
-    return FileResponse("static/favicon-32.png", media_type="image/png")
+    return static_response("favicon-32.png", request)
 
 @app.get("/test-s3")
 async def test_s3_connection():
-    """Test S3/MinIO connectivity and list available certificates"""
+    """Quick S3/MinIO connectivity check with a sample of certificates (see /inventory)"""
     try:
-        s3_client = get_s3_client()
+        # Creating the client (first use, or after a failure) blocks
+        s3_client = await s3_io.run(get_s3_client)
         if not s3_client:
             return JSONResponse(content={"error": "S3 client not available"})
         
-        # List objects in the certificates bucket
-        response = s3_client.list_objects_v2(
+        # One small page is enough to prove the bucket is reachable
+        response = await s3_io.run(
+            s3_client.list_objects_v2,
             Bucket=BUCKET_NAME,
-            Prefix="certificates/tenure2024-25/"
+            Prefix=tenure_prefix(CURRENT_TENURE),
+            MaxKeys=10
         )
         
-        files = []
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                files.append({
-                    "key": obj['Key'],
-                    "size": obj['Size'],
-                    "last_modified": obj['LastModified'].isoformat()
-                })
+        s3_clients.mark_healthy()
+        
+        files = [
+            {
+                "key": obj['Key'],
+                "size": obj['Size'],
+                "last_modified": obj['LastModified'].isoformat()
+            }
+            for obj in response.get('Contents', [])
+        ]
         
         return JSONResponse(content={
             "status": "success",
             "bucket": BUCKET_NAME,
             "endpoint": MINIO_ENDPOINT,
-            "files_found": len(files),
-            "files": files[:10]  # Show first 10 files
+            "files": files,
+            "more_files": response.get('IsTruncated', False),
+            "inventory": "/inventory",
+            "client": s3_clients.stats()
         })
         
     except Exception as e:
+        s3_clients.mark_unhealthy(e)
         return JSONResponse(content={
             "status": "error",
             "error": str(e),
@@ -680,6 +1084,160 @@ async def test_s3_connection():
             "endpoint": MINIO_ENDPOINT
         })
 
+def require_bearer_token(request: Request, token: str, required: bool = False):
+    """Reject the request unless it carries 'Authorization: Bearer <token>'
+
+    An empty token lets every request through, unless required is set,
+    in which case the endpoint fails closed with a 503.
+    """
+    if not token:
+        if required:
+            raise HTTPException(status_code=503, detail="Endpoint not configured")
+        return
+    supplied = request.headers.get("authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing token")
+
+def checked_tenure(tenure: Optional[str]) -> str:
+    """A tenure from a query parameter (default: current), rejecting malformed ones"""
+    if not tenure:
+        return CURRENT_TENURE
+    if not is_valid_tenure(tenure):
+        raise HTTPException(status_code=400, detail="Tenure must look like 2024-25")
+    return tenure
+
+def inventory_prefix(prefix: Optional[str], tenure: Optional[str]) -> str:
+    """Bucket prefix for an inventory request (defaults to the current tenure)"""
+    if tenure:
+        return tenure_prefix(checked_tenure(tenure)) + (prefix or "")
+    return prefix if prefix is not None else tenure_prefix(CURRENT_TENURE)
+
+# Bucket inventory: open in development; in production only served with ADMIN_TOKEN
+if ADMIN_TOKEN or not IS_PRODUCTION:
+    @app.get("/inventory")
+    async def bucket_inventory(request: Request, prefix: Optional[str] = None, tenure: Optional[str] = None,
+                               objects: bool = True):
+        """Stream every object under a prefix as NDJSON, ending with a summary line"""
+        require_bearer_token(request, ADMIN_TOKEN)
+        s3_client = await s3_io.run(get_s3_client)
+        if not s3_client:
+            raise HTTPException(status_code=503, detail="S3 client not available")
+        return StreamingResponse(
+            stream_inventory(s3_client, BUCKET_NAME, inventory_prefix(prefix, tenure), include_objects=objects),
+            media_type="application/x-ndjson"
+        )
+    
+    @app.get("/inventory/diff")
+    async def bucket_inventory_diff(request: Request, tenure: Optional[str] = None):
+        """Stream certificates missing from the bucket, or present but not in the database, as NDJSON"""
+        require_bearer_token(request, ADMIN_TOKEN)
+        s3_client = await s3_io.run(get_s3_client)
+        if not s3_client:
+            raise HTTPException(status_code=503, detail="S3 client not available")
+        return StreamingResponse(
+            stream_diff(s3_client, BUCKET_NAME, inventory_prefix(None, tenure), DATABASE, checked_tenure(tenure)),
+            media_type="application/x-ndjson"
+        )
+
+def read_certificate(roll_number: str, tenure: str):
+    """(filename, PDF bytes, last modified) for a certificate, or None if it doesn't exist"""
+    entry = get_certificate_object(roll_number, tenure)
+    if not entry:
+        return None
+    filename = certificate_filename(roll_number, tenure)
+    cached = certificate_cache.lookup(entry["key"], entry["etag"])
+    if cached:
+        try:
+            with open(cached["path"], "rb") as f:
+                return filename, f.read(), entry["last_modified"]
+        except FileNotFoundError:
+            pass  # Evicted since the lookup
+    s3_client = get_s3_client()
+    if not s3_client:
+        raise RuntimeError("S3 client not available")
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=entry["key"])
+    except Exception as e:
+        if is_stale_object_error(e):
+            certificate_catalog.invalidate(entry)
+        raise
+    return filename, response["Body"].read(), entry["last_modified"]
+
+async def export_roll_numbers(roll_numbers: str, pattern: str, tenure: str) -> list:
+    """Roll numbers (uppercase) selected by an explicit list and/or a glob such as 230bca*
+
+    Listed roll numbers become S3 keys and ZIP entry names, so each must
+    match the roll number format, and at most EXPORT_MAX_FILES are read.
+    """
+    requested = [roll for roll in re.split(r'[\s,]+', roll_numbers) if roll]
+    if len(requested) > EXPORT_MAX_FILES:
+        raise HTTPException(
+            status_code=400, detail=f"At most {EXPORT_MAX_FILES} certificates per export ({len(requested)} listed)"
+        )
+    invalid = [roll for roll in requested if not is_valid_roll_number(roll)]
+    if invalid:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid roll number: {invalid[0][:32]!r}"
+            + (f" (and {len(invalid) - 1} more)" if len(invalid) > 1 else "")
+        )
+    selected = dict.fromkeys(display_roll_number(roll) for roll in requested)
+    if pattern:
+        if not EXPORT_PATTERN.match(pattern):
+            raise HTTPException(status_code=400, detail="Pattern may only contain letters, digits, * and ?")
+        index = certificate_catalog.index(tenure)
+        if not index.is_fresh() and not await s3_io.run(index.refresh):
+            raise HTTPException(status_code=503, detail="Certificate index not available")
+        matches = fnmatch.filter(index.rolls(), display_roll_number(pattern))
+        selected.update(dict.fromkeys(sorted(matches)))
+    return list(selected)
+
+# Bulk export: never open, in any environment; only served with EXPORT_TOKEN (or ADMIN_TOKEN)
+if EXPORT_TOKEN:
+    @app.post("/export")
+    async def export_certificates(request: Request, roll_numbers: str = Form(""), pattern: str = Form(""),
+                                  tenure: str = Form("")):
+        """Stream a ZIP of the selected certificates, built as it is sent"""
+        require_bearer_token(request, EXPORT_TOKEN, required=True)
+        tenure = checked_tenure(tenure.strip())
+        rolls = await export_roll_numbers(roll_numbers, pattern.strip(), tenure)
+        if not rolls:
+            raise HTTPException(status_code=404, detail="No certificates selected")
+        if len(rolls) > EXPORT_MAX_FILES:
+            raise HTTPException(
+                status_code=400, detail=f"At most {EXPORT_MAX_FILES} certificates per export ({len(rolls)} selected)"
+            )
+        
+        print(f"Exporting {len(rolls)} certificates from {tenure}")
+        return StreamingResponse(
+            stream_zip(
+                rolls, lambda roll: export_io.run(read_certificate, roll, tenure), concurrency=EXPORT_FETCH_THREADS
+            ),
+            media_type="application/zip",
+            headers={"content-disposition": f'attachment; filename="certificates-{tenure}.zip"'}
+        )
+
+# Point-in-time gauges read when /metrics is scraped
+REGISTRY.gauge("certi5r_email_queue_depth", "OTP emails waiting for an SMTP worker",
+               lambda: otp_mailer.stats()["queued"])
+REGISTRY.gauge("certi5r_s3_io_queue_depth", "Calls waiting for an S3 I/O thread",
+               lambda: s3_io.stats()["queued"])
+REGISTRY.gauge("certi5r_db_io_queue_depth", "Calls waiting for a database I/O thread",
+               lambda: db_io.stats()["queued"])
+REGISTRY.gauge("certi5r_download_log_pending", "Download events not yet written",
+               lambda: download_log_writer.stats()["pending"])
+REGISTRY.gauge("certi5r_otp_store_entries", "OTPs currently stored", lambda: len(otp_store))
+REGISTRY.gauge("certi5r_pdf_cache_bytes", "Bytes of certificate PDFs in the on-disk cache",
+               lambda: certificate_cache.stats()["bytes"])
+REGISTRY.gauge("certi5r_event_loop_stalls", "Event-loop stalls above the threshold",
+               lambda: loop_monitor.stalls)
+
+if METRICS_ENABLED and (METRICS_TOKEN or not IS_PRODUCTION):
+    @app.get("/metrics")
+    def metrics(request: Request):
+        """Prometheus metrics (requires 'Authorization: Bearer <METRICS_TOKEN>' when set)"""
+        require_bearer_token(request, METRICS_TOKEN)
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Debug endpoints (only available in development)
 if not IS_PRODUCTION:
     @app.get("/debug/info")
@@ -689,13 +1247,41 @@ if not IS_PRODUCTION:
             "environment": ENVIRONMENT,
             "is_production": IS_PRODUCTION,
             "database": DATABASE,
+            "db_pool": db_pool.stats(),
+            "download_logs": download_log_writer.stats(),
+            "download_rollups": download_rollups.stats(),
+            "eligibility_cache": eligibility_cache.stats(),
+            "rate_limiter": rate_limiter.stats(),
+            "otp_store_backend": OTP_STORE_BACKEND,
             "minio_endpoint": MINIO_ENDPOINT,
             "bucket_name": BUCKET_NAME,
             "smtp_server": SMTP_SERVER,
+            "email_queue": otp_mailer.stats(),
+            "s3_client": s3_clients.stats(),
+            "current_tenure": CURRENT_TENURE,
+            "certificate_index": certificate_catalog.stats(),
+            "presigned_url_cache": presigned_url_cache.stats(),
+            "pdf_cache": certificate_cache.stats(),
+            "local_certificates": local_certificates.stats(),
+            "download_mode": DOWNLOAD_MODE,
+            "streaming": certificate_streamer.stats(),
+            "static_assets": static_assets.stats(),
+            "io_pools": {
+                "s3": s3_io.stats(), "db": db_io.stats(), "pdf_cache": cache_io.stats(), "export": export_io.stats()
+            },
+            "event_loop": loop_monitor.stats(),
             "docs_enabled": True,
             "message": "Debug mode is active"
         }
     
+    @app.get("/debug/email-status/{message_id}")
+    async def debug_email_status(message_id: str):
+        """Delivery status of a queued OTP email - only available in development mode"""
+        status = otp_mailer.status(message_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Unknown message id")
+        return status
+    
     @app.get("/debug/otp-store")
     async def debug_otp_store():
         """View current OTP store - only available in development mode"""
@@ -0,0 +1,233 @@
+"""
+Prometheus-style metrics for the Zenith Club Certificate Portal.
+
+A small dependency-free registry rendered in the Prometheus text format.
+Every label combination used by the app is bound once at import time
+(the module-level STAGE_* / OTP_* / ... children below), so recording a
+sample is a bisect and two additions under a lock, with no per-request
+dict or string allocation.
+
+    started = time.perf_counter()
+    ...
+    STAGE_S3_HEAD.observe(time.perf_counter() - started)
+"""
+
+import threading
+from bisect import bisect_left
+
+# Seconds; finer at the low end than the Prometheus defaults because
+# presigning, template rendering and SQLite reads take well under 5 ms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds: tuple):
+        self._bounds = bounds
+        # One slot per bucket plus the +Inf overflow slot
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Bind a label set; call once and keep the returned child"""
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, values, child):
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def render(self) -> list:
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, callback) -> Gauge:
+        return self.register(Gauge(name, documentation, callback))
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "certi5r_stage_duration_seconds", "Time spent in each request stage", ("stage",)
+))
+STAGE_S3_HEAD = STAGE_SECONDS.labels("s3_head")
+STAGE_S3_LIST = STAGE_SECONDS.labels("s3_list")
+STAGE_PRESIGN = STAGE_SECONDS.labels("presign")
+STAGE_S3_STREAM = STAGE_SECONDS.labels("s3_stream")
+STAGE_SMTP_SEND = STAGE_SECONDS.labels("smtp_send")
+STAGE_SQLITE_QUERY = STAGE_SECONDS.labels("sqlite_query")
+STAGE_SQLITE_COMMIT = STAGE_SECONDS.labels("sqlite_commit")
+STAGE_TEMPLATE_RENDER = STAGE_SECONDS.labels("template_render")
+
+OTP_EVENTS = REGISTRY.register(Counter(
+    "certi5r_otp_events_total", "OTPs issued, verified, expired or rejected", ("event",)
+))
+OTP_ISSUED = OTP_EVENTS.labels("issued")
+OTP_VERIFIED = OTP_EVENTS.labels("verified")
+OTP_EXPIRED = OTP_EVENTS.labels("expired")
+OTP_INVALID = OTP_EVENTS.labels("invalid")
+
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "certi5r_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result")
+))
+PRESIGN_CACHE_HIT = CACHE_LOOKUPS.labels("presigned_url", "hit")
+PRESIGN_CACHE_MISS = CACHE_LOOKUPS.labels("presigned_url", "miss")
+INDEX_CACHE_HIT = CACHE_LOOKUPS.labels("certificate_index", "hit")
+INDEX_CACHE_MISS = CACHE_LOOKUPS.labels("certificate_index", "miss")
+PDF_CACHE_HIT = CACHE_LOOKUPS.labels("certificate_pdf", "hit")
+PDF_CACHE_MISS = CACHE_LOOKUPS.labels("certificate_pdf", "miss")
+
+LOCAL_FALLBACKS = REGISTRY.register(Counter(
+    "certi5r_local_fallbacks_total", "Requests served from local files because S3 had no object", ("route",)
+))
+LOCAL_FALLBACK_DOWNLOAD = LOCAL_FALLBACKS.labels("download")
+LOCAL_FALLBACK_PREVIEW = LOCAL_FALLBACKS.labels("preview")
+
+RATE_LIMITED = REGISTRY.register(Counter(
+    "certi5r_rate_limited_total", "/send-otp requests refused with 429, by limit", ("limit",)
+))
+RATE_LIMITED_EMAIL = RATE_LIMITED.labels("email")
+RATE_LIMITED_ROLL = RATE_LIMITED.labels("roll")
+RATE_LIMITED_IP = RATE_LIMITED.labels("ip")
+RATE_LIMITED_SMTP = RATE_LIMITED.labels("smtp")
+
+EMAILS = REGISTRY.register(Counter(
+    "certi5r_emails_total", "OTP emails by delivery outcome", ("outcome",)
+))
+EMAIL_SENT = EMAILS.labels("sent")
+EMAIL_FAILED = EMAILS.labels("failed")
+EMAIL_RETRIED = EMAILS.labels("retried")
+
+DOWNLOAD_LOGS_DROPPED = REGISTRY.register(Counter(
+    "certi5r_download_logs_dropped_total", "Download/preview events dropped before being written", ("reason",)
+))
+DOWNLOAD_LOGS_DROPPED_FULL = DOWNLOAD_LOGS_DROPPED.labels("buffer_full")
@@ -0,0 +1,187 @@
+"""
+Thread pool offloading and event-loop stall detection.
+
+Route handlers are async, but boto3, sqlite3 and file system calls block.
+Those calls are sent to small dedicated thread pools (one per backend,
+sized separately) so a slow S3 endpoint can't starve database work or
+freeze the event loop, and each pool reports its queue depth and
+latencies. LoopStallMonitor measures how late the loop wakes up and
+counts stalls above a threshold.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LatencyWindow:
+    """Rolling window of recent durations (seconds) with percentile summaries"""
+
+    def __init__(self, size: int = 1024):
+        self._samples = deque(maxlen=size)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self) -> dict:
+        """count, p50/p95/p99 over the window and all-time max, in milliseconds"""
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+
+        def pct(q):
+            return round(samples[min(int(q * len(samples)), len(samples) - 1)] * 1000, 3)
+
+        return {
+            "count": self.count,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class OffloadPool:
+    """Named thread pool for one kind of blocking I/O"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        # Counters and latency windows are updated from every worker thread
+        self._stats_lock = threading.Lock()
+
+        self.submitted = 0
+        self.started = 0
+        self.finished = 0
+        self.errors = 0
+        self.wait = LatencyWindow()
+        self.run_time = LatencyWindow()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=f"io-{self.name}"
+                    )
+        return self._executor
+
+    def _call(self, submitted_at: float, func, args, kwargs):
+        started_at = time.perf_counter()
+        with self._stats_lock:
+            self.started += 1
+            self.wait.add(started_at - submitted_at)
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            run_time = time.perf_counter() - started_at
+            with self._stats_lock:
+                self.run_time.add(run_time)
+                self.finished += 1
+                if failed:
+                    self.errors += 1
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable on this pool and await its result"""
+        loop = asyncio.get_running_loop()
+        with self._stats_lock:
+            self.submitted += 1
+        call = functools.partial(self._call, time.perf_counter(), func, args, kwargs)
+        return await loop.run_in_executor(self._get_executor(), call)
+
+    def submit(self, func, *args, **kwargs):
+        """Run a blocking callable on this pool without waiting for it"""
+        with self._stats_lock:
+            self.submitted += 1
+        return self._get_executor().submit(self._call, time.perf_counter(), func, args, kwargs)
+
+    def stats(self) -> dict:
+        """Queue depth, in-flight calls and wait/run latencies"""
+        with self._stats_lock:
+            return {
+                "workers": self.max_workers,
+                "queued": self.submitted - self.started,
+                "active": self.started - self.finished,
+                "completed": self.finished,
+                "errors": self.errors,
+                "wait": self.wait.summary(),
+                "run": self.run_time.summary(),
+            }
+
+    def close(self):
+        """Wait for running calls and shut the threads down"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+class LoopStallMonitor:
+    """Samples event-loop lag and counts wake-ups later than a threshold
+
+    With debug=True the loop also runs in asyncio debug mode, which logs
+    the callback responsible for each slow step (logger "asyncio").
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, debug: bool = False):
+        self.threshold = threshold
+        self.interval = interval
+        self.debug = debug
+        self._task = None
+
+        self.stalls = 0
+        self.lag = LatencyWindow()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0.0)
+            self.lag.add(lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+                print(f"⚠️ Event loop stalled for {lag * 1000:.0f} ms")
+
+    def start(self):
+        """Start sampling on the running loop"""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        if self.debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        """Stall count and loop lag percentiles"""
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "lag": self.lag.summary(),
+        }
@@ -0,0 +1,286 @@
+"""
+OTP storage backends for the Zenith Club Certificate Portal.
+
+Both backends behave like a small mapping of email -> {"otp", "roll_number",
+"expiry", "tenures"} and drop entries on their own once they have expired, so the
+store never grows without bound.
+
+- MemoryOtpStore: per-process dict with a heap of expiry times and a size cap
+- SQLiteOtpStore: a WAL-mode SQLite file shared by every uvicorn worker
+"""
+
+import heapq
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from db import ThreadLocalConnections
+from metrics import STAGE_SQLITE_COMMIT, STAGE_SQLITE_QUERY
+
+
+class OtpStore:
+    """Interface shared by the OTP store backends"""
+
+    def get(self, email: str) -> Optional[dict]:
+        """Return {"otp", "roll_number", "expiry", "tenures"} for an email, or None"""
+        raise NotImplementedError
+
+    def __setitem__(self, email: str, value: dict):
+        raise NotImplementedError
+
+    def pop(self, email: str, default=None):
+        """Remove and return the entry for an email
+
+        Atomic: of several concurrent callers (in any worker) only one
+        gets the entry, the others get default.
+        """
+        raise NotImplementedError
+
+    def take(self, email: str, otp: str) -> Optional[dict]:
+        """Atomically remove and return the entry if its OTP matches, else None"""
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """Drop entries past their retention window; returns how many were removed"""
+        raise NotImplementedError
+
+    def keys(self) -> list:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __contains__(self, email: str) -> bool:
+        return self.get(email) is not None
+
+    def __getitem__(self, email: str) -> dict:
+        value = self.get(email)
+        if value is None:
+            raise KeyError(email)
+        return value
+
+    def __delitem__(self, email: str):
+        if self.pop(email, None) is None:
+            raise KeyError(email)
+
+    def close(self):
+        """Release backend resources"""
+
+
+class MemoryOtpStore(OtpStore):
+    """In-process OTP store with heap-based expiry and a size cap"""
+
+    def __init__(self, max_size: int = 100000, retention: float = 300):
+        self.max_size = max_size
+        # Seconds an expired entry is kept so /verify-otp can report "expired"
+        self.retention = retention
+
+        self._entries = {}
+        # (drop-at timestamp, email); stale items are skipped when popped
+        self._heap = []
+        self._lock = threading.Lock()
+
+        self.evictions = 0
+
+    @staticmethod
+    def _drop_at(value: dict, retention: float) -> float:
+        return value["expiry"].timestamp() + retention
+
+    def _purge_locked(self, now: float) -> int:
+        removed = 0
+        while self._heap and self._heap[0][0] <= now:
+            drop_at, email = heapq.heappop(self._heap)
+            value = self._entries.get(email)
+            if value is not None and self._drop_at(value, self.retention) <= now:
+                del self._entries[email]
+                removed += 1
+        return removed
+
+    def _compact_locked(self):
+        """Rebuild the heap when superseded items dominate it"""
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(self._drop_at(v, self.retention), e) for e, v in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def get(self, email: str) -> Optional[dict]:
+        with self._lock:
+            self._purge_locked(time.time())
+            return self._entries.get(email)
+
+    def __setitem__(self, email: str, value: dict):
+        with self._lock:
+            self._purge_locked(time.time())
+            if email not in self._entries:
+                # Make room by evicting the entries closest to expiry
+                while len(self._entries) >= self.max_size and self._heap:
+                    drop_at, victim = heapq.heappop(self._heap)
+                    current = self._entries.get(victim)
+                    if current is not None and self._drop_at(current, self.retention) == drop_at:
+                        del self._entries[victim]
+                        self.evictions += 1
+            self._entries[email] = value
+            heapq.heappush(self._heap, (self._drop_at(value, self.retention), email))
+            self._compact_locked()
+
+    def pop(self, email: str, default=None):
+        with self._lock:
+            return self._entries.pop(email, default)
+
+    def take(self, email: str, otp: str) -> Optional[dict]:
+        with self._lock:
+            value = self._entries.get(email)
+            if not otp or value is None or value["otp"] != otp:
+                return None
+            return self._entries.pop(email)
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge_locked(time.time())
+
+    def keys(self) -> list:
+        with self._lock:
+            self._purge_locked(time.time())
+            return list(self._entries.keys())
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge_locked(time.time())
+            return len(self._entries)
+
+
+class SQLiteOtpStore(OtpStore):
+    """OTP store in a WAL-mode SQLite file shared across worker processes"""
+
+    # Seconds between opportunistic purges of expired rows
+    PURGE_INTERVAL = 30
+
+    def __init__(self, path: str, retention: float = 300, busy_timeout: float = 5):
+        self.path = path
+        self.retention = retention
+        self.busy_timeout = busy_timeout
+
+        self._connections = ThreadLocalConnections(path, busy_timeout)
+        self._last_purge = 0.0
+
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS otp_codes (
+                email TEXT PRIMARY KEY,
+                otp TEXT NOT NULL,
+                roll_number TEXT NOT NULL,
+                expiry REAL NOT NULL,
+                tenures TEXT NOT NULL DEFAULT ''
+            )
+        ''')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(otp_codes)')}
+        if "tenures" not in columns:
+            conn.execute("ALTER TABLE otp_codes ADD COLUMN tenures TEXT NOT NULL DEFAULT ''")
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_otp_codes_expiry ON otp_codes (expiry)')
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def _maybe_purge(self, conn: sqlite3.Connection):
+        now = time.time()
+        if now - self._last_purge >= self.PURGE_INTERVAL:
+            self._last_purge = now
+            conn.execute('DELETE FROM otp_codes WHERE expiry <= ?', (now - self.retention,))
+
+    @staticmethod
+    def _entry(row) -> dict:
+        return {
+            "otp": row[0],
+            "roll_number": row[1],
+            "expiry": datetime.fromtimestamp(row[2]),
+            "tenures": row[3].split(",") if row[3] else [],
+        }
+
+    def get(self, email: str) -> Optional[dict]:
+        started = time.perf_counter()
+        row = self._conn().execute(
+            'SELECT otp, roll_number, expiry, tenures FROM otp_codes WHERE email = ? AND expiry > ?',
+            (email, time.time() - self.retention)
+        ).fetchone()
+        STAGE_SQLITE_QUERY.observe(time.perf_counter() - started)
+        return self._entry(row) if row is not None else None
+
+    def _delete(self, where: str, params: tuple) -> Optional[dict]:
+        """Delete at most one row and return it, if this call is the one that deleted it"""
+        conn = self._conn()
+        started = time.perf_counter()
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            row = conn.execute(
+                f'DELETE FROM otp_codes WHERE {where} RETURNING otp, roll_number, expiry, tenures', params
+            ).fetchone()
+        else:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    f'SELECT otp, roll_number, expiry, tenures FROM otp_codes WHERE {where}', params
+                ).fetchone()
+                if row is not None and conn.execute(
+                    f'DELETE FROM otp_codes WHERE {where}', params
+                ).rowcount != 1:
+                    row = None
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        STAGE_SQLITE_COMMIT.observe(time.perf_counter() - started)
+        # An entry past its retention window counts as already gone
+        if row is None or row[2] <= time.time() - self.retention:
+            return None
+        return self._entry(row)
+
+    def __setitem__(self, email: str, value: dict):
+        conn = self._conn()
+        self._maybe_purge(conn)
+        started = time.perf_counter()
+        conn.execute(
+            'INSERT OR REPLACE INTO otp_codes (email, otp, roll_number, expiry, tenures) VALUES (?, ?, ?, ?, ?)',
+            (email, value["otp"], value["roll_number"], value["expiry"].timestamp(),
+             ",".join(value.get("tenures", ())))
+        )
+        # Autocommit: the INSERT is its own transaction
+        STAGE_SQLITE_COMMIT.observe(time.perf_counter() - started)
+
+    def pop(self, email: str, default=None):
+        value = self._delete('email = ?', (email,))
+        return value if value is not None else default
+
+    def take(self, email: str, otp: str) -> Optional[dict]:
+        if not otp:
+            return None
+        return self._delete('email = ? AND otp = ?', (email, otp))
+
+    def purge_expired(self) -> int:
+        cursor = self._conn().execute('DELETE FROM otp_codes WHERE expiry <= ?', (time.time() - self.retention,))
+        return cursor.rowcount
+
+    def keys(self) -> list:
+        rows = self._conn().execute(
+            'SELECT email FROM otp_codes WHERE expiry > ?', (time.time() - self.retention,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def __len__(self) -> int:
+        row = self._conn().execute(
+            'SELECT COUNT(*) FROM otp_codes WHERE expiry > ?', (time.time() - self.retention,)
+        ).fetchone()
+        return row[0]
+
+    def close(self):
+        self._connections.close()
+
+
+def create_otp_store(backend: str, path: str = "otp_store.db", max_size: int = 100000,
+                     retention: float = 300) -> OtpStore:
+    """Build the configured OTP store backend ("memory" or "sqlite")"""
+    if backend == "sqlite":
+        return SQLiteOtpStore(path, retention=retention)
+    if backend == "memory":
+        return MemoryOtpStore(max_size=max_size, retention=retention)
+    raise ValueError(f"Unknown OTP store backend: {backend}")
@@ -0,0 +1,337 @@
+"""
+On-disk certificate cache for the Zenith Club Certificate Portal.
+
+Keeps copies of certificate PDFs in a local directory so repeat previews
+and downloads are served with FileResponse instead of pulling the object
+from S3/MinIO again. Files are named by a hash of (object key, ETag), so
+a re-uploaded certificate gets a new file and the stale copy simply ages
+out. Total size is held under a byte budget with LRU eviction, and fills
+are written to a temporary file and renamed into place, so a reader never
+sees a partial PDF. A fill either pulls the object itself or tees the body
+a client is already being streamed, so a cache miss costs one S3 GET.
+
+Every hit leases its file for a short while; eviction skips leased files,
+so a FileResponse can still open a file it was just handed. Once opened,
+an unlink doesn't disturb the response.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from metrics import PDF_CACHE_HIT, PDF_CACHE_MISS
+from storage import is_stale_object_error
+
+TEMP_PREFIX = ".tmp-"
+
+
+def cache_filename(key: str, etag: Optional[str]) -> str:
+    """Content-addressed file name for an object version"""
+    return hashlib.sha256(f"{key}\0{etag or ''}".encode("utf-8")).hexdigest() + ".pdf"
+
+
+class CacheWriter:
+    """Writes one object version into the cache; commit() publishes it, abort() drops it
+
+    Every method does blocking file I/O, so async callers run them in a
+    worker thread.
+    """
+
+    def __init__(self, cache: "CertificateCache", name: str, expected_size: Optional[int],
+                 teed: bool = False):
+        self.cache = cache
+        self.name = name
+        self.expected_size = expected_size
+        self.teed = teed
+        self.written = 0
+        self.path = os.path.join(cache.directory, f"{TEMP_PREFIX}{uuid.uuid4().hex}")
+        self._file = open(self.path, "wb")
+
+    def write(self, chunk: bytes):
+        """Append a chunk; a disk error just gives up on this copy"""
+        if self._file.closed:
+            return
+        try:
+            self._file.write(chunk)
+            self.written += len(chunk)
+        except OSError as e:
+            print(f"Failed to cache {self.name}: {e}")
+            self.abort()
+
+    def commit(self) -> bool:
+        """Rename the finished file into place; False (and dropped) if it is short"""
+        if self._file.closed:
+            return False
+        try:
+            self._file.close()
+            if self.expected_size is not None and self.written != self.expected_size:
+                raise OSError(f"short read ({self.written} of {self.expected_size} bytes)")
+            os.replace(self.path, os.path.join(self.cache.directory, self.name))
+        except OSError as e:
+            print(f"Failed to cache {self.name}: {e}")
+            self._discard()
+            return False
+        self.cache._add(self.name, self.written, self.teed)
+        return True
+
+    def abort(self):
+        """Drop a partial file, e.g. when the client went away mid-stream"""
+        if not self._file.closed:
+            self._file.close()
+            self._discard()
+
+    def _discard(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        self.cache._release(self.name)
+
+
+class CertificateCache:
+    """Byte-budgeted LRU of certificate PDFs on local disk"""
+
+    def __init__(self, directory: str, max_bytes: int, bucket: str, chunk_size: int = 256 * 1024,
+                 lease_seconds: float = 60, on_stale=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        # Called with an entry whose object a fill found deleted or re-uploaded
+        self.on_stale = on_stale
+
+        # file name -> size, least recently used first
+        self._files = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._filling = set()
+        # file name -> monotonic time until which eviction leaves it alone
+        self._leases = {}
+        self._prefetch_thread = None
+        self._stop = threading.Event()
+
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.teed_fills = 0
+        self.failed_fills = 0
+        self.evictions = 0
+        self.prefetched = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def load(self):
+        """Index files left by a previous run (oldest first) and drop partial fills"""
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if not item.is_file():
+                    continue
+                if item.name.startswith(TEMP_PREFIX):
+                    try:
+                        os.unlink(item.path)
+                    except OSError:
+                        pass
+                    continue
+                stat_result = item.stat()
+                found.append((stat_result.st_mtime, item.name, stat_result.st_size))
+        found.sort()
+        with self._lock:
+            self._files = OrderedDict((name, size) for _, name, size in found)
+            self._bytes = sum(size for _, _, size in found)
+        self._evict()
+
+    def lookup(self, key: str, etag: Optional[str]) -> Optional[dict]:
+        """{"path", "size"} of the cached copy of this object version, or None
+
+        A hit leases the file for lease_seconds so it can't be evicted
+        before the response opens it. A file that has gone from disk
+        anyway (another worker's eviction, a manual cleanup) is dropped
+        from the index and reported as a miss.
+        """
+        if not self.enabled:
+            return None
+        name = cache_filename(key, etag)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            size = self._files.get(name)
+            if size is not None:
+                self._files.move_to_end(name)
+                self._leases[name] = time.monotonic() + self.lease_seconds
+        if size is not None and not os.path.isfile(path):
+            with self._lock:
+                if self._files.pop(name, None) is not None:
+                    self._bytes -= size
+                self._leases.pop(name, None)
+            size = None
+        with self._lock:
+            if size is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if size is None:
+            PDF_CACHE_MISS.inc()
+            return None
+        PDF_CACHE_HIT.inc()
+        return {"path": path, "size": size}
+
+    def _evict(self):
+        """Unlink least recently used files until under the byte budget
+
+        Leased files are skipped; if only leased files are left the cache
+        stays over budget until a later fill evicts again.
+        """
+        victims = []
+        with self._lock:
+            now = time.monotonic()
+            self._leases = {name: until for name, until in self._leases.items() if until > now}
+            for name in list(self._files):
+                if self._bytes <= self.max_bytes:
+                    break
+                if name in self._leases:
+                    continue
+                self._bytes -= self._files.pop(name)
+                self.evictions += 1
+                victims.append(name)
+        for name in victims:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def writer(self, entry: dict, teed: bool = False) -> Optional[CacheWriter]:
+        """Start writing an object version into the cache
+
+        teed marks a copy of a body that is being streamed to a client.
+        None if the cache is off, the object is too big, or it is already
+        cached or being filled by someone else.
+        """
+        if not self.enabled:
+            return None
+        size = entry.get("size")
+        if size is not None and size > self.max_bytes:
+            return None
+        name = cache_filename(entry["key"], entry.get("etag"))
+        with self._lock:
+            if name in self._files or name in self._filling:
+                return None
+            self._filling.add(name)
+        try:
+            return CacheWriter(self, name, size, teed)
+        except OSError as e:
+            print(f"Failed to cache {entry['key']}: {e}")
+            self._release(name)
+            return None
+
+    def _release(self, name: str):
+        with self._lock:
+            self._filling.discard(name)
+
+    def _add(self, name: str, size: int, teed: bool = False):
+        """Index a file just renamed into place, then evict down to the budget"""
+        with self._lock:
+            self._filling.discard(name)
+            self._files[name] = size
+            self._bytes += size
+            self.fills += 1
+            if teed:
+                self.teed_fills += 1
+        self._evict()
+
+    def fill(self, s3_client, entry: dict) -> bool:
+        """Download one object version into the cache; True if it is cached afterwards"""
+        if not self.enabled:
+            return False
+        if cache_filename(entry["key"], entry.get("etag")) in self._files:
+            return True
+        writer = self.writer(entry)
+        if writer is None:
+            return False
+
+        key, etag = entry["key"], entry.get("etag")
+        try:
+            params = {"Bucket": self.bucket, "Key": key}
+            if etag:
+                # Don't store a newer version under the old version's name
+                params["IfMatch"] = etag
+            response = s3_client.get_object(**params)
+            for chunk in response["Body"].iter_chunks(self.chunk_size):
+                writer.write(chunk)
+            if writer.commit():
+                return True
+        except Exception as e:
+            print(f"Failed to cache {key}: {e}")
+            writer.abort()
+            if self.on_stale and is_stale_object_error(e):
+                self.on_stale(entry)
+        self.failed_fills += 1
+        return False
+
+    def prefetch(self, s3_client, entries, budget_share: float = 0.9):
+        """Fill every entry not yet cached, stopping before it would evict its own fills"""
+        budget = self.max_bytes * budget_share
+        warmed = 0
+        for entry in entries:
+            if self._stop.is_set():
+                break
+            size = entry.get("size") or 0
+            if warmed + size > budget:
+                print("Certificate prefetch stopped at the cache byte budget")
+                break
+            warmed += size
+            if cache_filename(entry["key"], entry.get("etag")) in self._files:
+                continue
+            if self.fill(s3_client, entry):
+                self.prefetched += 1
+
+    def start_prefetch(self, clients, index, wait: float = 60):
+        """Prefetch a whole tenure in the background once the object index is built"""
+        if not self.enabled or (self._prefetch_thread and self._prefetch_thread.is_alive()):
+            return
+
+        def run():
+            deadline = time.monotonic() + wait
+            while not index.is_fresh() and time.monotonic() < deadline and not self._stop.is_set():
+                self._stop.wait(1)
+            s3_client = clients.get()
+            if s3_client and index.is_fresh():
+                started = time.monotonic()
+                self.prefetch(s3_client, index.entries())
+                print(f"Prefetched {self.prefetched} certificates in {time.monotonic() - started:.1f}s")
+
+        self._stop.clear()
+        self._prefetch_thread = threading.Thread(target=run, name="certificate-prefetch", daemon=True)
+        self._prefetch_thread.start()
+
+    def stop(self):
+        """Stop a running prefetch"""
+        self._stop.set()
+        if self._prefetch_thread:
+            self._prefetch_thread.join(timeout=5)
+            self._prefetch_thread = None
+
+    def stats(self) -> dict:
+        """Occupancy and hit/fill counters"""
+        return {
+            "enabled": self.enabled,
+            "files": len(self._files),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "fills": self.fills,
+            "teed_fills": self.teed_fills,
+            "failed_fills": self.failed_fills,
+            "evictions": self.evictions,
+            "prefetched": self.prefetched,
+        }
@@ -0,0 +1,207 @@
+"""
+Token-bucket rate limiting for the Zenith Club Certificate Portal.
+
+A request is admitted only if every bucket it touches (e.g. its email,
+roll number and client IP) has a token; otherwise nothing is consumed
+and the caller gets the scope that refused it and how long to wait.
+
+- MemoryRateLimiter: per-process buckets in an LRU bounded by max_keys
+- SQLiteRateLimiter: buckets in a WAL-mode SQLite file shared by every
+  uvicorn worker, so limits hold across processes
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from db import ThreadLocalConnections
+
+
+class Rate(NamedTuple):
+    """Up to `burst` requests, refilled at `burst` per `per_seconds`"""
+    burst: float
+    per_seconds: float
+
+    @classmethod
+    def parse(cls, text: str) -> "Rate":
+        """Parse 'COUNT/SECONDS', e.g. '3/600' for three requests per ten minutes"""
+        count, _, seconds = text.partition("/")
+        rate = cls(float(count), float(seconds or 1))
+        if rate.burst <= 0 or rate.per_seconds <= 0:
+            raise ValueError(f"Invalid rate: {text}")
+        return rate
+
+
+def _refill(rate: Rate, tokens: float, updated: float, now: float) -> float:
+    return min(rate.burst, tokens + (now - updated) * rate.burst / rate.per_seconds)
+
+
+def _retry_after(rate: Rate, tokens: float) -> float:
+    return (1 - tokens) * rate.per_seconds / rate.burst
+
+
+class RateLimiter:
+    """Interface shared by the rate limiter backends"""
+
+    def __init__(self, rates: dict):
+        # scope -> Rate
+        self.rates = rates
+        self.admitted = 0
+        self.limited = 0
+
+    def hit(self, keys: dict) -> Optional[Tuple[str, float]]:
+        """Take a token from each scope's bucket in {scope: key}
+
+        Returns None when admitted, else (scope, retry_after_seconds) for
+        the scope that has to wait longest. Scopes without a configured
+        rate and empty keys are ignored.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"admitted": self.admitted, "limited": self.limited}
+
+    def close(self):
+        """Release backend resources"""
+
+
+class MemoryRateLimiter(RateLimiter):
+    """In-process token buckets kept in an LRU of at most max_keys buckets
+
+    An evicted bucket comes back full, so max_keys should comfortably
+    exceed the number of identities active within one refill period.
+    """
+
+    def __init__(self, rates: dict, max_keys: int = 100000):
+        super().__init__(rates)
+        self.max_keys = max_keys
+        # (scope, key) -> [tokens, updated]
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def hit(self, keys: dict) -> Optional[Tuple[str, float]]:
+        now = time.monotonic()
+        with self._lock:
+            checked = []
+            denied = None
+            for scope, key in keys.items():
+                rate = self.rates.get(scope)
+                if rate is None or not key:
+                    continue
+                bucket = self._buckets.get((scope, key))
+                tokens = rate.burst if bucket is None else _refill(rate, bucket[0], bucket[1], now)
+                if tokens < 1:
+                    wait = _retry_after(rate, tokens)
+                    if denied is None or wait > denied[1]:
+                        denied = (scope, wait)
+                checked.append(((scope, key), tokens))
+
+            if denied:
+                self.limited += 1
+                return denied
+
+            for bucket_key, tokens in checked:
+                self._buckets[bucket_key] = [tokens - 1, now]
+                self._buckets.move_to_end(bucket_key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+            self.admitted += 1
+            return None
+
+    def stats(self) -> dict:
+        return dict(super().stats(), backend="memory", buckets=len(self._buckets), evictions=self.evictions)
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """Token buckets in a WAL-mode SQLite file shared across worker processes
+
+    Buckets idle long enough to have refilled completely are purged, which
+    is indistinguishable from never having seen the key.
+    """
+
+    # Seconds between purges of fully refilled buckets
+    PURGE_INTERVAL = 60
+
+    def __init__(self, rates: dict, path: str, busy_timeout: float = 5):
+        super().__init__(rates)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._idle_after = max(rate.per_seconds for rate in rates.values()) if rates else 0
+
+        self._connections = ThreadLocalConnections(path, busy_timeout)
+        self._last_purge = 0.0
+
+        self._conn().execute('''
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (scope, key)
+            )
+        ''')
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def hit(self, keys: dict) -> Optional[Tuple[str, float]]:
+        conn = self._conn()
+        # Wall-clock time, since buckets are shared between processes
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if now - self._last_purge >= self.PURGE_INTERVAL:
+                self._last_purge = now
+                conn.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - self._idle_after,))
+
+            checked = []
+            denied = None
+            for scope, key in keys.items():
+                rate = self.rates.get(scope)
+                if rate is None or not key:
+                    continue
+                row = conn.execute(
+                    'SELECT tokens, updated FROM rate_buckets WHERE scope = ? AND key = ?', (scope, key)
+                ).fetchone()
+                tokens = rate.burst if row is None else _refill(rate, row[0], row[1], now)
+                if tokens < 1:
+                    wait = _retry_after(rate, tokens)
+                    if denied is None or wait > denied[1]:
+                        denied = (scope, wait)
+                checked.append((scope, key, tokens - 1, now))
+
+            if not denied:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO rate_buckets (scope, key, tokens, updated) VALUES (?, ?, ?, ?)',
+                    checked
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        if denied:
+            self.limited += 1
+            return denied
+        self.admitted += 1
+        return None
+
+    def stats(self) -> dict:
+        return dict(super().stats(), backend="sqlite", path=self.path)
+
+    def close(self):
+        self._connections.close()
+
+
+def create_rate_limiter(backend: str, rates: dict, path: str = "rate_limits.db",
+                        max_keys: int = 100000) -> RateLimiter:
+    """Build the configured rate limiter backend ("memory" or "sqlite")"""
+    if backend == "sqlite":
+        return SQLiteRateLimiter(rates, path)
+    if backend == "memory":
+        return MemoryRateLimiter(rates, max_keys=max_keys)
+    raise ValueError(f"Unknown rate limiter backend: {backend}")
@@ -0,0 +1,43 @@
+"""
+Roll number and tenure helpers shared by main.py and add_to_db.py.
+
+Roll numbers are stored lowercase (the canonical form) and shown
+uppercase in URLs, filenames and messages. A tenure is a club year such
+as 2024-25; each one has its own certificates.
+"""
+
+import re
+
+# 3 digits + letters + 3 digits, e.g. 220btccse004, 230bca006, 240btccse046
+ROLL_PATTERN = re.compile(r'^\d{3}[a-z]+\d{3}$')
+PROGRAM_PATTERN = re.compile(r'^\d{3}([a-z]+)\d{3}$')
+
+# Tenure served when none is given (override with CURRENT_TENURE)
+DEFAULT_TENURE = "2024-25"
+TENURE_PATTERN = re.compile(r'^\d{4}-\d{2}$')
+
+
+def normalize_roll_number(roll_number: str) -> str:
+    """Canonical (stored) form of a roll number: trimmed and lowercase"""
+    return roll_number.strip().lower()
+
+
+def display_roll_number(roll_number: str) -> str:
+    """Uppercase form used in URLs, filenames and messages"""
+    return roll_number.strip().upper()
+
+
+def is_valid_roll_number(roll_number: str) -> bool:
+    """Check a roll number against the university format"""
+    return bool(ROLL_PATTERN.match(normalize_roll_number(roll_number)))
+
+
+def is_valid_tenure(tenure: str) -> bool:
+    """Check a tenure against the YYYY-YY format"""
+    return bool(TENURE_PATTERN.match(tenure))
+
+
+def roll_program(roll_number: str) -> str:
+    """Program code inside a roll number (btccse for 220btccse004), or 'other'"""
+    match = PROGRAM_PATTERN.match(normalize_roll_number(roll_number))
+    return match.group(1) if match else "other"
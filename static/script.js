@@ -1,6 +1,7 @@
 // Certificate Download App - Zenith Club (Tailwind Theme)
 let currentEmail = '';
 let currentRollNumber = '';
+let currentTenures = [];
 
 document.addEventListener('DOMContentLoaded', function() {
     // Step 1: Details Form
@@ -121,6 +122,7 @@ async function verifyOTP(email, otp) {
         hideLoading();
         
         if (response.ok && data.success) {
+            showCertificates(data.certificates || []);
             showStep3();
         } else {
             showError(data.error || 'Invalid OTP');
@@ -131,18 +133,44 @@ async function verifyOTP(email, otp) {
     }
 }
 
+// One certificate per tenure; the picker only shows up when there are several
+function showCertificates(certificates) {
+    currentTenures = certificates.map(certificate => certificate.tenure);
+    
+    const select = document.getElementById('tenureSelect');
+    select.innerHTML = '';
+    currentTenures.forEach(tenure => {
+        const option = document.createElement('option');
+        option.value = tenure;
+        option.textContent = tenure;
+        select.appendChild(option);
+    });
+    document.getElementById('tenurePicker').classList.toggle('hidden', currentTenures.length < 2);
+}
+
+function selectedTenure() {
+    return currentTenures.length ? document.getElementById('tenureSelect').value : '';
+}
+
+function certificateQuery() {
+    const tenure = selectedTenure();
+    return `email=${encodeURIComponent(currentEmail)}` + (tenure ? `&tenure=${encodeURIComponent(tenure)}` : '');
+}
+
 function previewCertificate() {
-    const url = `/preview/${currentRollNumber}?email=${encodeURIComponent(currentEmail)}`;
+    const url = `/preview/${currentRollNumber}?${certificateQuery()}`;
     window.open(url, '_blank');
 }
 
 function downloadCertificate() {
-    const url = `/download/${currentRollNumber}?email=${encodeURIComponent(currentEmail)}`;
+    const url = `/download/${currentRollNumber}?${certificateQuery()}`;
     
     // Create a temporary anchor element to trigger download
     const a = document.createElement('a');
     a.href = url;
-    a.download = `${currentRollNumber}_certificate.pdf`;
+    a.download = currentTenures.length > 1
+        ? `${currentRollNumber}_${selectedTenure()}_certificate.pdf`
+        : `${currentRollNumber}_certificate.pdf`;
     document.body.appendChild(a);
     a.click();
     document.body.removeChild(a);
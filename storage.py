@@ -0,0 +1,518 @@
+"""
+S3/MinIO client management for the Zenith Club Certificate Portal.
+
+Keeps a single boto3 client per worker process instead of building a new
+one (and a new TLS connection) for every lookup. boto3 itself is only
+imported when the first client is created, which keeps it off the
+worker's import path.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from metrics import (
+    INDEX_CACHE_HIT, INDEX_CACHE_MISS, PRESIGN_CACHE_HIT, PRESIGN_CACHE_MISS,
+    STAGE_S3_HEAD, STAGE_S3_LIST
+)
+from rolls import DEFAULT_TENURE
+
+
+def tenure_prefix(tenure: str) -> str:
+    """Bucket prefix holding a tenure's {ROLL_NUMBER}.pdf certificates"""
+    return f"certificates/tenure{tenure}/"
+
+
+CERTIFICATE_PREFIX = tenure_prefix(DEFAULT_TENURE)
+
+
+def endpoint_url(endpoint: str, use_ssl: bool = True) -> str:
+    """S3/MinIO endpoint URL for a host[:port] (MINIO_ENDPOINT / MINIO_USE_SSL)"""
+    return f'{"https" if use_ssl else "http"}://{endpoint}'
+
+
+class S3ClientManager:
+    """Lazily created, thread-safe, pooled S3/MinIO client"""
+
+    # Seconds to wait before retrying client creation after a failure
+    RETRY_AFTER_SECONDS = 30
+
+    def __init__(self, endpoint_url: str, access_key: str, secret_key: str,
+                 region_name: str = "us-east-1", max_pool_connections: int = 20,
+                 connect_timeout: float = 5, read_timeout: float = 15,
+                 max_attempts: int = 3, tcp_keepalive: bool = True):
+        self.endpoint_url = endpoint_url
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region_name = region_name
+        self.max_pool_connections = max_pool_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_attempts = max_attempts
+        self.tcp_keepalive = tcp_keepalive
+
+        self._client = None
+        self._lock = threading.Lock()
+        self._last_failure = 0.0
+        self._closed = False
+
+        self.state = "idle"  # idle | healthy | unhealthy | closed
+        self.last_error = None
+        self.clients_created = 0
+        self.requests_served = 0
+
+    def _create(self):
+        """Build the underlying boto3 client"""
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            's3',
+            endpoint_url=self.endpoint_url,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            region_name=self.region_name,
+            config=Config(
+                max_pool_connections=self.max_pool_connections,
+                connect_timeout=self.connect_timeout,
+                read_timeout=self.read_timeout,
+                retries={"max_attempts": self.max_attempts, "mode": "standard"},
+                tcp_keepalive=self.tcp_keepalive,
+            )
+        )
+
+    def get(self):
+        """Return the shared client, creating it on first use (None if unavailable)"""
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._closed:
+                    return None
+                client = self._client
+                if client is None:
+                    if time.monotonic() - self._last_failure < self.RETRY_AFTER_SECONDS:
+                        return None
+                    try:
+                        client = self._create()
+                    except Exception as e:
+                        print(f"Failed to create S3 client: {e}")
+                        self._last_failure = time.monotonic()
+                        self.state = "unhealthy"
+                        self.last_error = str(e)
+                        return None
+                    self._client = client
+                    self.clients_created += 1
+                    self.state = "healthy"
+                    self.last_error = None
+
+        with self._lock:
+            self.requests_served += 1
+        return client
+
+    def mark_unhealthy(self, error: Exception):
+        """Record a connection-level failure seen by a caller"""
+        self.state = "unhealthy"
+        self.last_error = str(error)
+
+    def mark_healthy(self):
+        """Record a successful round-trip seen by a caller"""
+        if self._client is not None and not self._closed:
+            self.state = "healthy"
+            self.last_error = None
+
+    def stats(self) -> dict:
+        """Snapshot of client usage and health"""
+        return {
+            "state": self.state,
+            "last_error": self.last_error,
+            "clients_created": self.clients_created,
+            "requests_served": self.requests_served,
+            "max_pool_connections": self.max_pool_connections,
+        }
+
+    def close(self):
+        """Close pooled connections; further get() calls return None"""
+        with self._lock:
+            client, self._client = self._client, None
+            self._closed = True
+            self.state = "closed"
+        if client is not None:
+            try:
+                client.close()
+            except Exception as e:
+                print(f"Error closing S3 client: {e}")
+
+
+def is_stale_object_error(error: Exception) -> bool:
+    """True for a botocore ClientError saying the object is gone or its ETag changed"""
+    code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+    return code in ("NoSuchKey", "NotFound", "404", "PreconditionFailed", "412")
+
+
+def normalize_object_roll(key: str, prefix: str) -> str:
+    """Map an object key like prefix/220BTCCSE004.pdf to its roll number (220BTCCSE004)"""
+    name = key[len(prefix):] if key.startswith(prefix) else key
+    if "/" in name or not name.lower().endswith(".pdf"):
+        return ""
+    return name[:-4].upper()
+
+
+class CertificateIndex:
+    """In-memory index of certificate objects under one bucket prefix
+
+    S3 can't list "objects changed since", so refreshes are incremental
+    by key: every refresh_interval only keys after the highest one seen
+    so far are listed (StartAfter) and merged in, which is one short
+    request when nothing was uploaded. Every full_refresh_interval the
+    whole prefix is listed again to reconcile what an incremental pass
+    can't see: uploads that sort before the high-water key, re-uploads
+    with a new ETag and deletions. A lookup miss in between is still
+    answered with a HEAD request, so a new certificate is never refused
+    for being missing from the index.
+
+    Between full passes a deleted or re-uploaded object keeps its stale
+    entry. When a GET finds it gone or with a different ETag, invalidate()
+    drops the entry (the next lookup HEADs the object) and makes the next
+    refresh a full one, so the window shrinks to refresh_interval.
+    """
+
+    def __init__(self, clients: S3ClientManager, bucket: str, prefix: str,
+                 refresh_interval: float = 300, max_staleness: float = 900,
+                 full_refresh_interval: float = 3600):
+        self.clients = clients
+        self.bucket = bucket
+        self.prefix = prefix
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.full_refresh_interval = full_refresh_interval
+
+        # roll number (uppercase) -> {"key", "size", "etag", "last_modified"}
+        self._entries = {}
+        # Highest key seen in a listing; incremental refreshes start after it
+        self._last_key = None
+        self.last_full_refresh = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.last_refresh = 0.0
+        self.refreshes = 0
+        self.full_refreshes = 0
+        self.objects_added = 0
+        self.invalidations = 0
+        self.hits = 0
+        self.misses = 0
+        self.head_fallbacks = 0
+
+    def is_fresh(self) -> bool:
+        """True if the index was fully listed within the staleness window"""
+        return self.last_refresh > 0 and time.monotonic() - self.last_refresh <= self.max_staleness
+
+    def _list(self, s3_client, start_after: Optional[str] = None):
+        """(entries by roll, highest key) for the prefix, optionally only keys after start_after"""
+        entries, last_key = {}, start_after
+        params = {"Bucket": self.bucket, "Prefix": self.prefix}
+        if start_after:
+            params["StartAfter"] = start_after
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(**params):
+            for obj in page.get('Contents', []):
+                last_key = obj['Key'] if last_key is None else max(last_key, obj['Key'])
+                roll = normalize_object_roll(obj['Key'], self.prefix)
+                if not roll:
+                    continue
+                # Prefer the uppercase key when both case variants exist
+                existing = entries.get(roll)
+                if existing and existing["key"].endswith(f"{roll}.pdf"):
+                    continue
+                entries[roll] = {
+                    "key": obj['Key'],
+                    "size": obj['Size'],
+                    "etag": obj.get('ETag'),
+                    "last_modified": obj['LastModified'],
+                }
+        return entries, last_key
+
+    def refresh(self, full: Optional[bool] = None) -> bool:
+        """List keys after the high-water mark, or the whole prefix when a full pass is due"""
+        s3_client = self.clients.get()
+        if not s3_client:
+            return False
+        if full is None:
+            full = (
+                self._last_key is None
+                or time.monotonic() - self.last_full_refresh >= self.full_refresh_interval
+            )
+
+        started = time.perf_counter()
+        try:
+            entries, last_key = self._list(s3_client, None if full else self._last_key)
+        except Exception as e:
+            print(f"Failed to refresh certificate index: {e}")
+            self.clients.mark_unhealthy(e)
+            return False
+        finally:
+            STAGE_S3_LIST.observe(time.perf_counter() - started)
+
+        with self._lock:
+            if full:
+                self._entries = entries
+                self.last_full_refresh = time.monotonic()
+                self.full_refreshes += 1
+            else:
+                for roll, entry in entries.items():
+                    existing = self._entries.get(roll)
+                    # An uppercase key already indexed wins over a newer lowercase one
+                    if existing and existing["key"].endswith(f"{roll}.pdf") and not entry["key"].endswith(f"{roll}.pdf"):
+                        continue
+                    self._entries[roll] = entry
+                self.objects_added += len(entries)
+            self._last_key = last_key
+            self.last_refresh = time.monotonic()
+            self.refreshes += 1
+        self.clients.mark_healthy()
+        return True
+
+    def invalidate(self, entry: dict) -> bool:
+        """Drop a stale entry and make the next refresh a full one; True if it was indexed"""
+        roll = normalize_object_roll(entry["key"], self.prefix)
+        with self._lock:
+            current = self._entries.get(roll)
+            dropped = current is not None and current["key"] == entry["key"] and current["etag"] == entry.get("etag")
+            if dropped:
+                del self._entries[roll]
+            self.last_full_refresh = 0.0
+            self.invalidations += 1
+        return dropped
+
+    def _head(self, s3_client, roll: str):
+        """Probe the uppercase then lowercase key; None if neither exists"""
+        from botocore.exceptions import ClientError
+
+        for s3_key in (f"{self.prefix}{roll}.pdf", f"{self.prefix}{roll.lower()}.pdf"):
+            started = time.perf_counter()
+            try:
+                response = s3_client.head_object(Bucket=self.bucket, Key=s3_key)
+            except ClientError:
+                continue
+            finally:
+                STAGE_S3_HEAD.observe(time.perf_counter() - started)
+            return {
+                "key": s3_key,
+                "size": response.get('ContentLength'),
+                "etag": response.get('ETag'),
+                "last_modified": response.get('LastModified'),
+            }
+        return None
+
+    def lookup(self, roll_number: str):
+        """Return object metadata for a roll number, falling back to HEAD on a miss"""
+        roll = roll_number.strip().upper()
+
+        if self.is_fresh():
+            entry = self._entries.get(roll)
+            if entry:
+                self.hits += 1
+                INDEX_CACHE_HIT.inc()
+                return entry
+        self.misses += 1
+        INDEX_CACHE_MISS.inc()
+
+        s3_client = self.clients.get()
+        if not s3_client:
+            return None
+
+        self.head_fallbacks += 1
+        entry = self._head(s3_client, roll)
+        if entry:
+            with self._lock:
+                self._entries[roll] = entry
+        return entry
+
+    def _run(self):
+        """Background refresh loop"""
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+
+    def start(self):
+        """Build the index and keep it refreshed in a background thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="certificate-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background refresh thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def rolls(self) -> set:
+        """Roll numbers (uppercase) present in the last listing"""
+        return set(self._entries)
+
+    def entries(self) -> list:
+        """Object metadata for every roll number in the last listing"""
+        return list(self._entries.values())
+
+    def stats(self) -> dict:
+        """Snapshot of index size, freshness and hit rates"""
+        age = time.monotonic() - self.last_refresh if self.last_refresh else None
+        return {
+            "entries": len(self._entries),
+            "fresh": self.is_fresh(),
+            "age_seconds": round(age, 1) if age is not None else None,
+            "refreshes": self.refreshes,
+            "full_refreshes": self.full_refreshes,
+            "objects_added": self.objects_added,
+            "invalidations": self.invalidations,
+            "hits": self.hits,
+            "misses": self.misses,
+            "head_fallbacks": self.head_fallbacks,
+        }
+
+
+class CertificateCatalog:
+    """Certificate indexes partitioned by tenure, each built on first use
+
+    Every tenure gets its own CertificateIndex over its own bucket prefix,
+    so a lookup only searches that tenure's entries, and a tenure nobody
+    asks for is never listed. A new partition answers from HEAD requests
+    until its first background listing completes.
+    """
+
+    def __init__(self, clients: S3ClientManager, bucket: str,
+                 refresh_interval: float = 300, max_staleness: float = 900,
+                 full_refresh_interval: float = 3600):
+        self.clients = clients
+        self.bucket = bucket
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.full_refresh_interval = full_refresh_interval
+
+        # tenure -> CertificateIndex
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, tenure: str) -> CertificateIndex:
+        """The tenure's index, created and started on first access"""
+        index = self._indexes.get(tenure)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(tenure)
+                if index is None:
+                    index = CertificateIndex(
+                        self.clients,
+                        bucket=self.bucket,
+                        prefix=tenure_prefix(tenure),
+                        refresh_interval=self.refresh_interval,
+                        max_staleness=self.max_staleness,
+                        full_refresh_interval=self.full_refresh_interval
+                    )
+                    index.start()
+                    self._indexes[tenure] = index
+        return index
+
+    def lookup(self, roll_number: str, tenure: str):
+        """Object metadata for a roll number's certificate in one tenure"""
+        return self.index(tenure).lookup(roll_number)
+
+    def invalidate(self, entry: dict):
+        """Drop an entry a GET found deleted or re-uploaded, from whichever partition holds it"""
+        for index in list(self._indexes.values()):
+            if entry["key"].startswith(index.prefix):
+                index.invalidate(entry)
+
+    def tenures(self) -> list:
+        """Tenures with a loaded partition"""
+        return sorted(self._indexes)
+
+    def stop(self):
+        """Stop every partition's refresh thread"""
+        with self._lock:
+            indexes = list(self._indexes.values())
+        for index in indexes:
+            index.stop()
+
+    def stats(self) -> dict:
+        """Per-tenure index stats"""
+        return {tenure: index.stats() for tenure, index in sorted(self._indexes.items())}
+
+
+class PresignedUrlCache:
+    """Bounded LRU cache of presigned URLs with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 2048, min_remaining: float = 300):
+        self.max_entries = max_entries
+        # A cached URL is only handed out while it has at least this many seconds left
+        self.min_remaining = min_remaining
+
+        # (object key, expiration class) -> (url, monotonic expiry time)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key: str, expiration: int):
+        """Return a still-valid cached URL, or None"""
+        cache_key = (key, expiration)
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(cache_key)
+            if item is None:
+                self.misses += 1
+                PRESIGN_CACHE_MISS.inc()
+                return None
+            url, expires_at = item
+            if expires_at - now < self.min_remaining:
+                del self._entries[cache_key]
+                self.expired += 1
+                self.misses += 1
+                PRESIGN_CACHE_MISS.inc()
+                return None
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            PRESIGN_CACHE_HIT.inc()
+            return url
+
+    def put(self, key: str, expiration: int, url: str, signed_at: float = None):
+        """Store a URL signed at signed_at (monotonic) for expiration seconds"""
+        if expiration <= self.min_remaining or self.max_entries <= 0:
+            return
+        expires_at = (signed_at if signed_at is not None else time.monotonic()) + expiration
+        cache_key = (key, expiration)
+        with self._lock:
+            self._entries[cache_key] = (url, expires_at)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: str):
+        """Drop every cached URL for an object key"""
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] == key]:
+                del self._entries[cache_key]
+
+    def clear(self):
+        """Drop all cached URLs"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Snapshot of cache size and hit rates"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
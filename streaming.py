@@ -0,0 +1,338 @@
+"""
+Streaming proxy and HTTP range/conditional helpers for certificate downloads.
+
+Pipes the S3/MinIO object body straight into the client response through
+a pooled async HTTP client, instead of spooling it to a temporary file,
+and serves local certificate files with the same Range/ETag semantics.
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
+
+import anyio
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from metrics import STAGE_S3_STREAM
+
+if TYPE_CHECKING:
+    import httpx
+
+# Upstream headers passed through to the client unchanged
+FORWARDED_HEADERS = ("content-length", "content-range", "content-encoding", "etag", "last-modified")
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised for multi-range or out-of-bounds Range requests"""
+
+
+def http_date(value: datetime) -> str:
+    """Format a datetime as an HTTP date (naive values are taken as UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _same_second(value: datetime, other: datetime) -> bool:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0) == other.replace(microsecond=0)
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def validator_headers(etag: Optional[str], last_modified: Optional[datetime]) -> dict:
+    """ETag/Last-Modified headers for an object, skipping unknown values"""
+    headers = {"accept-ranges": "bytes"}
+    if etag:
+        headers["etag"] = etag
+    if last_modified:
+        headers["last-modified"] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(request_headers, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the object"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if not etag:
+            return False
+        tags = [_strip_weak(tag) for tag in if_none_match.split(",")]
+        return "*" in tags or _strip_weak(etag) in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        since = _parse_http_date(if_modified_since)
+        if since is None:
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def not_modified_response(request_headers, etag: Optional[str],
+                          last_modified: Optional[datetime]) -> Optional[Response]:
+    """A 304 response if the client's cached copy is current, else None"""
+    if not is_not_modified(request_headers, etag, last_modified):
+        return None
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
+
+
+def requested_range(request_headers, size: Optional[int], etag: Optional[str] = None,
+                    last_modified: Optional[datetime] = None) -> Optional[Tuple[int, int]]:
+    """Resolve a single 'bytes=' Range header to (start, end) inclusive
+
+    Returns None when the whole body should be sent (no Range, unknown unit,
+    malformed header, or a failed If-Range). Raises RangeNotSatisfiable for
+    multiple ranges or a range outside the object.
+    """
+    header = request_headers.get("range")
+    if not header or size is None:
+        return None
+
+    if_range = request_headers.get("if-range")
+    if if_range:
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            # Weak validators never match for If-Range
+            if if_range.startswith("W/") or not etag or if_range != etag:
+                return None
+        else:
+            since = _parse_http_date(if_range)
+            if since is None or not last_modified or not _same_second(last_modified, since):
+                return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    if "," in spec:
+        raise RangeNotSatisfiable("Multiple ranges are not supported")
+
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable("Empty suffix range")
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+
+    if start < 0 or start > end or start >= size:
+        raise RangeNotSatisfiable(f"Range {header} not satisfiable for {size} bytes")
+    return start, end
+
+
+def range_not_satisfiable_response(size: Optional[int]) -> Response:
+    """416 response advertising the full object size"""
+    headers = {"accept-ranges": "bytes"}
+    if size is not None:
+        headers["content-range"] = f"bytes */{size}"
+    return Response(status_code=416, headers=headers)
+
+
+def local_file_validators(path: str, size: Optional[int] = None,
+                          mtime: Optional[float] = None) -> Tuple[int, str, datetime]:
+    """Size, ETag and Last-Modified for a local file (stat'ed unless size/mtime given)"""
+    if size is None or mtime is None:
+        stat_result = os.stat(path)
+        size, mtime = stat_result.st_size, stat_result.st_mtime
+    etag_base = f"{mtime}-{size}"
+    etag = f'"{hashlib.md5(etag_base.encode()).hexdigest()}"'
+    last_modified = datetime.fromtimestamp(mtime, timezone.utc)
+    return size, etag, last_modified
+
+
+def file_response(path: str, filename: str, request_headers, media_type: str = "application/pdf",
+                  disposition: str = "attachment", buffer_size: int = 65536,
+                  size: Optional[int] = None, mtime: Optional[float] = None,
+                  etag: Optional[str] = None, last_modified: Optional[datetime] = None) -> Response:
+    """Serve a local file honouring Range, If-None-Match and If-Modified-Since
+
+    etag/last_modified override the validators derived from the file, e.g.
+    to keep a cached copy's validators identical to the S3 object's.
+    """
+    if etag is None or size is None:
+        size, local_etag, local_last_modified = local_file_validators(path, size, mtime)
+        etag = etag or local_etag
+        last_modified = last_modified or local_last_modified
+
+    not_modified = not_modified_response(request_headers, etag, last_modified)
+    if not_modified:
+        return not_modified
+
+    try:
+        byte_range = requested_range(request_headers, size, etag, last_modified)
+    except RangeNotSatisfiable:
+        return range_not_satisfiable_response(size)
+
+    headers = validator_headers(etag, last_modified)
+    if byte_range is None:
+        return FileResponse(
+            path,
+            media_type=media_type,
+            filename=filename,
+            headers=headers,
+            content_disposition_type=disposition
+        )
+
+    start, end = byte_range
+
+    async def body():
+        remaining = end - start + 1
+        async with await anyio.open_file(path, "rb") as f:
+            await f.seek(start)
+            while remaining > 0:
+                chunk = await f.read(min(buffer_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    headers.update({
+        "content-range": f"bytes {start}-{end}/{size}",
+        "content-length": str(end - start + 1),
+        "content-disposition": f'{disposition}; filename="{filename}"',
+    })
+    return StreamingResponse(body(), status_code=206, media_type=media_type, headers=headers)
+
+
+class UpstreamError(Exception):
+    """Raised when the object store answers with a non-success status"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Upstream returned HTTP {status_code}")
+        self.status_code = status_code
+
+
+class CertificateStreamer:
+    """Pooled async HTTP client that streams presigned-URL bodies to clients"""
+
+    def __init__(self, buffer_size: int = 65536, max_connections: int = 50,
+                 keepalive_connections: int = 20, connect_timeout: float = 5,
+                 read_timeout: float = 30):
+        self.buffer_size = buffer_size
+        self.max_connections = max_connections
+        self.keepalive_connections = keepalive_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._client = None
+
+        self.streams_started = 0
+        self.bytes_streamed = 0
+
+    def get_client(self) -> "httpx.AsyncClient":
+        """Return the shared async client, creating it (and importing httpx) on first use"""
+        if self._client is None or self._client.is_closed:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.keepalive_connections
+                ),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+            )
+        return self._client
+
+    async def stream(self, url: str, filename: str, media_type: str = "application/pdf",
+                     disposition: str = "attachment", byte_range: Optional[Tuple[int, int]] = None,
+                     etag: Optional[str] = None,
+                     last_modified: Optional[datetime] = None,
+                     open_sink: Optional[Callable[[], object]] = None) -> StreamingResponse:
+        """Open the upstream object and return a response that relays its body
+
+        open_sink returns a writer (e.g. a pdf_cache.CacheWriter) for a copy
+        of a full, unranged body, or None. It is only called once the body
+        starts, so a response that is never sent leaves nothing behind.
+        The copy is committed once the last chunk has been sent, or aborted
+        if the client goes away first. The writer's disk I/O runs in a
+        worker thread, never on the event loop.
+        """
+        client = self.get_client()
+        request = client.build_request("GET", url)
+        if byte_range is not None:
+            request.headers["range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+
+        started = time.perf_counter()
+        upstream = await client.send(request, stream=True)
+        expected = 206 if byte_range is not None else 200
+        if upstream.status_code != expected:
+            await upstream.aclose()
+            raise UpstreamError(upstream.status_code)
+        if byte_range is not None or upstream.headers.get("etag") != etag:
+            # Only a whole copy of the version we were asked for is worth keeping
+            open_sink = None
+
+        headers = validator_headers(etag, last_modified)
+        headers.update({
+            name: upstream.headers[name]
+            for name in FORWARDED_HEADERS
+            if name in upstream.headers
+        })
+        headers["content-disposition"] = f'{disposition}; filename="{filename}"'
+        self.streams_started += 1
+
+        async def body():
+            # Each chunk is only read once the previous one has been sent,
+            # so a slow client slows the upstream read instead of buffering
+            sink, complete = None, False
+            try:
+                if open_sink is not None:
+                    sink = await anyio.to_thread.run_sync(open_sink)
+                async for chunk in upstream.aiter_raw(self.buffer_size):
+                    self.bytes_streamed += len(chunk)
+                    if sink is not None:
+                        await anyio.to_thread.run_sync(sink.write, chunk)
+                    yield chunk
+                complete = True
+            finally:
+                if sink is not None:
+                    # Finish the copy even if the request is being cancelled
+                    with anyio.CancelScope(shield=True):
+                        await anyio.to_thread.run_sync(sink.commit if complete else sink.abort)
+                await upstream.aclose()
+                STAGE_S3_STREAM.observe(time.perf_counter() - started)
+
+        return StreamingResponse(
+            body(),
+            status_code=expected,
+            media_type=media_type,
+            headers=headers,
+            background=BackgroundTask(upstream.aclose)
+        )
+
+    def stats(self) -> dict:
+        """Snapshot of streaming activity"""
+        return {
+            "buffer_size": self.buffer_size,
+            "streams_started": self.streams_started,
+            "bytes_streamed": self.bytes_streamed,
+        }
+
+    async def close(self):
+        """Close pooled upstream connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
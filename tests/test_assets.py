@@ -0,0 +1,34 @@
+from assets import minify_css, minify_js
+
+
+def test_minify_js_keeps_code_after_inline_block_comment():
+    assert minify_js("/* a */ foo();\n") == "foo();\n"
+
+
+def test_minify_js_keeps_code_between_block_comments():
+    source = "/* start */ x = 1; /* multi-line\n   comment */\nbar();\n"
+    assert minify_js(source) == "x = 1; /* multi-line\n   comment */\nbar();\n"
+
+
+def test_minify_js_keeps_code_after_multi_line_comment():
+    source = "/* one\n   two */ baz();\n// note\n\nqux();\n"
+    assert minify_js(source) == "baz();\nqux();\n"
+
+
+def test_minify_js_leaves_template_literals_alone():
+    source = "const html = `\n  /* not a comment */\n  <p>hi</p>\n`;\n"
+    assert minify_js(source) == source
+
+
+def test_minify_css_leaves_strings_alone():
+    source = 'a::after { content : "a : b" ; background: url("x, y") ; }'
+    assert minify_css(source) == 'a::after{content :"a : b";background:url("x, y")}\n'
+
+
+def test_minify_css_keeps_descendant_pseudo_class():
+    assert minify_css("nav a :hover { color: red; }") == "nav a :hover{color:red}\n"
+
+
+def test_minify_css_strips_comments_outside_strings():
+    source = "/* header */ p > b , i { color: red; }\n.x::after { content: '/* kept */' }"
+    assert minify_css(source) == "p>b,i{color:red}.x::after{content:'/* kept */'}\n"
@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+from db import EligibilityCache
+
+# Same budget benchmark.py enforces with --max-eligibility-bytes
+MAX_BYTES = 1024 * 1024
+PROGRAMMES = ("bca", "bba", "bcom", "btech", "mca", "mba", "bsc", "ba", "ma", "msc")
+
+
+def packed_rolls(count):
+    return [
+        f"{220 + (i // 1000) % 10}{PROGRAMMES[(i // 10000) % len(PROGRAMMES)]}{i % 1000:03d}"
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(scope="module")
+def rolls():
+    packed = packed_rolls(99000)
+    # These can't be packed and must land in the overflow set
+    leading_zero = [f"0{220 + i % 10}zz{i:03d}" for i in range(500)]
+    unpackable = [f"230-bca-{i:03d}" for i in range(250)] + [f"2301bcahons{i:04d}" for i in range(250)]
+    return packed, leading_zero + unpackable
+
+
+@pytest.fixture(scope="module")
+def cache(tmp_path_factory, rolls):
+    packed, overflow = rolls
+    path = str(tmp_path_factory.mktemp("eligibility") / "certificates.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE certificates (roll_number TEXT, has_certificate INTEGER)")
+    conn.execute("CREATE TABLE cache_versions (name TEXT PRIMARY KEY, version INTEGER)")
+    conn.executemany("INSERT INTO certificates VALUES (?, 1)", ((roll,) for roll in packed + overflow))
+    conn.execute("INSERT INTO certificates VALUES ('999zz999', 0)")
+    conn.commit()
+    conn.close()
+
+    cache = EligibilityCache(path, check_interval=3600)
+    cache.load()
+    yield cache
+    cache.close()
+
+
+def test_footprint_stays_under_budget(cache, rolls):
+    packed, overflow = rolls
+    stats = cache.stats()
+    assert stats["eligible"] == len(packed) + len(overflow)
+    assert len(cache._keys) == len(packed)
+    assert cache._overflow == frozenset(overflow)
+    assert stats["memory_bytes"] < MAX_BYTES
+
+
+def test_every_loaded_roll_is_eligible(cache, rolls):
+    packed, overflow = rolls
+    assert all(cache.is_eligible(roll) for roll in packed)
+    assert all(cache.is_eligible(roll) for roll in overflow)
+
+
+def test_lookups_are_exact(cache, rolls):
+    packed, overflow = rolls
+    # A leading zero must not alias the packed roll number, or the other way round
+    assert not any(cache.is_eligible("0" + roll) for roll in packed[:1000])
+    assert not any(cache.is_eligible(roll[1:]) for roll in overflow[:500])
+    assert not cache.is_eligible("999zz999")
+    assert not cache.is_eligible("230bca1000")
+    assert not cache.is_eligible("")